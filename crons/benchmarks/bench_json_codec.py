@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""bench_json_codec.py: compare JSON backends on the ESI samples in tests/samples
+
+    python benchmarks/bench_json_codec.py [--rounds N]
+
+"""
+from os import path, listdir
+import argparse
+import timeit
+
+import navitron_crons.json_codec as json_codec
+
+HERE = path.abspath(path.dirname(__file__))
+SAMPLES = path.join(path.dirname(HERE), 'tests', 'samples')
+
+def load_samples(samples_dir=SAMPLES):
+    """read every sample file as raw bytes
+
+    Returns:
+        :obj:`dict`: file name -> raw bytes
+
+    """
+    samples = {}
+    for file_name in sorted(listdir(samples_dir)):
+        if file_name.endswith('.json'):
+            with open(path.join(samples_dir, file_name), 'rb') as sample_fh:
+                samples[file_name] = sample_fh.read()
+    return samples
+
+def bench(codec, raw, rounds):
+    """time decode-from-bytes and encode-to-bytes
+
+    Returns:
+        float: ms per decode
+        float: ms per encode
+
+    """
+    data = codec.loads(raw)
+    decode = timeit.timeit(lambda: codec.loads(raw), number=rounds) / rounds * 1000
+    encode = timeit.timeit(lambda: codec.dumps(data), number=rounds) / rounds * 1000
+    return decode, encode
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    codecs = []
+    for name in json_codec.PREFERENCE:
+        try:
+            codecs.append(json_codec.get_codec(name))
+        except ImportError:
+            print('{}: not installed'.format(name))
+
+    print('{:<40} {:<8} {:>12} {:>12}'.format('sample', 'backend', 'decode ms', 'encode ms'))
+    for file_name, raw in load_samples().items():
+        for codec in codecs:
+            decode, encode = bench(codec, raw, args.rounds)
+            print('{:<40} {:<8} {:>12.3f} {:>12.3f}'.format(file_name, codec.name, decode, encode))
+
+if __name__ == '__main__':
+    main()
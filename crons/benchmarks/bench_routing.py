@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""bench_routing.py: route query latency on a synthetic universe
+
+    python benchmarks/bench_routing.py [--systems N] [--wspace N] [--queries N]
+
+k-space is a random planar-ish graph where each system gates to its nearest
+neighbours (mean degree ~3, like New Eden), plus a few long regional gates;
+w-space systems have no gates.
+
+"""
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+
+import navitron_crons.jump_matrix as jump_matrix
+import navitron_crons.routing as routing
+import navitron_crons.universe_graph as universe_graph
+
+def build_universe(systems, wspace, rng, neighbours=2, shortcut_every=100):
+    """synthetic SDE frame: `systems` gated k-space + `wspace` gateless systems"""
+    positions = rng.random((systems, 3)) * np.array([1.0, 1.0, 0.05])
+    gates = [set() for _ in range(systems)]
+    for start in range(0, systems, 512):
+        block = positions[start:start + 512]
+        distance = ((block[:, None, :] - positions[None, :, :]) ** 2).sum(axis=2)
+        nearest = np.argsort(distance, axis=1)[:, 1:neighbours + 1]
+        for offset, row in enumerate(nearest.tolist()):
+            for other in row:
+                gates[start + offset].add(other)
+                gates[other].add(start + offset)
+    for first, second in rng.integers(0, systems, (systems // shortcut_every, 2)).tolist():
+        if first != second:
+            gates[first].add(second)
+            gates[second].add(first)
+
+    system_ids = np.arange(30000001, 30000001 + systems + wspace)
+    map_df = pd.DataFrame({
+        'system_id': system_ids,
+        'stargates': [sorted(system_ids[list(g)].tolist()) for g in gates] + [[]] * wspace,
+        'security_status': rng.uniform(-1.0, 1.0, systems + wspace),
+    })
+    all_positions = np.vstack([positions, rng.random((wspace, 3))])
+    for axis, field in enumerate(('x', 'y', 'z')):
+        map_df[field] = all_positions[:, axis]
+    return map_df
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--systems', type=int, default=5400)
+    parser.add_argument('--wspace', type=int, default=2600)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--landmarks', type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    graph = universe_graph.UniverseGraph.from_sde_frame(build_universe(
+        args.systems, args.wspace, rng))
+    danger = rng.random(len(graph)) ** 4
+    components = graph.components()
+    main_component = np.bincount(components).argmax()
+    candidates = graph.system_ids[components == main_component]
+    pairs = rng.choice(candidates, size=(args.queries, 2)).tolist()
+
+    print('{} systems, {} stargates, {} queries'.format(
+        len(graph), graph.edge_count, args.queries))
+    build_seconds = timeit.timeit(
+        lambda: jump_matrix.bfs_block(graph, 0, len(graph)), number=1)
+    matrix = jump_matrix.JumpMatrix(graph, jump_matrix.bfs_block(graph, 0, len(graph)))
+    print('jump matrix: {:.1f}s on one process'.format(build_seconds))
+
+    for label, weights, node_danger in (
+            ('jumps only', routing.RouteWeights(1.0, 0.0, 0.0), None),
+            ('weighted', routing.RouteWeights(), danger),
+    ):
+        engine = routing.RouteEngine(graph, weights, node_danger)
+        searches = [('dijkstra', engine.dijkstra), ('astar', engine.astar)]
+        jump_engine = routing.RouteEngine(graph, weights, node_danger)
+        jump_engine.use_jump_matrix(matrix)
+        searches.append(('jump A*', jump_engine.route))
+        alt_engine = routing.RouteEngine(graph, weights, node_danger)
+        alt_engine.use_jump_matrix(matrix)
+        build_seconds = timeit.timeit(lambda: alt_engine.use_landmarks(args.landmarks), number=1)
+        searches.append(('ALT A*', alt_engine.route))
+        for method, search in searches:
+            routes = [search(origin, destination) for origin, destination in pairs]
+            seconds = timeit.timeit(
+                lambda: [search(origin, destination) for origin, destination in pairs],
+                number=1
+            )
+            print('{:<11} {:<9} {:>8.3f}ms/query  {:>7.0f} expanded  {:>5.1f} jumps'.format(
+                label,
+                method,
+                seconds / len(pairs) * 1000,
+                np.mean([route.expanded for route in routes]),
+                np.mean([route.jumps for route in routes]),
+            ))
+        print('{:<11} {} landmark tables: {:.0f}ms'.format(label, args.landmarks, build_seconds * 1000))
+
+if __name__ == '__main__':
+    main()
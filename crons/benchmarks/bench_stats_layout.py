@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""bench_stats_layout.py: BSON size and expand time per system_stats layout
+
+    python benchmarks/bench_stats_layout.py [--systems N] [--snapshots N]
+
+Sizes are raw BSON, before WiredTiger compression; per-document overhead
+and the `_id` index entry are what the `bucket` layout saves.
+
+"""
+import argparse
+import timeit
+
+import bson
+import numpy as np
+import pandas as pd
+
+import navitron_crons.cli_core as cli_core
+import navitron_crons.stats_buckets as stats_buckets
+
+def build_snapshot(systems, rng):
+    """random merged jumps/kills frame + metadata for one cron run"""
+    system_info_df = pd.DataFrame({
+        'system_id': np.arange(30000001, 30000001 + systems),
+        'ship_jumps': rng.integers(0, 500, systems),
+        'ship_kills': rng.integers(0, 20, systems),
+        'npc_kills': rng.integers(0, 200, systems),
+        'pod_kills': rng.integers(0, 10, systems),
+    })
+    return system_info_df, cli_core.generate_metadata('bench', '0.0.0')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--systems', type=int, default=5000)
+    parser.add_argument('--snapshots', type=int, default=24)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    snapshots = [build_snapshot(args.systems, rng) for _ in range(args.snapshots)]
+
+    documents = []
+    for system_info_df, metadata_obj in snapshots:
+        documents.extend(system_info_df.assign(
+            cron_datetime=metadata_obj['cron_datetime'],
+            write_recipt=metadata_obj['write_recipt']
+        ).to_dict(orient='records'))
+    buckets = [stats_buckets.to_bucket(df, meta) for df, meta in snapshots]
+
+    doc_bytes = sum(len(bson.encode(doc)) for doc in documents)
+    bucket_bytes = sum(len(bson.encode(bucket)) for bucket in buckets)
+    print('{:<12} {:>10} {:>14}'.format('layout', 'documents', 'BSON bytes'))
+    print('{:<12} {:>10} {:>14}'.format('documents', len(documents), doc_bytes))
+    print('{:<12} {:>10} {:>14}'.format('bucket', len(buckets), bucket_bytes))
+    print('ratio: {:.1f}x'.format(doc_bytes / bucket_bytes))
+
+    frame_ms = timeit.timeit(lambda: pd.DataFrame(documents), number=3) / 3 * 1000
+    expand_ms = timeit.timeit(lambda: stats_buckets.expand_buckets(buckets), number=3) / 3 * 1000
+    print('to frame: documents {:.1f}ms, bucket {:.1f}ms'.format(frame_ms, expand_ms))
+
+if __name__ == '__main__':
+    main()
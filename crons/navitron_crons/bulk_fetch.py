@@ -0,0 +1,387 @@
+"""bulk_fetch.py: asyncio engine for mapping ESI endpoints over many ids"""
+from collections import namedtuple
+import asyncio
+import random
+import time
+
+import aiohttp
+
+import navitron_crons.cli_core as cli_core
+import navitron_crons.concurrency as concurrency
+import navitron_crons.json_codec as json_codec
+
+_FEED_DONE = object()
+PROGRESS_INTERVAL = 1000
+RETRY_STATUSES = (420, 429, 500, 502, 503, 504)
+
+FetchFailure = namedtuple('FetchFailure', ['id', 'url', 'status', 'error', 'attempts'])
+FetchFailure.__doc__ = """an id that could not be fetched, after `attempts` tries"""
+
+def run_sync(coro):
+    """run a coroutine to completion on a private event loop
+
+    Notes:
+        stand-in for `asyncio.run()`; cancels anything the coroutine left running
+
+    Args:
+        coro (coroutine): work to run
+
+    Returns:
+        return value of `coro`
+
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        all_tasks = getattr(asyncio, 'all_tasks', None) or asyncio.Task.all_tasks
+        pending = [task for task in all_tasks(loop) if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+class BulkResults(list):
+    """list of fetched documents, plus a report of the ids that failed
+
+    Args:
+        data (iterable): fetched documents
+        failures (:obj:`list`, optional): :obj:`FetchFailure` per failed id
+
+    """
+    def __init__(self, data=(), failures=None):
+        super().__init__(data)
+        self.failures = list(failures or [])
+
+def is_retryable(err):
+    """decide if a failed request is worth another attempt
+
+    Args:
+        err (:obj:`Exception`): error raised by `BulkFetcher.fetch()`
+
+    Returns:
+        bool: transient server/network trouble, not a bad id
+
+    """
+    if isinstance(err, aiohttp.ClientResponseError):
+        return err.status in RETRY_STATUSES
+    return isinstance(err, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """exponential backoff with full jitter
+
+    Args:
+        attempt (int): retry number, starting at 0
+        base (float, optional): seconds before first retry, at most
+        cap (float, optional): ceiling on any single delay
+
+    Returns:
+        float: seconds to wait before requeueing
+
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class BulkFetcher(object):
+    """asyncio worker pool for fetching `{base_url}{id}` documents
+
+    Notes:
+        One `aiohttp.ClientSession` is shared by every worker in a run, so
+        keep-alive sockets are reused instead of reconnecting per request.
+        Ids are pulled from `id_list` lazily; only `policy.limit` requests are
+        ever in flight and urls are never materialised up front.
+        Transient failures are requeued with jittered exponential backoff, up
+        to `retry` times; ids that still fail land in `failures` instead of
+        aborting the run.
+
+    Args:
+        base_url (str): endpoint address to map ids onto
+        workers (int, optional): fixed number of in-flight requests, if no `policy`
+        retry (int, optional): extra attempts per id for transient failures
+        headers (:obj:`dict`, optional): header information for requests
+        timeout (float, optional): seconds allowed between reads per request
+        connect_timeout (float, optional): seconds allowed to connect
+        keepalive_timeout (float, optional): seconds to keep idle sockets open
+        rate_limiter (:obj:`rate_limit.TokenBucket`, optional): shared limiter
+            drawn from before every request
+        cache (:obj:`http_cache.ResponseCache`, optional): conditional-request cache
+        policy (:obj:`concurrency.FixedConcurrency`, optional): in-flight request
+            policy, see `concurrency.AIMDConcurrency` for an adaptive one
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    def __init__(
+            self,
+            base_url,
+            workers=20,
+            retry=0,
+            headers=None,
+            timeout=60,
+            connect_timeout=None,
+            keepalive_timeout=30,
+            rate_limiter=None,
+            cache=None,
+            policy=None,
+            logger=cli_core.DEFAULT_LOGGER
+    ):
+        self.base_url = base_url
+        self.retry = retry
+        self.policy = policy or concurrency.FixedConcurrency(workers)
+        self.failures = []
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.logger = logger
+        self._pending = 0
+        self._in_flight = 0
+        self._slots = None
+        self._attempts = {}
+        self._retry_tasks = set()
+
+    def build_url(self, id_val):
+        """map an id onto the base endpoint
+
+        Args:
+            id_val (int): id to request
+
+        Returns:
+            str: address to query
+
+        """
+        return f'{self.base_url}{id_val}'
+
+    async def fetch(self, session, id_val):
+        """fetch and decode a single document
+
+        Args:
+            session (:obj:`aiohttp.ClientSession`): shared keep-alive session
+            id_val (int): id to request
+
+        Notes:
+            Fresh cache entries skip the network; stale ones are revalidated.
+            Cache reads and writes are blocking sqlite calls, so they run on
+            the loop's default executor instead of stalling other workers
+
+        Returns:
+            :obj:`dict`: JSON return from endpoint
+
+        Raises:
+            :obj:`aiohttp.ClientResponseError`: bad status from ESI
+
+        """
+        url = self.build_url(id_val)
+        entry = await self._cache_call(self.cache.lookup, url) if self.cache else None
+        if entry and entry.fresh:
+            return json_codec.loads(entry.body)
+        headers = entry.conditional_headers() if entry else None
+
+        if self.rate_limiter:
+            await self.rate_limiter.acquire_async()
+        start = time.monotonic()
+        try:
+            async with session.get(url, headers=headers) as response:
+                self.policy.record(time.monotonic() - start, response.status, response.headers)
+                if entry and response.status == 304:
+                    await self._cache_call(self.cache.refresh, url, response.headers)
+                    return json_codec.loads(entry.body)
+
+                response.raise_for_status()
+                body = await response.read()
+                if self.cache:
+                    await self._cache_call(self.cache.store, url, response.headers, body)
+                return json_codec.loads(body)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            self.policy.record(time.monotonic() - start, 0, {})
+            raise
+
+    async def _cache_call(self, method, *args):
+        """run a blocking `ResponseCache` method off the event loop"""
+        return await asyncio.get_event_loop().run_in_executor(None, method, *args)
+
+    async def _acquire_slot(self):
+        """wait until the policy allows another request in flight"""
+        async with self._slots:
+            while self._in_flight >= self.policy.limit:
+                await self._slots.wait()
+            self._in_flight += 1
+
+        pause = self.policy.pause_for()
+        if pause:
+            self.logger.debug('--ESI error limit hit, pausing %.1fs', pause)
+            await asyncio.sleep(pause)
+
+    async def _release_slot(self):
+        """hand an in-flight slot back and wake waiting workers"""
+        async with self._slots:
+            self._in_flight -= 1
+            self._slots.notify_all()
+
+    async def _feed(self, id_list, work_queue, result_queue):
+        """push ids onto the work queue, from a sync or async iterable"""
+        try:
+            if hasattr(id_list, '__aiter__'):
+                async for id_val in id_list:
+                    self._pending += 1
+                    await work_queue.put(id_val)
+            else:
+                for id_val in id_list:
+                    self._pending += 1
+                    await work_queue.put(id_val)
+        except Exception as err:
+            await result_queue.put((None, None, err))
+        await result_queue.put(_FEED_DONE)
+
+    async def _requeue(self, id_val, delay, work_queue):
+        """put a failed id back on the work queue after `delay` seconds"""
+        await asyncio.sleep(delay)
+        await work_queue.put(id_val)
+
+    def _handle_failure(self, id_val, err, work_queue):
+        """requeue a failed id, or build its failure report
+
+        Returns:
+            :obj:`FetchFailure`: None if the id was requeued
+
+        """
+        attempt = self._attempts.get(id_val, 0)
+        if attempt < self.retry and is_retryable(err):
+            self._attempts[id_val] = attempt + 1
+            delay = backoff_delay(attempt)
+            self.logger.debug('--retrying %s in %.2fs: %r', id_val, delay, err)
+            task = asyncio.ensure_future(self._requeue(id_val, delay, work_queue))
+            self._retry_tasks.add(task)
+            task.add_done_callback(self._retry_tasks.discard)
+            return None
+
+        self._attempts.pop(id_val, None)
+        return FetchFailure(
+            id=id_val,
+            url=self.build_url(id_val),
+            status=getattr(err, 'status', None),
+            error=repr(err),
+            attempts=attempt + 1
+        )
+
+    async def _worker(self, session, work_queue, result_queue):
+        """pull ids off the work queue until cancelled"""
+        while True:
+            id_val = await work_queue.get()
+            await self._acquire_slot()
+            try:
+                data = await self.fetch(session, id_val)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                failure = self._handle_failure(id_val, err, work_queue)
+                if failure:
+                    await result_queue.put((id_val, None, failure))
+            else:
+                self._attempts.pop(id_val, None)
+                await result_queue.put((id_val, data, None))
+            finally:
+                await self._release_slot()
+
+    async def stream(self, id_list):
+        """fetch every id, yielding results in completion order
+
+        Args:
+            id_list (iterable): ids to request; may be an async iterable
+
+        Notes:
+            ids that fail for good are reported in `self.failures`
+
+        Yields:
+            (int, :obj:`dict`): id requested, JSON return from endpoint
+
+        Raises:
+            :obj:`Exception`: anything raised by `id_list` itself
+
+        """
+        workers = self.policy.maximum
+        work_queue = asyncio.Queue(maxsize=workers * 2)
+        result_queue = asyncio.Queue()
+        connector = aiohttp.TCPConnector(
+            limit=workers,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=self.connect_timeout,
+            sock_read=self.timeout
+        )
+        self._pending = 0
+        self._in_flight = 0
+        self._slots = asyncio.Condition()
+        self._attempts = {}
+        self.failures = []
+
+        self.logger.info('--streaming async requests for: %s', self.base_url)
+        async with aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=timeout
+        ) as session:
+            tasks = [
+                asyncio.ensure_future(self._worker(session, work_queue, result_queue))
+                for _ in range(workers)
+            ]
+            tasks.append(asyncio.ensure_future(
+                self._feed(id_list, work_queue, result_queue)
+            ))
+            try:
+                fed_all = False
+                count = 0
+                while not (fed_all and self._pending == 0):
+                    result = await result_queue.get()
+                    if result is _FEED_DONE:
+                        fed_all = True
+                        continue
+
+                    id_val, data, error = result
+                    if error is not None and not isinstance(error, FetchFailure):
+                        raise error
+                    self._pending -= 1
+                    if error is not None:
+                        self.logger.warning('--unable to fetch %s: %s', error.url, error.error)
+                        self.failures.append(error)
+                        continue
+                    count += 1
+                    if count % PROGRESS_INTERVAL == 0:
+                        self.logger.info('--fetched %d documents', count)
+                    yield id_val, data
+            finally:
+                tasks.extend(self._retry_tasks)
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def iter_results(self, id_list):
+        """sync wrapper for `stream()`: drives a private event loop
+
+        Notes:
+            The loop only runs while the caller asks for the next result, so a
+            slow consumer naturally throttles the workers
+
+        Args:
+            id_list (iterable): ids to request
+
+        Yields:
+            (int, :obj:`dict`): id requested, JSON return from endpoint
+
+        """
+        loop = asyncio.new_event_loop()
+        stream = self.stream(id_list)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(stream.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(stream.aclose())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
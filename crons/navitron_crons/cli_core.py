@@ -6,6 +6,9 @@ Acts as global namespace + parent-framework for CLI apps
 from os import path
 import platform
 from datetime import datetime
+import hashlib
+import json
+import math
 import warnings
 import uuid
 
@@ -49,6 +52,47 @@ def generate_metadata(
 
     return metadata_obj
 
+SDE_METADATA_COLS = ('_id', 'write_recipt', 'cron_datetime')
+
+def _canonical_value(value):
+    """normalize a cell so mongo and pandas copies of a row hash the same"""
+    if hasattr(value, 'tolist'):    # numpy scalars and arrays
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_canonical_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _canonical_value(item) for key, item in value.items()}
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def hash_sde_rows(
+        sde_df,
+        index_key,
+        ignore_cols=SDE_METADATA_COLS
+):
+    """content hash of every row, ignoring provenance columns
+
+    Args:
+        sde_df (:obj:`pandas.DataFrame`): SDE data
+        index_key (str): name of column to key on
+        ignore_cols (:obj:`tuple`, optional): columns left out of the hash
+
+    Returns:
+        :obj:`dict`: index_key value -> sha1 hexdigest
+
+    """
+    columns = sorted(col for col in sde_df.columns if col not in ignore_cols)
+    hashes = {}
+    for record in sde_df[columns].to_dict(orient='records'):
+        canonical = {key: _canonical_value(val) for key, val in record.items()}
+        digest = hashlib.sha1(
+            json.dumps(canonical, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        hashes[canonical[index_key]] = digest
+
+    return hashes
+
 def update_which_sde_data(
         current_sde_df,
         latest_esi_df,
@@ -56,6 +100,11 @@ def update_which_sde_data(
 ):
     """validate if current table needs an update
 
+    Notes:
+        Rows are compared by content hash; `write_recipt`/`cron_datetime`/`_id`
+        are ignored.  Keys missing from `latest_esi_df` are not returned, see
+        `vanished_sde_keys()`
+
     Args:
         current_sde_df (:obj:`pandas.DataFrame`): current data (from mongodb)
         latest_esi_df (:obj:`pandas.DataFrame`): latest data from REST/ESI
@@ -65,7 +114,40 @@ def update_which_sde_data(
         (:obj:`list`): list of keys that need to be updated
 
     """
-    pass
+    current_hashes = {}
+    if not current_sde_df.empty:
+        current_hashes = hash_sde_rows(current_sde_df, index_key)
+
+    latest_hashes = hash_sde_rows(latest_esi_df, index_key)
+    return [
+        key for key, digest in latest_hashes.items()
+        if current_hashes.get(key) != digest
+    ]
+
+def vanished_sde_keys(
+        current_sde_df,
+        latest_esi_df,
+        index_key
+):
+    """find keys in the current table that ESI no longer reports
+
+    Args:
+        current_sde_df (:obj:`pandas.DataFrame`): current data (from mongodb)
+        latest_esi_df (:obj:`pandas.DataFrame`): latest data from REST/ESI
+        index_key (str): name of column to match on
+
+    Returns:
+        (:obj:`list`): list of keys that need to be deleted
+
+    """
+    if current_sde_df.empty:
+        return []
+
+    latest_keys = set(_canonical_value(latest_esi_df[index_key]))
+    return [
+        key for key in _canonical_value(current_sde_df[index_key])
+        if key not in latest_keys
+    ]
 
 class NavitronApplication(cli.Application):
     """parent metaclass for CLI applications
@@ -0,0 +1,163 @@
+"""concurrency.py: pluggable in-flight request policies for the bulk fetcher
+
+A policy decides how many requests `bulk_fetch.BulkFetcher` keeps in flight.
+The fetcher reports every response to `record()` and re-reads `limit` before
+starting each request.
+
+"""
+import time
+
+import navitron_crons.cli_core as cli_core
+
+ERROR_LIMIT_REMAIN = 'X-Esi-Error-Limit-Remain'
+ERROR_LIMIT_RESET = 'X-Esi-Error-Limit-Reset'
+
+def parse_header(headers, key, cast=int):
+    """read a numeric header, treating garbage as missing
+
+    Args:
+        headers (:obj:`dict`): response headers
+        key (str): header name
+        cast (type, optional): numeric type to parse as
+
+    Returns:
+        int or float: header value, or None if absent or unparseable
+
+    """
+    value = headers.get(key)
+    if value is None:
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+class FixedConcurrency(object):
+    """constant worker count -- legacy `workers=N` behavior
+
+    Args:
+        workers (int): number of in-flight requests
+
+    """
+    def __init__(self, workers):
+        self.limit = workers
+        self.maximum = workers
+
+    def record(self, latency, status, headers):
+        """no-op: fixed policies ignore feedback"""
+        pass
+
+    def pause_for(self):
+        """float: seconds to hold off new requests"""
+        return 0.0
+
+class AIMDConcurrency(object):
+    """additive-increase/multiplicative-decrease concurrency controller
+
+    Notes:
+        Healthy responses grow the limit by about `increase` per window of
+        `limit` completions.  Slow responses, 5xx/420/429 statuses or a thin
+        ESI error budget cut it by `decrease`, at most once per window so one
+        burst of bad responses doesn't collapse it to `minimum`.  An exhausted
+        error budget also pauses new requests until ESI resets the window.
+
+    Args:
+        initial (int, optional): starting in-flight limit
+        minimum (int, optional): floor for the limit
+        maximum (int, optional): ceiling for the limit
+        latency_target (float, optional): seconds; slower responses back off
+        error_floor (int, optional): back off when `X-Esi-Error-Limit-Remain` drops below
+        increase (float, optional): additive step per window
+        decrease (float, optional): multiplicative factor on back off
+
+    """
+    def __init__(
+            self,
+            initial=10,
+            minimum=1,
+            maximum=100,
+            latency_target=1.0,
+            error_floor=20,
+            increase=1.0,
+            decrease=0.5
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.error_floor = error_floor
+        self.increase = increase
+        self.decrease = decrease
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._since_decrease = self.limit
+        self._paused_until = 0.0
+
+    @property
+    def limit(self):
+        """int: current in-flight limit"""
+        return int(self._limit)
+
+    def _back_off(self):
+        """multiplicative decrease, once per window"""
+        if self._since_decrease < self.limit:
+            return
+        self._limit = max(self.minimum, self._limit * self.decrease)
+        self._since_decrease = 0
+
+    def record(self, latency, status, headers):
+        """update the limit from one response
+
+        Args:
+            latency (float): seconds the request took
+            status (int): HTTP status, 0 for connection failures
+            headers (:obj:`dict`): response headers
+
+        """
+        self._since_decrease += 1
+
+        remain = parse_header(headers, ERROR_LIMIT_REMAIN)
+        if status == 420 or (remain is not None and remain <= 1):
+            reset = parse_header(headers, ERROR_LIMIT_RESET, float)
+            reset = 60.0 if reset is None else reset
+            self._paused_until = max(self._paused_until, time.monotonic() + reset)
+
+        unhealthy = any([
+            remain is not None and remain < self.error_floor,
+            status in (0, 420, 429),
+            status >= 500,
+            latency > self.latency_target,
+        ])
+        if unhealthy:
+            self._back_off()
+        else:
+            self._limit = min(self.maximum, self._limit + self.increase / self._limit)
+
+    def pause_for(self):
+        """float: seconds to hold off new requests"""
+        return max(0.0, self._paused_until - time.monotonic())
+
+def build_policy(
+        workers=20,
+        config=None
+):
+    """build the configured concurrency policy
+
+    Args:
+        workers (int, optional): starting/fixed number of in-flight requests
+        config (:obj:`p_config.ProsperConfig`, optional): config with [ESI] data
+
+    Returns:
+        :obj:`FixedConcurrency` or :obj:`AIMDConcurrency`
+
+    """
+    config = config or cli_core.CONFIG
+    policy = config.get_option('ESI', 'concurrency', args_default='fixed')
+    if policy != 'aimd':
+        return FixedConcurrency(workers)
+
+    return AIMDConcurrency(
+        initial=workers,
+        minimum=int(config.get_option('ESI', 'min_workers', args_default=4)),
+        maximum=int(config.get_option('ESI', 'max_workers', args_default=64)),
+        latency_target=float(config.get_option('ESI', 'latency_target', args_default=1.0)),
+        error_floor=int(config.get_option('ESI', 'error_limit_floor', args_default=20)),
+    )
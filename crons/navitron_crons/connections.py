@@ -1,107 +1,253 @@
 """connections.py: general tools for all cronjobs: db connection and requests"""
 from os import path
 from datetime import datetime
+import atexit
+import concurrent.futures
+import os
+import threading
 import warnings
-import json  # TODO: ujson?
-import concurrent
-import time
 
 import requests
+import pandas as pd
+import requests.adapters
 import pymongo
-from plumbum import cli
 
 
 import navitron_crons.exceptions as exceptions
 import navitron_crons.cli_core as cli_core
+import navitron_crons.bulk_fetch as bulk_fetch
+import navitron_crons.rate_limit as rate_limit
+import navitron_crons.http_cache as http_cache
+import navitron_crons.indexes as indexes
+import navitron_crons.json_codec as json_codec
 
 DEFAULT_HEADER = {
     'User-Agent': 'Navitron-cron: https://github.com/j9ac9k/NavitronEve'
 }
 HERE = path.abspath(path.dirname(__file__))
 
-def rate_limited(requests_per_second):
-    """rate limiting decorator
+class TimeoutHTTPAdapter(requests.adapters.HTTPAdapter):
+    """pooled adapter that applies a default `(connect, read)` timeout
+
+    Args:
+        timeout (:obj:`tuple`): default `(connect, read)` seconds
+        **kwargs: passed to :obj:`requests.adapters.HTTPAdapter`
+
+    """
+    def __init__(self, timeout, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+def load_http_settings(config=None):
+    """pool size, timeouts and protocol for ESI sessions
+
+    Args:
+        config (:obj:`p_config.ProsperConfig`, optional): config with [ESI] data
+
+    Returns:
+        :obj:`dict`: pool_size, connect_timeout, read_timeout, keepalive_timeout, http2
+
+    """
+    config = config or cli_core.CONFIG
+    return {
+        'pool_size': int(config.get_option('ESI', 'pool_size', args_default=20)),
+        'connect_timeout': float(config.get_option('ESI', 'connect_timeout', args_default=5)),
+        'read_timeout': float(config.get_option('ESI', 'read_timeout', args_default=30)),
+        'keepalive_timeout': float(
+            config.get_option('ESI', 'keepalive_timeout', args_default=30)),
+        'http2': str(config.get_option('ESI', 'http2', args_default=False)).lower() == 'true',
+    }
+
+SESSION = None
+def get_session(config=None):
+    """process-wide pooled keep-alive session for single-shot ESI calls
 
     Notes:
-        Stolen from: https://github.com/fuzzysteve/FuzzMarket/
+        `http2 = True` needs `httpx[http2]`; falls back to `requests` without it
+
+    Args:
+        config (:obj:`p_config.ProsperConfig`, optional): config with [ESI] data
+
+    Returns:
+        :obj:`requests.Session` or :obj:`httpx.Client`: shared session
 
     """
-    minimum_interval = 1.0 / float(requests_per_second)
-    def decorate(func):
-        last_time_called = [0.0]
-        def rate_limited_func(*args,**kargs):
-            elapsed = time.clock() - last_time_called[0]
-            wait_remining = minimum_interval - elapsed
-            if wait_remining > 0:
-                time.sleep(wait_remining)
-            ret = func(*args,**kargs)
-            last_time_called[0] = time.clock()
-            return ret
-        return rate_limited_func
-    return decorate
-
-
-@rate_limited(200)
-def async_request(
-        request_obj,
-        url,
-        retry
+    global SESSION
+    if SESSION is not None:
+        return SESSION
+
+    settings = load_http_settings(config)
+    if settings['http2']:
+        try:
+            import httpx
+            SESSION = httpx.Client(
+                http2=True,
+                headers=DEFAULT_HEADER,
+                timeout=httpx.Timeout(
+                    settings['read_timeout'],
+                    connect=settings['connect_timeout']
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings['pool_size'],
+                    max_keepalive_connections=settings['pool_size'],
+                    keepalive_expiry=settings['keepalive_timeout']
+                )
+            )
+            return SESSION
+        except ImportError:
+            warnings.warn('httpx[http2] not installed, using HTTP/1.1', RuntimeWarning)
+
+    adapter = TimeoutHTTPAdapter(
+        (settings['connect_timeout'], settings['read_timeout']),
+        pool_connections=settings['pool_size'],
+        pool_maxsize=settings['pool_size']
+    )
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADER)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    SESSION = session
+    return SESSION
+
+def close_session():
+    """shut down the shared session and its pooled connections"""
+    global SESSION
+    if SESSION is not None:
+        SESSION.close()
+    SESSION = None
+
+def build_bulk_fetcher(
+        base_url,
+        workers=20,
+        retry=0,
+        policy=None,
+        config=None,
+        logger=cli_core.DEFAULT_LOGGER
 ):
-    """rate limited async requests
+    """bulk fetcher wired to the process-wide rate limiter and response cache
 
-    Notes:
-        Stolen from: https://github.com/fuzzysteve/FuzzMarket/
+    Args:
+        base_url (str): endpoint address to map ids onto
+        workers (int, optional): max number of in-flight requests
+        retry (int, optional): retry attempts per id for transient failures
+        policy (:obj:`concurrency.AIMDConcurrency`, optional): in-flight request policy,
+            overrides `workers`
+        config (:obj:`p_config.ProsperConfig`, optional): config with [ESI] and [CACHE] data
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        :obj:`bulk_fetch.BulkFetcher`: for use inside an event loop, see `stream()`
+
+    """
+    settings = load_http_settings(config)
+    return bulk_fetch.BulkFetcher(
+        base_url,
+        workers=workers,
+        retry=retry,
+        headers=DEFAULT_HEADER,
+        timeout=settings['read_timeout'],
+        connect_timeout=settings['connect_timeout'],
+        keepalive_timeout=settings['keepalive_timeout'],
+        rate_limiter=rate_limit.get_rate_limiter(config),
+        cache=http_cache.get_response_cache(config),
+        policy=policy,
+        logger=logger
+    )
+
+def iter_bulk_data_async(
+        base_url,
+        id_list,
+        workers=20,
+        retry=0,
+        policy=None,
+        failures=None,
+        config=None,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """stream bulk data from ESI as requests complete
+
+    Args:
+        base_url (str): endpoint address to map onto id_list
+        id_list (iterable): id's for requesting, may be a generator
+        workers (int, optional): max number of in-flight requests
+        retry (int, optional): retry attempts per id for transient failures
+        policy (:obj:`concurrency.AIMDConcurrency`, optional): in-flight request policy,
+            overrides `workers`
+        failures (:obj:`list`, optional): collects :obj:`bulk_fetch.FetchFailure`
+            for ids that failed every attempt
+        config (:obj:`p_config.ProsperConfig`, optional): config with [ESI] and [CACHE] data
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Yields:
+        (int, :obj:`dict`): id requested, data from endpoint
 
     """
-    future = request_obj.get(url)
-    future.url = url
-    future.retry = retry
-    return future
+    fetcher = build_bulk_fetcher(
+        base_url,
+        workers=workers,
+        retry=retry,
+        policy=policy,
+        config=config,
+        logger=logger
+    )
+    try:
+        yield from fetcher.iter_results(id_list)
+    finally:
+        if failures is not None:
+            failures.extend(fetcher.failures)
 
 def fetch_bulk_data_async(
         base_url,
         id_list,
         workers=20,
         retry=0,
+        policy=None,
+        config=None,
         logger=cli_core.DEFAULT_LOGGER
 ):
     """fetch bulk data from ESI using async methods
 
     Notes:
-        Adapted from: https://github.com/fuzzysteve/FuzzMarket/
+        Results are in completion order, not id_list order.
+        Failed ids do not abort the batch: check `.failures` on the return
 
     Args:
         base_url (str): endpoint address to map onto id_list
         id_list (:obj:`list`): list of id's for requesting
         workers (int, optional): number of async workers to apply to job
-        retry (int, optional): retry failure attempts
+        retry (int, optional): retry attempts per id for transient failures
+        policy (:obj:`concurrency.AIMDConcurrency`, optional): in-flight request policy,
+            overrides `workers`
+        config (:obj:`p_config.ProsperConfig`, optional): config with [ESI] and [CACHE] data
         logger (:obj:`logging.logger`, optional): logging handle
 
     Returns:
-        :obj:`list`: data from all enpoints
+        :obj:`bulk_fetch.BulkResults`: data from all enpoints, plus `.failures` report
 
     """
-    from requests_futures.sessions import FuturesSession  # pytest & plumbum & pytest = FAIL
-    session = FuturesSession(max_workers=workers)
-    logger.info('--building async request queue for: %s', base_url)
-    url_list = [f'{base_url}{id_val}' for id_val in id_list]
-    request_queue = []
-    for url in cli.terminal.Progress(url_list):
-        # logger.debug(url)  # spammy AF
-        request_queue.append(async_request(
-            session,
-            url,
-            retry
-        ))
-
-    logger.info('--reading async request results')
-    results = []
-    for response in concurrent.futures.as_completed(request_queue):
-        result = response.result()
-        result.raise_for_status()
-        results.append(result.json())
-
-    return results
+    failures = []
+    data = [
+        data for _, data in iter_bulk_data_async(
+            base_url,
+            id_list,
+            workers=workers,
+            retry=retry,
+            policy=policy,
+            failures=failures,
+            config=config,
+            logger=logger
+        )
+    ]
+    if failures:
+        logger.warning('--%d of %d requests failed', len(failures), len(data) + len(failures))
+
+    return bulk_fetch.BulkResults(data, failures=failures)
 
 
 def get_esi(
@@ -110,6 +256,7 @@ def get_esi(
         special_id=None,
         params=None,
         headers=DEFAULT_HEADER,
+        config=None,
         logger=cli_core.DEFAULT_LOGGER
 ):
     """overload wrapper for get_esi_address()
@@ -124,6 +271,7 @@ def get_esi(
         special_id=special_id,
         params=params,
         headers=headers,
+        config=config,
         logger=logger
     )[0]
 
@@ -133,6 +281,7 @@ def get_esi_address(
         special_id=None,
         params=None,
         headers=DEFAULT_HEADER,
+        config=None,
         logger=cli_core.DEFAULT_LOGGER
 ):
     """request wrapper for fetching ESI data
@@ -143,6 +292,7 @@ def get_esi_address(
         special_id (int, optional): get more information from standard endpoints
         params (:obj:`dict`, optional): params for REST request
         header (:obj:`dict`, optional): header information for request
+        config (:obj:`p_config.ProsperConfig`, optional): config with [ESI] and [CACHE] data
         logger (:obj:`logging.logger`, optional): logging handler
 
     Returns:
@@ -161,9 +311,28 @@ def get_esi_address(
         )
     logger.info('--fetching URL: %s', address)
 
-    req = requests.get(address, params=params, headers=headers)
+    cache = http_cache.get_response_cache(config)
+    key = http_cache.cache_key(address, params)
+    entry = cache.lookup(key) if cache else None
+    if entry and entry.fresh:
+        logger.info('--serving fresh response from cache')
+        return json_codec.loads(entry.body), address
+
+    request_headers = dict(headers)
+    if entry:
+        request_headers.update(entry.conditional_headers())
+
+    rate_limit.get_rate_limiter(config).acquire()
+    req = get_session(config).get(address, params=params, headers=request_headers)
+    if entry and req.status_code == 304:
+        logger.info('--response not modified, serving from cache')
+        cache.refresh(key, req.headers)
+        return json_codec.loads(entry.body), address
+
     req.raise_for_status()
-    data = req.json()
+    data = json_codec.loads(req.content)
+    if cache:
+        cache.store(key, req.headers, req.content)
 
     return data, address
 
@@ -215,8 +384,8 @@ def debug_dump(
     warnings.warn('Writing data to disk, not database', RuntimeWarning)
     file_name = '{}__{}.json'.format(file_name, datetime.utcnow().isoformat())
     file_path = path.join(dump_path, file_name)
-    with open(file_path, 'w') as dump_fh:
-        json.dump(raw_data, dump_fh)
+    with open(file_path, 'wb') as dump_fh:
+        dump_fh.write(json_codec.dumps(raw_data))
 
     return file_path
 
@@ -248,35 +417,66 @@ def write_provenance(
 
     logger.info('--passing data to Mongo')
     with conn as db_conn:
-        db_conn[provenance_collection].insert(metadata_obj)
+        db_conn[provenance_collection].insert_one(metadata_obj)
+
+def iter_record_chunks(
+        data,
+        chunk_size
+):
+    """split data into lists of records, without converting it all up front
+
+    Args:
+        data (:obj:`pandas.DataFrame` or :obj:`list`): data to split
+        chunk_size (int): max records per chunk
+
+    Yields:
+        :obj:`list`: records
+
+    """
+    if isinstance(data, dict):
+        data = [data]
+    for start in range(0, len(data), chunk_size):
+        if isinstance(data, list):
+            yield data[start:start + chunk_size]
+        else:
+            yield data.iloc[start:start + chunk_size].to_dict(orient='records')
 
 def dump_to_db(
         data_df,
         collection_name,
         conn,
         debug=False,
+        chunk_size=None,
+        writers=None,
         logger=cli_core.DEFAULT_LOGGER
 ):
     """push data to mongodb
 
+    Notes:
+        Records are converted and sent `chunk_size` at a time as unordered
+        bulk inserts.  With `writers` > 1, chunks go out on a thread pool with at
+        most 2x`writers` chunks held in memory.
+
     Args:
         data_df (:obj:`pandas.DataFrame` or :obj:`dict`): data to write to db
         collection_name (str): table to write data to
         conn (:obj:`MongoConnection`): database handle to write with
         debug (bool, optional): actually write to db?  Or dump to file
+        chunk_size (int, optional): records per insert, default [MONGO] write_chunk_size
+        writers (int, optional): concurrent writer threads, default [MONGO] write_workers
         logger (:obj:`logging.logger`, optional): logging handle
 
     Returns:
-        None?
+        int: documents acknowledged by mongo (str: dump file path in debug mode)
 
     """
-    if not isinstance(data_df, (dict, list)):
-        logger.info('--pulling data out of Pandas->list')
-        raw_data = data_df.to_dict(orient='records')
-    else:
-        raw_data = data_df
-
     if debug:
+        if not isinstance(data_df, (dict, list)):
+            logger.info('--pulling data out of Pandas->list')
+            raw_data = data_df.to_dict(orient='records')
+        else:
+            raw_data = data_df
+
         logger.warning('DEBUG MODE ENABLED: writing data to disk')
         dump_path = ''
         try:
@@ -292,15 +492,300 @@ def dump_to_db(
             dump_path=dump_path
         )
 
-    logger.info('--pushing data to mongodb')
+    chunk_size = chunk_size or int(
+        cli_core.CONFIG.get_option('MONGO', 'write_chunk_size', args_default=1000))
+    writers = writers or int(
+        cli_core.CONFIG.get_option('MONGO', 'write_workers', args_default=4))
+
+    logger.info('--pushing data to mongodb: chunks=%d writers=%d', chunk_size, writers)
     with conn as db_conn:
-        db_conn[collection_name].insert_many(raw_data)
+        collection = db_conn[collection_name]
+
+        def write_chunk(index, records):
+            result = collection.insert_many(records, ordered=False)
+            logger.debug('--chunk %d: %d documents acknowledged', index, len(result.inserted_ids))
+            return len(result.inserted_ids)
+
+        chunks = enumerate(iter_record_chunks(data_df, chunk_size))
+        if writers <= 1:
+            inserted = sum(write_chunk(index, records) for index, records in chunks)
+        else:
+            inserted = 0
+            with concurrent.futures.ThreadPoolExecutor(max_workers=writers) as executor:
+                in_flight = set()
+                for index, records in chunks:
+                    if len(in_flight) >= writers * 2:
+                        done, in_flight = concurrent.futures.wait(
+                            in_flight,
+                            return_when=concurrent.futures.FIRST_COMPLETED
+                        )
+                        inserted += sum(future.result() for future in done)
+                    in_flight.add(executor.submit(write_chunk, index, records))
+                inserted += sum(future.result() for future in in_flight)
+
+    logger.info('--inserted %d documents into %s', inserted, collection_name)
+    return inserted
+
+STAGING_SUFFIX = '__staging'
+PREVIOUS_SUFFIX = '__previous'
+
+def stage_collection(
+        data_df,
+        collection_name,
+        conn,
+        index_key=None,
+        debug=False,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """write a full replacement for a collection into its staging collection
+
+    Notes:
+        readers keep using `collection_name` untouched; follow with `swap_collection()`
+
+    Args:
+        data_df (:obj:`pandas.DataFrame`): complete new contents
+        collection_name (str): live collection being replaced
+        conn (:obj:`MongoConnection`): database handle to write with
+        index_key (str, optional): field to build a unique index on before the swap;
+            indexes registered for `collection_name` are always built
+        debug (bool, optional): actually write to db?  Or dump to file
+        logger (:obj:`logging.logger`, optional): logging handle
 
+    Returns:
+        str: name of staging collection
+
+    Raises:
+        :obj:`exceptions.StagingValidationFailed`: staged count does not match data
+
+    """
+    staging_name = collection_name + STAGING_SUFFIX
+    if debug:
+        dump_to_db(data_df, staging_name, conn, debug=True, logger=logger)
+        return staging_name
+
+    logger.info('--staging %d documents in %s', len(data_df), staging_name)
+    with conn as db_conn:
+        db_conn.drop_collection(staging_name)
+
+    dump_to_db(data_df, staging_name, conn, logger=logger)
+
+    with conn as db_conn:
+        staging = db_conn[staging_name]
+        staged_count = staging.count_documents({})
+
+    indexes.ensure_collection_indexes(
+        conn,
+        staging_name,
+        indexes.INDEX_REGISTRY.get(collection_name, []),
+        logger=logger
+    )
+    if index_key:
+        with conn as db_conn:
+            db_conn[staging_name].create_index(index_key, unique=True, name=index_key)
+
+    if staged_count != len(data_df):
+        raise exceptions.StagingValidationFailed(
+            '{}: staged {} documents, expected {}'.format(
+                staging_name, staged_count, len(data_df)
+            )
+        )
+
+    return staging_name
+
+def swap_collection(
+        collection_name,
+        conn,
+        keep_previous=True,
+        debug=False,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """atomically replace a live collection with its staging collection
+
+    Notes:
+        The live collection is copied to `<name>__previous` first, then the
+        staging collection is renamed over it with `dropTarget`, so readers
+        see either the old or the new version, never an empty collection
+
+    Args:
+        collection_name (str): live collection to replace
+        conn (:obj:`MongoConnection`): database handle
+        keep_previous (bool, optional): keep a copy of the old version for rollback
+        debug (bool, optional): actually touch the db?
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Raises:
+        :obj:`exceptions.StagingValidationFailed`: no staging collection to swap in
+
+    """
+    if debug:
+        logger.warning('DEBUG MODE -- skipping collection swap')
+        return
+
+    staging_name = collection_name + STAGING_SUFFIX
+    previous_name = collection_name + PREVIOUS_SUFFIX
+    with conn as db_conn:
+        collections = db_conn.list_collection_names()
+        if staging_name not in collections:
+            raise exceptions.StagingValidationFailed(
+                '{}: nothing staged to swap in'.format(staging_name)
+            )
+
+        if keep_previous and collection_name in collections:
+            logger.info('--keeping previous version as: %s', previous_name)
+            db_conn[collection_name].aggregate([{'$match': {}}, {'$out': previous_name}])
+
+        logger.info('--swapping %s -> %s', staging_name, collection_name)
+        db_conn[staging_name].rename(collection_name, dropTarget=True)
+
+def rollback_collection(
+        collection_name,
+        conn,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """atomically restore the version kept by the last `swap_collection()`
+
+    Notes:
+        The `$out` copy taken by `swap_collection()` carries no secondary
+        indexes, so registered indexes are rebuilt once it is live again
+
+    Args:
+        collection_name (str): live collection to restore
+        conn (:obj:`MongoConnection`): database handle
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Raises:
+        :obj:`exceptions.NoPreviousCollection`: no previous version kept
+
+    """
+    previous_name = collection_name + PREVIOUS_SUFFIX
+    with conn as db_conn:
+        if previous_name not in db_conn.list_collection_names():
+            raise exceptions.NoPreviousCollection(
+                '{}: no previous version to roll back to'.format(collection_name)
+            )
+
+        logger.warning('--rolling back %s -> %s', previous_name, collection_name)
+        db_conn[previous_name].rename(collection_name, dropTarget=True)
+
+    indexes.ensure_indexes(conn, [collection_name], logger=logger)
+
+def read_collection(
+        collection_name,
+        conn,
+        query=None,
+        projection=None,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """pull a collection out of mongodb into a dataframe
+
+    Args:
+        collection_name (str): table to read
+        conn (:obj:`MongoConnection`): database handle to read with
+        query (:obj:`dict`, optional): filter for documents
+        projection (:obj:`dict`, optional): fields to keep/drop
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        :obj:`pandas.DataFrame`: collection contents
+
+    """
+    logger.info('--reading data from: %s', collection_name)
+    with conn as db_conn:
+        cursor = db_conn[collection_name].find(query or {}, projection)
+        data_df = pd.DataFrame(list(cursor))
+
+    logger.info('--read records: %d', len(data_df))
+    return data_df
+
+def upsert_to_db(
+        data_df,
+        collection_name,
+        conn,
+        index_key,
+        debug=False,
+        chunk_size=None,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """replace-or-insert documents in mongodb, matched on `index_key`
+
+    Args:
+        data_df (:obj:`pandas.DataFrame`): data to write to db
+        collection_name (str): table to write data to
+        conn (:obj:`MongoConnection`): database handle to write with
+        index_key (str): field that identifies a document
+        debug (bool, optional): actually write to db?  Or dump to file
+        chunk_size (int, optional): records per bulk write, default [MONGO] write_chunk_size
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        int: documents inserted or modified (str: dump file path in debug mode)
+
+    """
+    if debug:
+        return dump_to_db(data_df, collection_name, conn, debug=True, logger=logger)
+
+    chunk_size = chunk_size or int(
+        cli_core.CONFIG.get_option('MONGO', 'write_chunk_size', args_default=1000))
+
+    logger.info('--upserting %d documents into %s', len(data_df), collection_name)
+    written = 0
+    with conn as db_conn:
+        collection = db_conn[collection_name]
+        for records in iter_record_chunks(data_df, chunk_size):
+            result = collection.bulk_write(
+                [
+                    pymongo.ReplaceOne({index_key: record[index_key]}, record, upsert=True)
+                    for record in records
+                ],
+                ordered=False
+            )
+            written += result.upserted_count + result.modified_count
+
+    logger.info('--upserted %d documents into %s', written, collection_name)
+    return written
+
+
+MONGO_CLIENTS = {}
+_MONGO_CLIENTS_LOCK = threading.Lock()
+def get_mongo_client(
+        mongo_address,
+        **pool_kwargs
+):
+    """process-wide pooled MongoClient, one per connection string + pool settings
+
+    Notes:
+        MongoClient is not fork-safe, so clients are also keyed by pid
+
+    Args:
+        mongo_address (str): mongo connection string, with password
+        **pool_kwargs: `pymongo.MongoClient` pool options (maxPoolSize, minPoolSize...)
+
+    Returns:
+        :obj:`pymongo.MongoClient`: shared client
+
+    """
+    key = (os.getpid(), mongo_address, tuple(sorted(pool_kwargs.items())))
+    with _MONGO_CLIENTS_LOCK:
+        if key not in MONGO_CLIENTS:
+            MONGO_CLIENTS[key] = pymongo.MongoClient(mongo_address, **pool_kwargs)
+        return MONGO_CLIENTS[key]
+
+def close_mongo_clients():
+    """shut down every shared MongoClient and its connection pool"""
+    with _MONGO_CLIENTS_LOCK:
+        for client in MONGO_CLIENTS.values():
+            client.close()
+        MONGO_CLIENTS.clear()
+atexit.register(close_mongo_clients)
 
 CONNECTION_STR = 'mongodb://{username}:{{password}}@{hostname}:{port}/{database}'
 class MongoConnection(object):
     """hacky session manager for pymongo con/curr
 
+    Notes:
+        `with` blocks share a warm, pooled client per connection string.
+        Leaving a block does not close it: see `close()`/`close_mongo_clients()`
+
     Args:
         config (:obj:`p_config.ProsperConfig`): config object with [MONGO] data
         logger (:obj:`logging.logger`, optional): logging handle
@@ -316,6 +801,11 @@ class MongoConnection(object):
         self.password = ''
         self.database = config.get('MONGO', 'database')
         self.mongo_address = self._load_connection(config)
+        self.pool_kwargs = {
+            'maxPoolSize': int(config.get_option('MONGO', 'max_pool_size', args_default=50)),
+            'minPoolSize': int(config.get_option('MONGO', 'min_pool_size', args_default=0)),
+        }
+        self.mongo_conn = None
 
     def _load_connection(
             self,
@@ -374,13 +864,23 @@ class MongoConnection(object):
             self.logger.warning('Missing connection info')
             raise exceptions.MissingMongoConnectionInfo
 
-        self.logger.info('Connecting to: %s', self.mongo_address)
+        self.logger.debug('Connecting to: %s', self.mongo_address)
         mongo_address = self.mongo_address.format(password=self.password)
 
-        self.mongo_conn = pymongo.MongoClient(mongo_address)
+        self.mongo_conn = get_mongo_client(mongo_address, **self.pool_kwargs)
 
         return self.mongo_conn[self.database]
 
     def __exit__(self, exception_type, exception_value, traceback):
-        """for `with obj()` logic -- close connection"""
-        self.mongo_conn.close()
+        """for `with obj()` logic -- hand connection back to the pool"""
+        pass
+
+    def close(self):
+        """shut down the shared client for this connection string"""
+        mongo_address = self.mongo_address.format(password=self.password)
+        key = (os.getpid(), mongo_address, tuple(sorted(self.pool_kwargs.items())))
+        with _MONGO_CLIENTS_LOCK:
+            client = MONGO_CLIENTS.pop(key, None)
+        if client:
+            client.close()
+        self.mongo_conn = None
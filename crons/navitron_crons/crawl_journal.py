@@ -0,0 +1,97 @@
+"""crawl_journal.py: checkpoint journal for long ESI crawls
+
+Every fetched document is appended to `<journal_path>/<endpoint>.ndjson` as it
+arrives, so a crashed crawl can pick up where it left off.
+
+"""
+from os import path
+import glob
+import os
+
+import navitron_crons.cli_core as cli_core
+import navitron_crons.json_codec as json_codec
+
+class CrawlJournal(object):
+    """append-only journal of fetched documents, one file per endpoint
+
+    Args:
+        journal_path (str): directory to keep journal files in
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    def __init__(
+            self,
+            journal_path,
+            logger=cli_core.DEFAULT_LOGGER
+    ):
+        self.journal_path = journal_path
+        self.logger = logger
+        self._handles = {}
+        os.makedirs(journal_path, exist_ok=True)
+
+    def _file_path(self, endpoint):
+        """str: journal file for endpoint"""
+        return path.join(self.journal_path, '{}.ndjson'.format(endpoint))
+
+    def load(self, endpoint):
+        """read back every document recorded for an endpoint
+
+        Notes:
+            a torn last line (crash mid-write) is skipped and refetched
+
+        Args:
+            endpoint (str): journal name, e.g. `systems`
+
+        Returns:
+            :obj:`dict`: id -> document
+
+        """
+        documents = {}
+        file_path = self._file_path(endpoint)
+        if not path.isfile(file_path):
+            return documents
+
+        with open(file_path, 'rb') as journal_fh:
+            for line in journal_fh:
+                try:
+                    id_val, document = json_codec.loads(line)
+                except ValueError:
+                    self.logger.warning('--skipping torn journal line in %s', file_path)
+                    continue
+                documents[id_val] = document
+
+        self.logger.info('--loaded %d %s from journal', len(documents), endpoint)
+        return documents
+
+    def record(self, endpoint, id_val, document):
+        """append one fetched document
+
+        Args:
+            endpoint (str): journal name, e.g. `systems`
+            id_val (int): id the document was fetched for
+            document (:obj:`dict`): JSON return from ESI
+
+        """
+        if endpoint not in self._handles:
+            self._handles[endpoint] = open(self._file_path(endpoint), 'ab')
+        journal_fh = self._handles[endpoint]
+        journal_fh.write(json_codec.dumps([id_val, document]) + b'\n')
+        journal_fh.flush()
+
+    def close(self):
+        """close open journal files"""
+        for journal_fh in self._handles.values():
+            journal_fh.close()
+        self._handles = {}
+
+    def clear(self):
+        """drop the journal: crawl finished or starting fresh
+
+        Notes:
+            only `<endpoint>.ndjson` files are removed; `journal_path` may be
+            a shared folder, so it and anything else in it are left alone
+
+        """
+        self.close()
+        for file_path in glob.glob(self._file_path('*')):
+            os.remove(file_path)
@@ -0,0 +1,289 @@
+"""dump_writers.py: incremental output formats for `navitron_dump_database`
+
+Every writer takes dataframe batches through `write()` and produces a single
+file, written to `<path>.partial` and renamed into place by `close()`.
+`PartitionedWriter` fans batches out to one writer per `cron_datetime` day.
+
+Formats:
+    csv, csv.gz, csv.zst: pandas csv with a continuous row index
+    ndjson.zst: one JSON document per line, zstandard compressed
+    parquet: one row group per batch, with `COLUMN_DTYPES` applied
+
+"""
+from os import path
+import gzip
+import io
+import os
+
+import pandas as pd
+
+import navitron_crons.json_codec as json_codec
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+FORMATS = ('csv', 'csv.gz', 'csv.zst', 'ndjson.zst', 'parquet')
+PARTITION_COLUMN = 'cron_datetime'
+
+COLUMN_DTYPES = {
+    'system_id': 'Int32',
+    'ship_jumps': 'Int32',
+    'ship_kills': 'Int32',
+    'npc_kills': 'Int32',
+    'pod_kills': 'Int32',
+    'players': 'Int32',
+    'constellation_id': 'Int32',
+    'region_id': 'Int32',
+    'security_status': 'float32',
+    'write_recipt': 'string',
+    'server_version': 'string',
+    'cron_datetime': 'datetime64[ns]',
+    'start_time': 'datetime64[ns]',
+}
+
+def apply_dtypes(batch, dtypes=COLUMN_DTYPES):
+    """cast known columns to compact, nullable dtypes
+
+    Args:
+        batch (:obj:`pandas.DataFrame`): rows from mongo
+        dtypes (:obj:`dict`, optional): column -> pandas dtype
+
+    Returns:
+        :obj:`pandas.DataFrame`: typed batch
+
+    """
+    batch = batch.copy()
+    casts = {}
+    for column, dtype in dtypes.items():
+        if column not in batch.columns:
+            continue
+        if dtype.startswith('datetime64'):
+            batch[column] = pd.to_datetime(batch[column], utc=True).dt.tz_localize(None)
+        else:
+            casts[column] = dtype
+    return batch.astype(casts)
+
+class DumpWriter(object):
+    """base writer: `.partial` file handling
+
+    Args:
+        file_path (str): final output path
+
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.partial_path = file_path + '.partial'
+        self.rows = 0
+
+    def write(self, batch):
+        """append one :obj:`pandas.DataFrame` batch"""
+        raise NotImplementedError
+
+    def _close_handle(self):
+        """flush and close the underlying file"""
+        raise NotImplementedError
+
+    def close(self):
+        """finish the file and move it into place"""
+        self._close_handle()
+        os.replace(self.partial_path, self.file_path)
+
+    def abort(self):
+        """drop the partial file"""
+        self._close_handle()
+        if path.isfile(self.partial_path):
+            os.remove(self.partial_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        if exception_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def _zstd_writer(file_path):
+    """binary zstandard stream over a new file"""
+    if zstandard is None:
+        raise ImportError('zstandard required for .zst output: `pip install zstandard`')
+    return zstandard.ZstdCompressor(level=3).stream_writer(open(file_path, 'wb'))
+
+class CsvWriter(DumpWriter):
+    """csv, optionally gzip/zstandard compressed
+
+    Args:
+        file_path (str): final output path
+        compression (str, optional): `gzip` or `zstd`
+
+    """
+    def __init__(self, file_path, compression=None):
+        super().__init__(file_path)
+        if compression == 'gzip':
+            self._fh = gzip.open(self.partial_path, 'wt', newline='')
+        elif compression == 'zstd':
+            self._fh = io.TextIOWrapper(
+                _zstd_writer(self.partial_path), encoding='utf-8', newline='')
+        else:
+            self._fh = open(self.partial_path, 'w', newline='')
+        self.columns = None
+
+    def write(self, batch):
+        if self.columns is None:
+            self.columns = list(batch.columns)
+        batch = batch.reindex(columns=self.columns)
+        batch.index = pd.RangeIndex(self.rows, self.rows + len(batch))
+        batch.to_csv(self._fh, header=self.rows == 0)
+        self.rows += len(batch)
+
+    def _close_handle(self):
+        self._fh.close()
+
+class NdjsonWriter(DumpWriter):
+    """zstandard-compressed newline-delimited JSON
+
+    Args:
+        file_path (str): final output path
+
+    """
+    def __init__(self, file_path):
+        super().__init__(file_path)
+        self._fh = _zstd_writer(self.partial_path)
+
+    def write(self, batch):
+        self._fh.write(b''.join(
+            json_codec.dumps(record) + b'\n'
+            for record in batch.to_dict(orient='records')
+        ))
+        self.rows += len(batch)
+
+    def _close_handle(self):
+        self._fh.close()
+
+class ParquetWriter(DumpWriter):
+    """parquet, one row group per batch; schema fixed by the first batch
+
+    Notes:
+        Later batches are cast to that schema: like csv, columns the first
+        batch did not have are dropped and missing ones are null.  A column
+        that is all null in the first batch has no type yet, so it is
+        stored as string
+
+    Args:
+        file_path (str): final output path
+        dtypes (:obj:`dict`, optional): column -> pandas dtype
+
+    """
+    def __init__(self, file_path, dtypes=COLUMN_DTYPES):
+        if pyarrow is None:
+            raise ImportError('pyarrow required for parquet output: `pip install pyarrow`')
+        super().__init__(file_path)
+        self.dtypes = dtypes
+        self.schema = None
+        self._writer = None
+
+    def write(self, batch):
+        batch = apply_dtypes(batch, self.dtypes)
+        if self.schema is None:
+            schema = pyarrow.Schema.from_pandas(batch, preserve_index=False)
+            for index, field in enumerate(schema):
+                if pyarrow.types.is_null(field.type):
+                    schema = schema.set(index, field.with_type(pyarrow.string()))
+            self.schema = schema
+            self._writer = pyarrow.parquet.ParquetWriter(
+                self.partial_path,
+                self.schema,
+                compression='zstd'
+            )
+        batch = batch.reindex(columns=self.schema.names)
+        table = pyarrow.Table.from_pandas(batch, preserve_index=False)
+        self._writer.write_table(table.cast(self.schema))
+        self.rows += len(batch)
+
+    def _close_handle(self):
+        if self._writer is None:
+            # empty collection: still leave a valid (empty) file behind
+            self._writer = pyarrow.parquet.ParquetWriter(self.partial_path, pyarrow.schema([]))
+        self._writer.close()
+
+def open_writer(file_path, output_format):
+    """build the writer for a format
+
+    Args:
+        file_path (str): final output path
+        output_format (str): one of `FORMATS`
+
+    Returns:
+        :obj:`DumpWriter`: open writer
+
+    """
+    if output_format == 'csv':
+        return CsvWriter(file_path)
+    if output_format == 'csv.gz':
+        return CsvWriter(file_path, compression='gzip')
+    if output_format == 'csv.zst':
+        return CsvWriter(file_path, compression='zstd')
+    if output_format == 'ndjson.zst':
+        return NdjsonWriter(file_path)
+    if output_format == 'parquet':
+        return ParquetWriter(file_path)
+    raise ValueError('unknown output format: {}'.format(output_format))
+
+class PartitionedWriter(DumpWriter):
+    """hive-style `<dir>/cron_date=YYYY-MM-DD/part-0.<format>` output
+
+    Args:
+        dir_path (str): dataset directory
+        output_format (str): one of `FORMATS`
+        column (str, optional): ISO datetime column to partition on
+        part_name (str, optional): file name stem inside each partition
+
+    """
+    def __init__(
+            self,
+            dir_path,
+            output_format,
+            column=PARTITION_COLUMN,
+            part_name='part-0'
+    ):
+        super().__init__(dir_path)
+        self.output_format = output_format
+        self.column = column
+        self.part_name = part_name
+        self.writers = {}
+
+    def partition_path(self, day):
+        """str: output file for one day"""
+        return path.join(
+            self.file_path,
+            'cron_date={}'.format(day),
+            '{}.{}'.format(self.part_name, self.output_format)
+        )
+
+    def write(self, batch):
+        days = batch[self.column].astype(str).str[:10]
+        for day, day_batch in batch.groupby(days, sort=False):
+            if day not in self.writers:
+                os.makedirs(path.dirname(self.partition_path(day)), exist_ok=True)
+                self.writers[day] = open_writer(self.partition_path(day), self.output_format)
+            self.writers[day].write(day_batch)
+        self.rows += len(batch)
+
+    def _close_handle(self):
+        pass
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+    def abort(self):
+        for writer in self.writers.values():
+            writer.abort()
@@ -16,3 +16,9 @@ class MissingMongoConnectionInfo(ConnectionException):
 class NoSDEDataFound(ConnectionException):
     """Blank collection found where SDE was expected"""
     pass
+class StagingValidationFailed(ConnectionException):
+    """Staged collection does not match what was written, live collection untouched"""
+    pass
+class NoPreviousCollection(ConnectionException):
+    """Nothing to roll back to"""
+    pass
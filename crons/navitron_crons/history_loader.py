@@ -0,0 +1,193 @@
+"""history_loader.py: stream system_stats history into dense [system, snapshot] arrays
+
+Replaces `pd.DataFrame(list(collection.find({})))` for analysis: documents are
+read through a projected cursor in large batches and scattered straight into
+preallocated NumPy arrays, one per metric, so no per-document frame is built.
+
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import navitron_crons.cli_core as cli_core
+import navitron_crons.stats_buckets as stats_buckets
+
+METRIC_DTYPE = np.int32
+SCATTER_CHUNK = 65536
+
+class SystemHistory(namedtuple('SystemHistory', ['system_ids', 'snapshots', 'metrics'])):
+    """dense stats history
+
+    Attributes:
+        system_ids (:obj:`numpy.ndarray`): sorted int32 ids, row index
+        snapshots (:obj:`numpy.ndarray`): sorted datetime64[s] cron times, column index
+        metrics (:obj:`dict`): metric name -> int32 array of shape [system, snapshot];
+            systems missing from a snapshot had no activity and read 0
+
+    """
+    __slots__ = ()
+
+    def to_frame(self, metric):
+        """:obj:`pandas.DataFrame`: one metric, systems x snapshots"""
+        return pd.DataFrame(
+            self.metrics[metric],
+            index=pd.Index(self.system_ids, name='system_id'),
+            columns=pd.Index(self.snapshots, name='cron_datetime')
+        )
+
+def _cron_query(start, end):
+    """`cron_datetime` range filter: ISO strings sort like the times they hold"""
+    return stats_buckets.time_query(
+        'cron_datetime',
+        start.isoformat() if start is not None else None,
+        end.isoformat() if end is not None else None
+    )
+
+def _scatter(arrays, metrics, rows, cols, values):
+    """write one chunk of buffered values into the dense arrays"""
+    for index, metric in enumerate(metrics):
+        arrays[metric][rows, cols] = values[index]
+
+def load_history(
+        conn,
+        start=None,
+        end=None,
+        metrics=stats_buckets.METRIC_FIELDS,
+        system_ids=None,
+        layout='documents',
+        batch_size=50000,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """load a date range of system_stats into [system, snapshot] arrays
+
+    Args:
+        conn (:obj:`connections.MongoConnection`): database handle
+        start (:obj:`datetime.datetime`, optional): first snapshot to include
+        end (:obj:`datetime.datetime`, optional): stop before this snapshot
+        metrics (:obj:`tuple`, optional): metric fields to load
+        system_ids (iterable, optional): rows to keep, e.g. every SDE system;
+            default every system seen in range
+        layout (str, optional): storage layout, see `stats_buckets.LAYOUTS`
+        batch_size (int, optional): documents per cursor round trip
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        :obj:`SystemHistory`: dense history
+
+    """
+    metrics = tuple(metrics)
+    collection_name = stats_buckets.LAYOUT_COLLECTIONS[layout]
+    query = _cron_query(start, end)
+
+    with conn as db_conn:
+        collection = db_conn[collection_name]
+        snapshots = sorted(collection.distinct('cron_datetime', query))
+        if system_ids is None and layout != 'bucket':
+            system_ids = collection.distinct('system_id', query)
+        logger.info('--loading %d snapshots from %s', len(snapshots), collection_name)
+
+        snapshot_index = {cron_datetime: col for col, cron_datetime in enumerate(snapshots)}
+        if layout == 'bucket':
+            history = _load_buckets(
+                collection, query, metrics, system_ids, snapshot_index, batch_size
+            )
+        else:
+            history = _load_documents(
+                collection, query, metrics, system_ids, snapshot_index, batch_size
+            )
+
+    logger.info(
+        '--loaded history: %d systems x %d snapshots',
+        len(history.system_ids),
+        len(history.snapshots)
+    )
+    return history
+
+def _allocate(system_ids, snapshot_index, metrics):
+    """sorted id index + zeroed metric arrays"""
+    system_ids = np.unique(np.asarray(list(system_ids), dtype=np.int32))
+    arrays = {
+        metric: np.zeros((len(system_ids), len(snapshot_index)), dtype=METRIC_DTYPE)
+        for metric in metrics
+    }
+    return system_ids, arrays
+
+def _row_index(system_ids, ids):
+    """map ids onto rows; -1 for ids not in `system_ids`"""
+    rows = np.searchsorted(system_ids, ids)
+    rows[rows == len(system_ids)] = 0
+    found = system_ids[rows] == ids if len(system_ids) else np.zeros(len(ids), dtype=bool)
+    return np.where(found, rows, -1)
+
+def _snapshot_labels(snapshot_index):
+    """:obj:`numpy.ndarray`: datetime64[s] column labels"""
+    return np.array(list(snapshot_index), dtype='datetime64[s]')
+
+def _load_documents(collection, query, metrics, system_ids, snapshot_index, batch_size):
+    """one document per system per snapshot: buffer and scatter in chunks"""
+    system_ids, arrays = _allocate(system_ids, snapshot_index, metrics)
+    projection = {field: True for field in ('system_id', 'cron_datetime') + metrics}
+    projection['_id'] = False
+
+    ids = np.empty(SCATTER_CHUNK, dtype=np.int64)
+    cols = np.empty(SCATTER_CHUNK, dtype=np.int64)
+    values = np.zeros((len(metrics), SCATTER_CHUNK), dtype=METRIC_DTYPE)
+
+    def flush(count):
+        rows = _row_index(system_ids, ids[:count])
+        keep = rows >= 0
+        _scatter(arrays, metrics, rows[keep], cols[:count][keep], values[:, :count][:, keep])
+
+    count = 0
+    for document in collection.find(query, projection).batch_size(batch_size):
+        ids[count] = document['system_id']
+        cols[count] = snapshot_index[document['cron_datetime']]
+        for index, metric in enumerate(metrics):
+            values[index, count] = document.get(metric) or 0
+        count += 1
+        if count == SCATTER_CHUNK:
+            flush(count)
+            count = 0
+    if count:
+        flush(count)
+
+    return SystemHistory(system_ids, _snapshot_labels(snapshot_index), arrays)
+
+def _bucket_system_ids(collection, query, batch_size):
+    """every system id packed into the buckets in range, one bucket at a time"""
+    system_ids = np.zeros(0, dtype=stats_buckets.ARRAY_DTYPE)
+    projection = {'system_id': True, '_id': False}
+    for bucket in collection.find(query, projection).batch_size(batch_size):
+        system_ids = np.union1d(
+            system_ids,
+            np.frombuffer(bucket['system_id'], dtype=stats_buckets.ARRAY_DTYPE)
+        )
+    return system_ids
+
+def _load_buckets(collection, query, metrics, system_ids, snapshot_index, batch_size):
+    """one packed document per snapshot: each bucket fills a column
+
+    Notes:
+        ids are packed bytes, so `distinct()` cannot find the row axis: when
+        `system_ids` is not given, a first pass reads just the id arrays
+
+    """
+    if system_ids is None:
+        system_ids = _bucket_system_ids(collection, query, batch_size)
+    system_ids, arrays = _allocate(system_ids, snapshot_index, metrics)
+
+    projection = {field: True for field in ('system_id', 'cron_datetime') + metrics}
+    projection['_id'] = False
+    for bucket in collection.find(query, projection).batch_size(batch_size):
+        col = snapshot_index[bucket['cron_datetime']]
+        rows = _row_index(
+            system_ids,
+            np.frombuffer(bucket['system_id'], dtype=stats_buckets.ARRAY_DTYPE)
+        )
+        keep = rows >= 0
+        for metric in metrics:
+            column = np.frombuffer(bucket[metric], dtype=stats_buckets.ARRAY_DTYPE)
+            arrays[metric][rows[keep], col] = column[keep]
+
+    return SystemHistory(system_ids, _snapshot_labels(snapshot_index), arrays)
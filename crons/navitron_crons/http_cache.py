@@ -0,0 +1,242 @@
+"""http_cache.py: persistent conditional-request cache for ESI responses
+
+Responses are stored by url in a local sqlite file alongside their `ETag`,
+`Last-Modified` and `Expires` headers.  Fresh entries are served without
+touching the network; stale ones are revalidated with `If-None-Match` /
+`If-Modified-Since` and a 304 counts as a hit.  Total body size is bounded
+by evicting least-recently-used entries.
+
+"""
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+from os import path
+from urllib.parse import urlencode
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+
+import navitron_crons.cli_core as cli_core
+
+MAX_AGE = re.compile(r'max-age=(\d+)')
+
+def parse_expires(headers, now=None):
+    """find when a response goes stale
+
+    Notes:
+        `Cache-Control: max-age` beats `Expires`, as in RFC 7234
+
+    Args:
+        headers (:obj:`dict`): response headers
+        now (float, optional): epoch time of response
+
+    Returns:
+        float: epoch time the response expires, 0 if unknown
+
+    """
+    now = now or time.time()
+    cache_control = headers.get('Cache-Control', '')
+    if 'no-store' in cache_control or 'no-cache' in cache_control:
+        return 0.0
+
+    max_age = MAX_AGE.search(cache_control)
+    if max_age:
+        return now + int(max_age.group(1))
+
+    expires = headers.get('Expires')
+    if expires:
+        try:
+            return parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            return 0.0
+
+    return 0.0
+
+def cache_key(address, params=None):
+    """build a stable url key, with sorted query params
+
+    Args:
+        address (str): request url
+        params (:obj:`dict`, optional): query params for request
+
+    Returns:
+        str: cache key
+
+    """
+    if not params:
+        return address
+    return '{address}?{query}'.format(
+        address=address,
+        query=urlencode(sorted(params.items()))
+    )
+
+class CacheEntry(namedtuple('CacheEntry', ['url', 'etag', 'last_modified', 'expires', 'body'])):
+    """one cached response body and its validators"""
+    __slots__ = ()
+
+    @property
+    def fresh(self):
+        """bool: can be served without asking ESI"""
+        return self.expires > time.time()
+
+    def conditional_headers(self):
+        """:obj:`dict`: headers for revalidating a stale entry"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class ResponseCache(object):
+    """size-bounded LRU cache of ESI responses on disk
+
+    Notes:
+        Safe to share between threads; sqlite handles locking between processes
+
+    Args:
+        cache_path (str): path to sqlite cache file
+        max_bytes (int, optional): total body size kept before LRU eviction
+
+    """
+    def __init__(
+            self,
+            cache_path,
+            max_bytes=256 * 1024 * 1024
+    ):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, expires REAL, '
+                'body BLOB, size INTEGER, accessed REAL)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)'
+            )
+            self._total = self._conn.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()[0]
+
+    def lookup(self, url):
+        """find a cached response, fresh or stale
+
+        Args:
+            url (str): cache key
+
+        Returns:
+            :obj:`CacheEntry`: cached response or None
+
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT url, etag, last_modified, expires, body FROM responses WHERE url=?',
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                'UPDATE responses SET accessed=? WHERE url=?',
+                (time.time(), url)
+            )
+        return CacheEntry(*row)
+
+    def store(self, url, headers, body):
+        """save a 200 response, if it carries any validator or lifetime
+
+        Args:
+            url (str): cache key
+            headers (:obj:`dict`): response headers
+            body (bytes): raw response body
+
+        """
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        expires = parse_expires(headers)
+        if not (etag or last_modified or expires):
+            return
+
+        with self._lock, self._conn:
+            old = self._conn.execute(
+                'SELECT size FROM responses WHERE url=?', (url,)
+            ).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, etag, last_modified, expires, body, len(body), time.time())
+            )
+            self._total += len(body) - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def refresh(self, url, headers):
+        """extend a stale entry after a 304 Not Modified
+
+        Args:
+            url (str): cache key
+            headers (:obj:`dict`): 304 response headers
+
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                'UPDATE responses SET expires=?, etag=COALESCE(?, etag), accessed=? WHERE url=?',
+                (parse_expires(headers), headers.get('ETag'), time.time(), url)
+            )
+
+    def _evict(self):
+        """drop least-recently-used entries until under `max_bytes`
+
+        Notes:
+            caller must hold `_lock` and a transaction
+
+        """
+        self._total = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses'
+        ).fetchone()[0]
+        target = self.max_bytes * 0.9
+        doomed = []
+        for url, size in self._conn.execute(
+                'SELECT url, size FROM responses ORDER BY accessed'
+        ):
+            if self._total <= target:
+                break
+            doomed.append((url,))
+            self._total -= size
+        self._conn.executemany('DELETE FROM responses WHERE url=?', doomed)
+
+    def close(self):
+        """release sqlite handle"""
+        self._conn.close()
+
+DEFAULT_CACHE_PATH = path.join(tempfile.gettempdir(), 'navitron_esi_cache.sqlite')
+RESPONSE_CACHE = None
+def get_response_cache(config=None):
+    """process-wide response cache, built from [CACHE] config on first use
+
+    Args:
+        config (:obj:`p_config.ProsperConfig`, optional): config with [CACHE] data
+
+    Returns:
+        :obj:`ResponseCache`: shared cache, or None if disabled
+
+    """
+    global RESPONSE_CACHE
+    if RESPONSE_CACHE is not None:
+        return RESPONSE_CACHE or None
+
+    config = config or cli_core.CONFIG
+    enabled = config.get_option('CACHE', 'enabled', args_default='True')
+    if str(enabled).lower() not in ('true', '1', 'yes'):
+        RESPONSE_CACHE = False
+        return None
+
+    RESPONSE_CACHE = ResponseCache(
+        config.get_option('CACHE', 'cache_path', args_default=DEFAULT_CACHE_PATH),
+        max_bytes=int(config.get_option('CACHE', 'max_mb', args_default=256)) * 1024 * 1024
+    )
+    return RESPONSE_CACHE
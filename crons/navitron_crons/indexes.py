@@ -0,0 +1,189 @@
+"""indexes.py: declarative index registry for navitron collections
+
+Every collection the crons write to declares its indexes in `INDEX_REGISTRY`.
+Apps call `ensure_indexes()` at startup; `create_indexes` is idempotent, so a
+warm database costs one round trip per collection.
+
+Notes:
+    TTL indexes need a BSON date field.  `cron_datetime` is stored as an ISO
+    string, so TTL specs (`expireAfterSeconds` in `options`) only go on
+    collections that carry real dates.
+
+"""
+from collections import namedtuple
+
+import pandas as pd
+import pymongo
+
+import navitron_crons.cli_core as cli_core
+
+class IndexSpec(namedtuple('IndexSpec', ['name', 'keys', 'options'])):
+    """one declared index: `keys` is a list of (field, direction) pairs"""
+    __slots__ = ()
+
+    def to_model(self):
+        """:obj:`pymongo.IndexModel`: spec for `create_indexes()`"""
+        return pymongo.IndexModel(self.keys, name=self.name, **self.options)
+
+def index(name, *keys, **options):
+    """shorthand for declaring an :obj:`IndexSpec`"""
+    return IndexSpec(name, list(keys), options)
+
+ASC = pymongo.ASCENDING
+DESC = pymongo.DESCENDING
+
+INDEX_REGISTRY = {
+    'navitron_system_stats': [
+        index('cron_datetime_system_id', ('cron_datetime', DESC), ('system_id', ASC)),
+        index('system_id_cron_datetime', ('system_id', ASC), ('cron_datetime', DESC)),
+        index('write_recipt', ('write_recipt', ASC)),
+    ],
+    'navitron_system_stats_buckets': [
+        index('cron_datetime', ('cron_datetime', DESC), unique=True),
+        index('write_recipt', ('write_recipt', ASC)),
+    ],
+    'navitron_system_stats_ts': [
+        index('system_id_snapshot_time', ('system_id', ASC), ('snapshot_time', DESC)),
+        index('write_recipt', ('write_recipt', ASC)),
+    ],
+    'navitron_server_status': [
+        index('cron_datetime', ('cron_datetime', DESC)),
+        index('write_recipt', ('write_recipt', ASC)),
+    ],
+    'navitron_sde_universe': [
+        index('system_id', ('system_id', ASC), unique=True),
+        index('constellation_id', ('constellation_id', ASC)),
+        index('region_id', ('region_id', ASC)),
+        index('write_recipt', ('write_recipt', ASC)),
+    ],
+    'provenance_recipts': [
+        index('write_recipt', ('write_recipt', ASC), unique=True),
+        index('data_source_cron_datetime', ('data_source', ASC), ('cron_datetime', DESC)),
+    ],
+}
+
+def ensure_collection_indexes(
+        conn,
+        collection_name,
+        specs,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """create any missing indexes on one collection
+
+    Args:
+        conn (:obj:`connections.MongoConnection`): database handle
+        collection_name (str): collection to index
+        specs (:obj:`list`): :obj:`IndexSpec` to ensure
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        :obj:`list`: index names on the collection
+
+    """
+    if not specs:
+        return []
+
+    logger.debug('--ensuring %d indexes on %s', len(specs), collection_name)
+    with conn as db_conn:
+        return db_conn[collection_name].create_indexes([spec.to_model() for spec in specs])
+
+def ensure_indexes(
+        conn,
+        collections=None,
+        registry=INDEX_REGISTRY,
+        debug=False,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """create registered indexes for a set of collections
+
+    Notes:
+        Failures are logged, not raised: a missing index slows reads, it
+        should not stop a cron from writing its snapshot
+
+    Args:
+        conn (:obj:`connections.MongoConnection`): database handle
+        collections (:obj:`list`, optional): collections to index, default all registered
+        registry (:obj:`dict`, optional): collection -> :obj:`IndexSpec` list
+        debug (bool, optional): actually touch the db?
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        :obj:`dict`: collection -> index names ensured
+
+    """
+    if debug:
+        logger.warning('DEBUG MODE -- skipping index build')
+        return {}
+
+    ensured = {}
+    for collection_name in collections or list(registry):
+        try:
+            ensured[collection_name] = ensure_collection_indexes(
+                conn,
+                collection_name,
+                registry.get(collection_name, []),
+                logger=logger
+            )
+        except Exception:
+            logger.warning(
+                '--unable to ensure indexes on %s',
+                collection_name,
+                exc_info=True
+            )
+
+    return ensured
+
+def index_usage(
+        conn,
+        collections=None,
+        registry=INDEX_REGISTRY,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """report per-index access counts and sizes
+
+    Args:
+        conn (:obj:`connections.MongoConnection`): database handle
+        collections (:obj:`list`, optional): collections to report, default all in db
+        registry (:obj:`dict`, optional): collection -> :obj:`IndexSpec` list
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        :obj:`pandas.DataFrame`: collection, index, ops, since, size_bytes, registered
+
+    """
+    rows = []
+    with conn as db_conn:
+        for collection_name in collections or sorted(db_conn.list_collection_names()):
+            logger.debug('--reading index stats for %s', collection_name)
+            collection = db_conn[collection_name]
+            index_sizes = {}
+            for stats in collection.aggregate([{'$collStats': {'storageStats': {}}}]):
+                index_sizes.update(stats['storageStats'].get('indexSizes', {}))
+
+            registered = {spec.name for spec in registry.get(collection_name, [])}
+            found = set()
+            for stats in collection.aggregate([{'$indexStats': {}}]):
+                found.add(stats['name'])
+                rows.append({
+                    'collection': collection_name,
+                    'index': stats['name'],
+                    'ops': stats['accesses']['ops'],
+                    'since': stats['accesses']['since'],
+                    'size_bytes': index_sizes.get(stats['name'], 0),
+                    'registered': stats['name'] in registered,
+                })
+
+            for missing in sorted(registered - found):
+                rows.append({
+                    'collection': collection_name,
+                    'index': missing,
+                    'ops': None,
+                    'since': None,
+                    'size_bytes': None,
+                    'registered': True,
+                })
+
+    return pd.DataFrame(
+        rows,
+        columns=['collection', 'index', 'ops', 'since', 'size_bytes', 'registered']
+    )
@@ -0,0 +1,104 @@
+"""json_codec.py: pluggable JSON codec -- orjson > ujson > stdlib json
+
+Decodes straight from response bytes and encodes straight to bytes, so hot
+paths never build an intermediate str.  `CODEC` is picked once at import;
+use `get_codec()` to pin a specific backend.
+
+"""
+from collections import namedtuple
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+Codec = namedtuple('Codec', ['name', 'loads', 'dumps'])
+Codec.__doc__ = """JSON backend: `loads(bytes|str)`, `dumps(obj) -> bytes`"""
+
+def _default(obj):
+    """unwrap numpy scalars, stringify anything else unknown (datetimes, ObjectIds)"""
+    if hasattr(obj, 'item'):
+        return obj.item()
+    return str(obj)
+
+def _json_dumps(obj):
+    """stdlib encoder"""
+    return json.dumps(obj, default=_default).encode('utf-8')
+
+def _orjson_dumps(obj):
+    """orjson encoder, numpy aware"""
+    return orjson.dumps(
+        obj,
+        default=_default,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    )
+
+def _ujson_dumps(obj):
+    """ujson encoder, with stdlib fallback for types it refuses"""
+    try:
+        return ujson.dumps(obj).encode('utf-8')
+    except (TypeError, OverflowError):
+        return _json_dumps(obj)
+
+BACKENDS = {
+    'json': lambda: Codec('json', json.loads, _json_dumps),
+    'ujson': lambda: Codec('ujson', ujson.loads, _ujson_dumps) if ujson else None,
+    'orjson': lambda: Codec('orjson', orjson.loads, _orjson_dumps) if orjson else None,
+}
+PREFERENCE = ('orjson', 'ujson', 'json')
+
+def get_codec(name=None):
+    """find a JSON backend
+
+    Args:
+        name (str, optional): `orjson`, `ujson` or `json`; fastest available if blank
+
+    Returns:
+        :obj:`Codec`: backend
+
+    Raises:
+        ImportError: requested backend is not installed
+
+    """
+    if name:
+        codec = BACKENDS[name]()
+        if codec is None:
+            raise ImportError('JSON backend not installed: {}'.format(name))
+        return codec
+
+    for backend in PREFERENCE:
+        codec = BACKENDS[backend]()
+        if codec:
+            return codec
+
+CODEC = get_codec()
+
+def loads(data):
+    """decode JSON
+
+    Args:
+        data (bytes or str): raw JSON
+
+    Returns:
+        decoded object
+
+    """
+    return CODEC.loads(data)
+
+def dumps(obj):
+    """encode JSON
+
+    Args:
+        obj: JSON-serializable object
+
+    Returns:
+        bytes: utf-8 JSON
+
+    """
+    return CODEC.dumps(obj)
@@ -0,0 +1,322 @@
+"""jump_matrix.py: precomputed all-pairs stargate jump counts
+
+`build_jump_matrix()` runs a breadth-first search from every system and
+writes the hop counts into a uint8 N x N `.npy` file beside the graph
+snapshot, keyed to the graph's `topology_hash()`: an SDE run that does not
+move any stargate keeps using the same matrix.  `UNREACHABLE` marks pairs with
+no stargate route (e.g. anything in w-space).  Rows are built in blocks of
+sources at once, level-synchronously with one bit per source, so each level
+is a handful of NumPy gathers instead of a Python loop per node.
+
+Readers `np.load(mmap_mode='r')` the file: 8k systems is ~64MB shared through
+the page cache, and a lookup is one byte read.
+
+"""
+from array import array
+from os import path
+import concurrent.futures
+import glob
+import os
+
+import numpy as np
+
+import navitron_crons.cli_core as cli_core
+import navitron_crons.universe_graph as universe_graph
+
+MATRIX_DTYPE = np.uint8
+UNREACHABLE = np.iinfo(MATRIX_DTYPE).max
+BLOCK_SIZE = 1024
+WORD_BITS = 64
+
+def matrix_name(topology_hash):
+    """str: jump matrix file name for one stargate layout"""
+    return 'jumps.{}.npy'.format(topology_hash)
+
+def is_symmetric(graph):
+    """bool: every stargate has a partner gate back"""
+    sources = np.repeat(np.arange(len(graph), dtype=np.int64), graph.degree())
+    forward = np.sort(sources * len(graph) + graph.indices)
+    backward = np.sort(graph.indices.astype(np.int64) * len(graph) + sources)
+    return bool(np.array_equal(forward, backward))
+
+def _incoming(graph):
+    """edge sources grouped by target, with the targets that have any
+
+    Returns:
+        (:obj:`numpy.ndarray`, :obj:`numpy.ndarray`, :obj:`numpy.ndarray`):
+            sources sorted by target, `reduceat` offsets, targets at those offsets
+
+    """
+    sources = np.repeat(np.arange(len(graph), dtype=np.int64), graph.degree())
+    targets = graph.indices.astype(np.int64)
+    order = np.argsort(targets, kind='stable')
+    sources, targets = sources[order], targets[order]
+    starts = np.flatnonzero(np.r_[True, targets[1:] != targets[:-1]]) if len(targets) else \
+        np.zeros(0, dtype=np.int64)
+    return sources, starts, targets[starts]
+
+def _unpack(words, count):
+    """:obj:`numpy.ndarray`: uint8 0/1 [node, source] from packed [node, word] bits"""
+    bits = np.unpackbits(
+        words.astype('<u8').view(np.uint8).reshape(len(words), -1),
+        axis=1,
+        bitorder='little'
+    )
+    return bits[:, :count]
+
+def bfs_block(graph, first, last, incoming=None):
+    """jump counts from sources `first..last-1` to every node
+
+    Notes:
+        Each node carries one bit per source, packed into uint64 words, so a
+        level is one gather + `bitwise_or.reduceat` over the edges for all
+        sources in the block at once.  A node's distance is the number of
+        levels it went unvisited, kept as bit-sliced counters (one uint64
+        plane per counter bit) and unpacked once at the end
+
+    Args:
+        graph (:obj:`universe_graph.UniverseGraph`): stargate graph
+        first (int): first source node
+        last (int): stop before this source node
+        incoming (tuple, optional): `_incoming(graph)`, if already built
+
+    Returns:
+        :obj:`numpy.ndarray`: uint8 [last - first, N]
+
+    Raises:
+        ValueError: a route longer than the matrix dtype can hold
+
+    """
+    sources, starts, has_incoming = incoming or _incoming(graph)
+    count = last - first
+    rows = np.arange(count)
+    frontier = np.zeros((len(graph), -(-count // WORD_BITS)), dtype=np.uint64)
+    np.bitwise_or.at(
+        frontier,
+        (first + rows, rows // WORD_BITS),
+        np.left_shift(np.uint64(1), (rows % WORD_BITS).astype(np.uint64))
+    )
+    visited = frontier.copy()
+    planes = [np.zeros_like(frontier) for _ in range(MATRIX_DTYPE(0).nbytes * 8)]
+
+    level = 0
+    while len(sources):
+        reached = np.zeros_like(frontier)
+        reached[has_incoming] = np.bitwise_or.reduceat(frontier[sources], starts, axis=0)
+        frontier = reached & ~visited
+        if not frontier.any():
+            break
+        level += 1
+        if level >= UNREACHABLE:
+            raise ValueError('route longer than {} jumps'.format(UNREACHABLE - 1))
+
+        carry = ~visited
+        for plane in planes:
+            plane ^= carry
+            carry &= ~plane
+            if not carry.any():
+                break
+        visited |= frontier
+
+    distance = np.zeros((len(graph), count), dtype=MATRIX_DTYPE)
+    for bit, plane in enumerate(planes):
+        distance |= _unpack(plane, count) << bit
+    distance[_unpack(visited, count) == 0] = UNREACHABLE
+    return np.ascontiguousarray(distance.T)
+
+def _build_rows(job):
+    """worker: map the snapshot, fill one range of matrix rows in place"""
+    graph = universe_graph.UniverseGraph.load(job['snapshot_file'])
+    matrix = np.load(job['matrix_file'], mmap_mode='r+')
+    incoming = _incoming(graph)
+    for first in range(job['first'], job['last'], job['block_size']):
+        last = min(first + job['block_size'], job['last'])
+        matrix[first:last] = bfs_block(graph, first, last, incoming)
+    matrix.flush()
+    return job['last'] - job['first']
+
+def build_jump_matrix(
+        snapshot_path=universe_graph.DEFAULT_SNAPSHOT_PATH,
+        write_recipt=None,
+        jobs=1,
+        block_size=BLOCK_SIZE,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """BFS from every system into a memory-mappable matrix
+
+    Notes:
+        Workers map the graph snapshot and the output file themselves and
+        write disjoint row ranges, so nothing large crosses processes
+
+    Args:
+        snapshot_path (str, optional): graph snapshot directory
+        write_recipt (str, optional): SDE version, default `CURRENT`
+        jobs (int, optional): worker processes
+        block_size (int, optional): sources per BFS block
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        str: path to matrix file
+
+    """
+    graph = universe_graph.load_snapshot(snapshot_path, write_recipt)
+    write_recipt = graph.metadata['write_recipt']
+    snapshot_file = path.join(snapshot_path, universe_graph.snapshot_name(write_recipt))
+    matrix_file = path.join(snapshot_path, matrix_name(graph.topology_hash()))
+    partial_file = matrix_file + '.partial.npy'
+
+    logger.info('--building %d x %d jump matrix on %d jobs', len(graph), len(graph), jobs)
+    np.lib.format.open_memmap(
+        partial_file, mode='w+', dtype=MATRIX_DTYPE, shape=(len(graph), len(graph))
+    ).flush()
+
+    chunk = -(-len(graph) // max(jobs, 1)) if len(graph) else 0
+    work = [
+        {
+            'snapshot_file': snapshot_file,
+            'matrix_file': partial_file,
+            'first': first,
+            'last': min(first + chunk, len(graph)),
+            'block_size': block_size,
+        }
+        for first in range(0, len(graph), chunk or 1)
+    ]
+    if jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            rows = sum(executor.map(_build_rows, work))
+    else:
+        rows = sum(_build_rows(job) for job in work)
+
+    os.replace(partial_file, matrix_file)
+    logger.info('--wrote %d jump matrix rows: %s', rows, matrix_file)
+    return matrix_file
+
+def prune_matrices(
+        snapshot_path=universe_graph.DEFAULT_SNAPSHOT_PATH,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """remove matrices no kept graph snapshot can use
+
+    Notes:
+        run after `universe_graph.write_snapshot()` prunes old snapshots;
+        builds still in progress (`.partial.npy`) are left alone
+
+    Args:
+        snapshot_path (str, optional): graph snapshot directory
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        :obj:`list`: paths removed
+
+    """
+    wanted = {
+        matrix_name(universe_graph.UniverseGraph.load(snapshot_file).topology_hash())
+        for snapshot_file in glob.glob(
+            path.join(snapshot_path, universe_graph.snapshot_name('*')))
+    }
+    pruned = []
+    for matrix_file in glob.glob(path.join(snapshot_path, matrix_name('*'))):
+        if matrix_file.endswith('.partial.npy') or path.basename(matrix_file) in wanted:
+            continue
+        logger.debug('--pruning jump matrix: %s', matrix_file)
+        os.remove(matrix_file)
+        pruned.append(matrix_file)
+    return pruned
+
+def refresh_jump_matrix(
+        snapshot_path=universe_graph.DEFAULT_SNAPSHOT_PATH,
+        jobs=1,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """make sure the `CURRENT` snapshot has a matrix, and drop unused ones
+
+    Args:
+        snapshot_path (str, optional): graph snapshot directory
+        jobs (int, optional): worker processes, if a build is needed
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        str: path to matrix file
+
+    """
+    graph = universe_graph.load_snapshot(snapshot_path)
+    matrix_file = path.join(snapshot_path, matrix_name(graph.topology_hash()))
+    if path.isfile(matrix_file):
+        logger.info('--stargates unchanged, keeping jump matrix: %s', matrix_file)
+    else:
+        matrix_file = build_jump_matrix(snapshot_path, jobs=jobs, logger=logger)
+    prune_matrices(snapshot_path, logger=logger)
+    return matrix_file
+
+class JumpMatrix(object):
+    """O(1) jump counts for one graph
+
+    Args:
+        graph (:obj:`universe_graph.UniverseGraph`): graph the matrix was built from
+        matrix (:obj:`numpy.ndarray`): uint8 [N, N], usually memory-mapped
+
+    """
+    def __init__(self, graph, matrix):
+        if matrix.shape != (len(graph), len(graph)):
+            raise ValueError('jump matrix {} does not fit a {}-system graph'.format(
+                matrix.shape, len(graph)))
+        self.graph = graph
+        self.matrix = matrix
+        self.symmetric = is_symmetric(graph)
+
+    @classmethod
+    def load(cls, graph, snapshot_path=universe_graph.DEFAULT_SNAPSHOT_PATH):
+        """memory-map the matrix built for `graph`'s stargate layout
+
+        Raises:
+            FileNotFoundError: no matrix built for this layout yet
+
+        """
+        return cls(graph, np.load(
+            path.join(snapshot_path, matrix_name(graph.topology_hash())),
+            mmap_mode='r'
+        ))
+
+    def jumps(self, origin_id, destination_id):
+        """int: stargate jumps between two systems, or None if unreachable
+
+        Raises:
+            KeyError: unknown system id
+
+        """
+        origin, destination = self.graph.index_of([origin_id, destination_id]).tolist()
+        jumps = int(self.matrix[origin, destination])
+        return None if jumps == UNREACHABLE else jumps
+
+    def bounds(self, target, min_cost):
+        """exact jumps to `target` x cheapest system, per node
+
+        Notes:
+            Row `target` holds jumps from the target; when every stargate has
+            a partner back, that is also jumps to it, and a contiguous read.
+            Unreachable nodes are never pushed, so their bound does not matter
+
+        Args:
+            target (int): node index
+            min_cost (float): `RouteEngine.min_cost`
+
+        Returns:
+            :obj:`numpy.ndarray`: float64 per node
+
+        """
+        jumps = self.matrix[target] if self.symmetric else self.matrix[:, target]
+        return jumps * np.float64(min_cost)
+
+    def heuristic(self, min_cost):
+        """A* bound for `routing.RouteEngine`, see `bounds()`
+
+        Args:
+            min_cost (float): `RouteEngine.min_cost`
+
+        Returns:
+            callable: `heuristic(target, origin)` -> lower bound per node
+
+        """
+        def bound(target, origin=None):
+            return array('d', self.bounds(target, min_cost).tobytes())
+        return bound
@@ -0,0 +1,167 @@
+"""landmarks.py: ALT (A*, landmarks, triangle inequality) bounds for weighted routes
+
+Danger-weighted costs leave jump-count bounds far below the true cost, so A*
+still settles most of the universe.  Instead, a few landmark systems get
+full weighted cost tables, to (`to_landmark`) and from (`from_landmark`)
+every system, and for any landmark `L` the triangle inequality gives
+
+    cost(v, t) >= cost(v, L) - cost(t, L)
+    cost(v, t) >= cost(L, t) - cost(L, v)
+
+The tables depend on the node costs, so `RouteEngine` rebuilds them on every
+weight or danger change.
+
+Landmarks are split across components by size, then chosen farthest-first:
+each new one is the system worst served by those already picked, which
+spreads them around the edge of the map where their bounds are tightest.
+
+"""
+import numpy as np
+
+import navitron_crons.cli_core as cli_core
+
+DEFAULT_LANDMARKS = 16
+ACTIVE_LANDMARKS = 4
+
+def allocate(components, count):
+    """split `count` landmarks across components by size
+
+    Notes:
+        A component too small to earn a whole landmark gets none: routes
+        inside it settle few nodes with or without one.  Rounding leftovers
+        go to the largest component
+
+    Args:
+        components (:obj:`numpy.ndarray`): component label per node
+        count (int): landmarks to place
+
+    Returns:
+        :obj:`dict`: component label -> landmarks
+
+    """
+    sizes = np.bincount(components) if len(components) else np.zeros(0, dtype=np.int64)
+    sizes[sizes < 2] = 0  # gateless systems have no routes
+    if not count or not sizes.any():
+        return {}
+    quota = sizes * count // sizes.sum()
+    quota[sizes.argmax()] += count - quota.sum()
+    return {int(label): int(quota[label]) for label in np.flatnonzero(quota)}
+
+def select_landmarks(
+        engine,
+        count=DEFAULT_LANDMARKS
+):
+    """farthest-first landmark choice, with full tables as a by-product
+
+    Args:
+        engine (:obj:`routing.RouteEngine`): costs + graph
+        count (int, optional): landmarks to pick
+
+    Returns:
+        (:obj:`list`, :obj:`numpy.ndarray`, :obj:`numpy.ndarray`):
+            landmark nodes, `to_landmark` [K, N], `from_landmark` [K, N]
+
+    """
+    landmarks, to_rows, from_rows = [], [], []
+    for label, quota in allocate(engine.components, count).items():
+        members = engine.components == label
+
+        # start from the far end of the component, not wherever its first node is
+        seed_costs = engine.costs_from(int(np.flatnonzero(members)[0]))
+        node = int(np.argmax(np.where(members, seed_costs, -1.0)))
+
+        nearest = np.full(len(members), np.inf)
+        for _ in range(quota):
+            landmarks.append(node)
+            to_rows.append(engine.costs_to(node))
+            from_rows.append(engine.costs_from(node))
+            nearest = np.minimum(nearest, to_rows[-1] + from_rows[-1])
+            node = int(np.argmax(np.where(members, nearest, -1.0)))
+            if nearest[node] <= 0:
+                break
+
+    shape = (len(landmarks), len(engine.components))
+    return (
+        landmarks,
+        np.array(to_rows).reshape(shape),
+        np.array(from_rows).reshape(shape),
+    )
+
+class LandmarkTables(object):
+    """weighted cost tables for a set of landmarks
+
+    Args:
+        landmarks (:obj:`list`): landmark node indexes
+        to_landmark (:obj:`numpy.ndarray`): [K, N] cost from each node to each landmark
+        from_landmark (:obj:`numpy.ndarray`): [K, N] cost from each landmark to each node
+
+    """
+    def __init__(self, landmarks, to_landmark, from_landmark):
+        self.landmarks = landmarks
+        self.to_landmark = to_landmark
+        self.from_landmark = from_landmark
+
+    def __len__(self):
+        return len(self.landmarks)
+
+    @classmethod
+    def build(
+            cls,
+            engine,
+            count=DEFAULT_LANDMARKS,
+            logger=cli_core.DEFAULT_LOGGER
+    ):
+        """select landmarks and fill their tables
+
+        Args:
+            engine (:obj:`routing.RouteEngine`): costs + graph
+            count (int, optional): landmarks to pick
+            logger (:obj:`logging.logger`, optional): logging handle
+
+        Returns:
+            :obj:`LandmarkTables`
+
+        """
+        tables = cls(*select_landmarks(engine, count))
+        logger.info('--built %d landmark tables', len(tables))
+        return tables
+
+    def bounds(self, target, origin=None, active=None):
+        """triangle-inequality lower bound on the cost from each node to `target`
+
+        Notes:
+            With `origin`, only the `active` landmarks giving the best bound
+            at the origin are used: they are usually the best all along the
+            route, and the per-query vector work shrinks with them.
+            A landmark that cannot reach (or be reached from) both ends
+            gives `inf - inf` and is ignored; an `inf` bound means the node
+            truly cannot reach `target`
+
+        Args:
+            target (int): node index
+            origin (int, optional): node index the search starts from
+            active (int, optional): landmarks to use with `origin`, default all
+
+        Returns:
+            :obj:`numpy.ndarray`: float64 per node
+
+        """
+        to_landmark, from_landmark = self.to_landmark, self.from_landmark
+        if not len(self.landmarks):
+            return np.zeros(to_landmark.shape[1])
+        if origin is not None and active and active < len(self.landmarks):
+            with np.errstate(invalid='ignore'):
+                at_origin = np.fmax(
+                    to_landmark[:, origin] - to_landmark[:, target],
+                    from_landmark[:, target] - from_landmark[:, origin]
+                )
+            best = np.argsort(np.nan_to_num(at_origin, nan=-np.inf))[-active:]
+            to_landmark, from_landmark = to_landmark[best], from_landmark[best]
+
+        with np.errstate(invalid='ignore'):
+            bound = np.fmax(
+                to_landmark - to_landmark[:, target, None],
+                from_landmark[:, target, None] - from_landmark
+            )
+        bound[np.isnan(bound)] = 0.0
+        return np.maximum(bound.max(axis=0), 0.0)
@@ -1,79 +1,275 @@
 """launcher/wrapper for executing CLI"""
 from datetime import datetime
+import concurrent.futures
 import os
 import logging
 import time
-import json
-import uuid
 
+from bson import ObjectId
 import pymongo
 import pandas as pd
 from plumbum import cli
 import prosper.common.prosper_cli as p_cli
 
-from . import _version, connections, exceptions
+from . import _version, connections, dump_writers, exceptions, watermarks
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 PROGNAME = 'dump_database'
 
-def dump_increment(
-        data,
-        data_name,
-        drop_cols=('_id'),
-        folder_path='temp'
+def iter_batches(
+        cursor,
+        batch_size,
+        drop_cols=('_id',),
 ):
-    """dump data to disk incrementally
+    """group cursor rows into dataframes of at most `batch_size` rows
 
     Args:
-        data (list): Current collection of raw data from MongoDB
-        data_name (str): name of outfile ('csv')
-        drop_cols (tuple): columns to exclude from final data push
-        folder_path (str): Path to dump-folder for partial records
+        cursor (iterable): mongo cursor (or any iterable of dicts)
+        batch_size (int): rows per batch
+        drop_cols (tuple): columns to exclude from output
+
+    Yields:
+        :obj:`pandas.DataFrame`: one batch
+
+    """
+    raw = []
+    for row in cursor:
+        raw.append(row)
+        if len(raw) >= batch_size:
+            yield pd.DataFrame(raw).drop(list(drop_cols), axis=1, errors='ignore')
+            raw = []
+
+    if raw:
+        yield pd.DataFrame(raw).drop(list(drop_cols), axis=1, errors='ignore')
+
+def stream_export(
+        cursor,
+        outfile,
+        output_format='csv',
+        batch_size=10000,
+        drop_cols=('_id',),
+        partition=False,
+        part_name='part-0',
+        logger=logging.getLogger(PROGNAME),
+):
+    """write cursor rows straight into the output, one batch at a time
+
+    Notes:
+        Memory is bounded by `batch_size`; nothing is written but the output.
+        Columns are fixed by the first batch, later extras are dropped with a
+        warning.  Rows land in `.partial` files, renamed on success.
+
+    Args:
+        cursor (iterable): mongo cursor (or any iterable of dicts)
+        outfile (str): filepath (directory if `partition`) to write results to
+        output_format (str): one of `dump_writers.FORMATS`
+        batch_size (int): rows per write
+        drop_cols (tuple): columns to exclude from output
+        partition (bool): split output by `cron_datetime` day
+        part_name (str): file name stem inside each partition
+        logger (:obj:`logging.logger`): logging handle
 
     Returns:
-        str: name of file dumped (data_name + UUID)
+        int: rows written
 
     """
-    os.makedirs(folder_path, exist_ok=True)
-    file_name = os.path.join(
-        folder_path,
-        os.path.basename(data_name).replace('.csv', str(uuid.uuid1()) + '.json')
+    if partition:
+        writer = dump_writers.PartitionedWriter(outfile, output_format, part_name=part_name)
+    else:
+        writer = dump_writers.open_writer(outfile, output_format)
+
+    columns = None
+    with writer:
+        for batch in iter_batches(cursor, batch_size, drop_cols):
+            if columns is None:
+                columns = list(batch.columns)
+            else:
+                extra = set(batch.columns) - set(columns)
+                if extra:
+                    logger.warning('--dropping columns missing from header: %s', sorted(extra))
+                batch = batch.reindex(columns=columns)
+            writer.write(batch)
+
+    logger.info('--wrote %d rows to: %s', writer.rows, outfile)
+    return writer.rows
+
+def stream_to_csv(
+        cursor,
+        outfile,
+        batch_size=10000,
+        drop_cols=('_id',),
+        logger=logging.getLogger(PROGNAME),
+):
+    """write cursor rows straight into a csv, see `stream_export()`
+
+    Returns:
+        int: rows written
+
+    """
+    return stream_export(
+        cursor,
+        outfile,
+        batch_size=batch_size,
+        drop_cols=drop_cols,
+        logger=logger,
     )
-    df = pd.DataFrame(data).drop(drop_cols, axis=1)
-    df.to_json(file_name, orient='records')
 
-    return file_name
+def plan_ranges(
+        collection,
+        field,
+        jobs,
+        query=None,
+):
+    """split a collection into `jobs` contiguous ranges on an indexed field
+
+    Notes:
+        `cron_datetime` ranges hold whole snapshots, split evenly by count;
+        `_id` ranges split the id's creation time evenly
+
+    Args:
+        collection (:obj:`pymongo.collection.Collection`): collection to split
+        field (str): `cron_datetime` or `_id`
+        jobs (int): number of ranges wanted
+        query (dict): base filter every range is restricted to
+
+    Returns:
+        list: one mongo query per range, at most `jobs`
+
+    """
+    query = query or {}
+    if field == '_id':
+        ends = [
+            next(iter(collection.find(query, {'_id': True}).sort('_id', order).limit(1)), None)
+            for order in (pymongo.ASCENDING, pymongo.DESCENDING)
+        ]
+        if None in ends:
+            return [query]
+        first, last = [end['_id'].generation_time for end in ends]
+        step = (last - first) / jobs
+        bounds = [
+            ObjectId.from_datetime(first + step * index)
+            for index in range(1, jobs)
+        ]
+    else:
+        snapshots = sorted(collection.distinct(field, query))
+        per_job = -(-len(snapshots) // jobs)
+        bounds = snapshots[per_job::per_job] if per_job else []
+
+    bounds = sorted(set(bounds))
+    ranges = []
+    for index in range(len(bounds) + 1):
+        limits = {}
+        if index > 0:
+            limits['$gte'] = bounds[index - 1]
+        if index < len(bounds):
+            limits['$lt'] = bounds[index]
+        ranges.append({'$and': [query, {field: limits}]} if limits else query)
 
-def zip_results(
-        file_list,
+    return ranges
+
+def export_range(job):
+    """worker: export one range on its own connection and cursor
+
+    Args:
+        job (dict): `plan_ranges()` query + export settings, see `parallel_export()`
+
+    Returns:
+        (int, object): rows written, largest watermark value seen
+
+    """
+    mongo_conn = pymongo.MongoClient(**job['mongo_kwargs'])
+    try:
+        data = mongo_conn[job['database']][job['collection']].find(
+            job['query'], job['projection'], batch_size=job['batch_size']
+        )
+        tracker = watermarks.MarkTracker(data, job['field'])
+        rows = stream_export(
+            tracker,
+            job['outfile'],
+            output_format=job['output_format'],
+            batch_size=job['batch_size'],
+            partition=job['partition'],
+            part_name=job['part_name'],
+        )
+    finally:
+        mongo_conn.close()
+
+    return rows, tracker.mark
+
+def parallel_export(
+        mongo_kwargs,
+        database,
+        collection,
+        ranges,
         outfile,
-        debug=False,
+        field='cron_datetime',
+        projection=None,
+        output_format='csv',
+        batch_size=10000,
+        partition=False,
+        part_name='part-0',
+        jobs=2,
         logger=logging.getLogger(PROGNAME),
 ):
-    """combine partial results into one big file
+    """export ranges of a collection on a pool of worker processes
 
     Notes:
-        expects `orient='records'` json format
-        will delete files if `debug=False`
+        Every worker writes its own part file(s), so nothing is merged:
+        with `partition`, parts land side by side in each `cron_date=` folder;
+        otherwise `outfile` becomes a directory of `part-NN.<format>` files
 
     Args:
-        file_list (list): a list of .JSON files to combine together
-        outfile (str): filepath to write results to
-        debug (bool): toggle file deletion
+        mongo_kwargs (dict): `pymongo.MongoClient` args; each worker connects itself
+        database (str): name of mongo database
+        collection (str): collection to export
+        ranges (list): queries from `plan_ranges()`
+        outfile (str): dataset directory
+        field (str): watermark field to track
+        projection (dict): fields to keep/drop
+        output_format (str): one of `dump_writers.FORMATS`
+        batch_size (int): rows per write
+        partition (bool): split output by `cron_datetime` day
+        part_name (str): file name stem for this run's parts
+        jobs (int): worker processes
         logger (:obj:`logging.logger`): logging handle
 
+    Returns:
+        (int, object): rows written, largest watermark value seen
+
     """
-    data = pd.DataFrame()
-    for file in cli.terminal.Progress(file_list):
-        data = pd.concat(
-            [data, pd.read_json(file, orient='records')], ignore_index=True
-        )
-        if not debug:
-            os.remove(file)
+    work = []
+    for index, query in enumerate(ranges):
+        job = {
+            'mongo_kwargs': mongo_kwargs,
+            'database': database,
+            'collection': collection,
+            'query': query,
+            'projection': projection,
+            'field': field,
+            'output_format': output_format,
+            'batch_size': batch_size,
+            'partition': partition,
+            'part_name': '{}-{:02d}'.format(part_name, index),
+            'outfile': outfile,
+        }
+        if not partition:
+            os.makedirs(outfile, exist_ok=True)
+            job['outfile'] = os.path.join(
+                outfile, 'part-{:02d}.{}'.format(index, output_format)
+            )
+        work.append(job)
 
-    logger.info('Dumping file: %s', outfile)
-    data.to_csv(outfile)
+    logger.info('--exporting %d ranges on %d workers', len(work), jobs)
+    rows = 0
+    mark = None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        for job_rows, job_mark in executor.map(export_range, work):
+            rows += job_rows
+            if job_mark is not None and (mark is None or job_mark > mark):
+                mark = job_mark
 
+    logger.info('--wrote %d rows to: %s', rows, outfile)
+    return rows, mark
 
 class DumpDatabaseCLI(p_cli.ProsperApplication):
     PROGNAME = PROGNAME
@@ -95,6 +291,43 @@ class DumpDatabaseCLI(p_cli.ProsperApplication):
         default=os.environ.get('NAVITRON_dump_database__database', 'navitron'),
     )
 
+    output_format = cli.SwitchAttr(
+        ['--format'],
+        cli.Set(*dump_writers.FORMATS),
+        help='Output format',
+        default=os.environ.get('NAVITRON_dump_database__format', 'csv'),
+    )
+
+    partition = cli.Flag(
+        ['--partition-by-date'],
+        help='Write a directory of cron_date=YYYY-MM-DD partitions',
+    )
+
+    incremental = cli.Flag(
+        ['--incremental'],
+        help='Only export documents past the saved watermark, then advance it',
+    )
+
+    since = cli.SwitchAttr(
+        ['--since'],
+        str,
+        help='Only export documents past this cron_datetime (or _id)',
+    )
+
+    watermark_field = cli.SwitchAttr(
+        ['--watermark-field'],
+        cli.Set(*watermarks.WATERMARK_FIELDS),
+        help='Field to track incremental exports by',
+        default='cron_datetime',
+    )
+
+    jobs = cli.SwitchAttr(
+        ['--jobs'],
+        int,
+        help='Worker processes: split each collection into ranges, one cursor per range',
+        default=os.environ.get('NAVITRON_dump_database__jobs', 1),
+    )
+
     sleep = cli.SwitchAttr(
         ['--sleep'],
         int,
@@ -110,45 +343,90 @@ class DumpDatabaseCLI(p_cli.ProsperApplication):
         self.logger.debug(collections)
 
         self.logger.info('connecting to mongo')
-        mongo_conn = pymongo.MongoClient(
-            self.config.get_option('MONGO', 'hostname'),
-            int(self.config.get_option('MONGO', 'port')),
-            username=self.config.get_option('MONGO', 'username'),
-            password=self.config.get_option('MONGO', 'password')
-        )
+        mongo_kwargs = {
+            'host': self.config.get_option('MONGO', 'hostname'),
+            'port': int(self.config.get_option('MONGO', 'port')),
+            'username': self.config.get_option('MONGO', 'username'),
+            'password': self.config.get_option('MONGO', 'password'),
+        }
+        mongo_conn = pymongo.MongoClient(**mongo_kwargs)
+        store = watermarks.WatermarkStore(self.config.get_option(
+            PROGNAME, 'watermark_path', args_default='navitron_dump_watermarks.json'
+        ))
+        field = self.watermark_field
+        ranged = self.incremental or self.since
         for collection in collections:
             self.logger.info('fetching contents from: %s', collection)
-            data = mongo_conn[self.database][collection].find({})
-            file_name = 'navitron_{collection}_{date}.csv'.format(
+            mongo_collection = mongo_conn[self.database][collection]
+            query = {}
+            projection = {'_id': False}
+            if ranged:
+                since = store.get(collection, field)
+                if self.since:
+                    since = watermarks.decode_mark(field, self.since)
+                self.logger.info('--exporting %s past: %s', field, since)
+                query = watermarks.build_query(field, since, now=now)
+                if field == '_id':
+                    projection = None
+
+            file_name = 'navitron_{collection}_{date}'.format(
                 collection=collection.replace('_', '-'),
                 date=now.strftime('%Y-%m-%d')
             )
+            if ranged:
+                # accumulating dataset: each run adds one part file per day touched
+                file_name = 'navitron_{}'.format(collection.replace('_', '-'))
+            elif not self.partition:
+                file_name = '{}.{}'.format(file_name, self.output_format)
             self.logger.info('--priming dump file: %s', file_name)
-            if os.path.isfile(file_name):
+            if os.path.exists(file_name) and not ranged:
                 self.logger.warning('--deleting file: %s', file_name)
                 time.sleep(self.sleep)
-                os.remove(file_name)
+                if os.path.isdir(file_name):
+                    shutil.rmtree(file_name)
+                else:
+                    os.remove(file_name)
 
-            count = 0
-            raw = []
-            results = []
-            for row in cli.terminal.Progress(data, length=data.count()):
-                count += 1
-                raw.append(row)
-
-                if count >= self.dump_rate:
-                    results.append(dump_increment(raw, file_name))
-                    count = 0
-                    raw = []
-
-            results.append(dump_increment(raw, file_name))
-
-            self.logger.info('--zipping up results')
-            zip_results(
-                results,
-                file_name,
-                debug=self.debug,
-            )
+            part_name = 'part-{}'.format(now.strftime('%Y%m%dT%H%M%S'))
+            if int(self.jobs) > 1:
+                ranges = plan_ranges(mongo_collection, field, int(self.jobs), query)
+                rows, mark = parallel_export(
+                    mongo_kwargs,
+                    self.database,
+                    collection,
+                    ranges,
+                    file_name,
+                    field=field,
+                    projection=projection,
+                    output_format=self.output_format,
+                    batch_size=self.dump_rate,
+                    partition=self.partition or ranged,
+                    part_name=part_name,
+                    jobs=int(self.jobs),
+                    logger=self.logger,
+                )
+            else:
+                data = mongo_collection.find(query, projection, batch_size=self.dump_rate)
+                if ranged:
+                    data = data.sort(field, pymongo.ASCENDING)
+                    length = mongo_collection.count_documents(query)
+                else:
+                    length = mongo_collection.estimated_document_count()
+                tracker = watermarks.MarkTracker(data, field)
+                rows = stream_export(
+                    cli.terminal.Progress(tracker, length=length),
+                    file_name,
+                    output_format=self.output_format,
+                    batch_size=self.dump_rate,
+                    partition=self.partition or ranged,
+                    part_name=part_name,
+                    logger=self.logger,
+                )
+                mark = tracker.mark
+
+            if self.incremental and mark is not None:
+                self.logger.info('--advancing %s watermark to: %s', collection, mark)
+                store.set(collection, field, mark)
 
 def run_main():
     """entry-point wrapper"""
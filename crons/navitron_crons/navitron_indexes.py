@@ -0,0 +1,77 @@
+"""navitron_indexes.py: build registered indexes and report how they are used"""
+from os import path
+
+from plumbum import cli
+
+import navitron_crons.connections as connections
+import navitron_crons.indexes as indexes
+import navitron_crons._version as _version
+import navitron_crons.cli_core as cli_core
+
+HERE = path.abspath(path.dirname(__file__))
+
+__app_version__ = _version.__version__
+__app_name__ = 'navitron_indexes'
+
+class NavitronIndexes(cli_core.NavitronApplication):
+    """report index access counts/sizes, optionally building registered indexes first
+
+    Feel free to add script-specific args/vars
+
+    """
+    PROGNAME = __app_name__
+    VERSION = __app_version__
+
+    ensure = cli.Flag(
+        ['e', '--ensure'],
+        help='Build any missing registered indexes before reporting'
+    )
+
+    collections = cli.SwitchAttr(
+        ['--collection'],
+        str,
+        list=True,
+        help='Collection to report on, repeatable (default: all)'
+    )
+
+    def main(self):
+        """application runtime"""
+        self.load_logger(self.PROGNAME)
+        self.conn = connections.MongoConnection(
+            self.config,
+            logger=self.logger  # note: order specific, logger may not be loaded yet
+        )
+
+        if self.ensure:
+            self.logger.info('Ensuring registered indexes')
+            indexes.ensure_indexes(
+                self.conn,
+                self.collections or None,
+                debug=self.debug,
+                logger=self.logger
+            )
+
+        self.logger.info('Reading index usage')
+        usage_df = indexes.index_usage(
+            self.conn,
+            self.collections or None,
+            logger=self.logger
+        )
+        print(usage_df.to_string(index=False))
+
+        unused = usage_df[usage_df['ops'] == 0]
+        for row in unused.itertuples():
+            self.logger.info('--unused index: %s.%s', row.collection, row.index)
+
+        missing = usage_df[usage_df['ops'].isnull()]
+        for row in missing.itertuples():
+            self.logger.warning('--missing registered index: %s.%s', row.collection, row.index)
+
+        self.logger.info('%s: Complete -- Have a nice day', self.PROGNAME)
+
+def run_main():
+    """hook for running entry_points"""
+    NavitronIndexes.run()
+
+if __name__ == '__main__':
+    run_main()
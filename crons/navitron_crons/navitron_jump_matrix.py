@@ -0,0 +1,58 @@
+"""navitron_jump_matrix.py: precompute all-pairs jump counts for the current graph snapshot"""
+from os import path
+import os
+
+from plumbum import cli
+
+import navitron_crons.jump_matrix as jump_matrix
+import navitron_crons.universe_graph as universe_graph
+import navitron_crons._version as _version
+import navitron_crons.cli_core as cli_core
+
+HERE = path.abspath(path.dirname(__file__))
+
+__app_version__ = _version.__version__
+__app_name__ = 'navitron_jump_matrix'
+
+class NavitronJumpMatrix(cli_core.NavitronApplication):
+    """BFS from every system into a memory-mapped uint8 matrix beside the graph snapshot
+
+    Feel free to add script-specific args/vars
+
+    """
+    PROGNAME = __app_name__
+    VERSION = __app_version__
+
+    jobs = cli.SwitchAttr(
+        ['j', '--jobs'],
+        int,
+        help='Worker processes (default: every cpu)',
+        default=os.cpu_count() or 1
+    )
+
+    write_recipt = cli.SwitchAttr(
+        ['--recipt'],
+        str,
+        help='SDE version to build for (default: CURRENT snapshot)'
+    )
+
+    def main(self):
+        """application runtime"""
+        self.load_logger(self.PROGNAME)
+        snapshot_path = self.config.get_option(
+            'GENERAL', 'graph_path', args_default=universe_graph.DEFAULT_SNAPSHOT_PATH)
+
+        jump_matrix.build_jump_matrix(
+            snapshot_path,
+            write_recipt=self.write_recipt,
+            jobs=self.jobs,
+            logger=self.logger
+        )
+        self.logger.info('%s: Complete -- Have a nice day', self.PROGNAME)
+
+def run_main():
+    """hook for running entry_points"""
+    NavitronJumpMatrix.run()
+
+if __name__ == '__main__':
+    run_main()
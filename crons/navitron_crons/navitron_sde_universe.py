@@ -1,8 +1,11 @@
 """navitron_sde.py: cronjob for updating SDE data"""
 from os import path
 from datetime import datetime
+import os
 import warnings
-import time
+import asyncio
+import functools
+import tempfile
 from enum import Enum
 
 import pandas as pd
@@ -11,6 +14,12 @@ from contexttimer import Timer
 
 import navitron_crons.exceptions as exceptions
 import navitron_crons.connections as connections
+import navitron_crons.indexes as indexes
+import navitron_crons.concurrency as concurrency
+import navitron_crons.bulk_fetch as bulk_fetch
+import navitron_crons.crawl_journal as crawl_journal
+import navitron_crons.jump_matrix as jump_matrix
+import navitron_crons.universe_graph as universe_graph
 import navitron_crons._version as _version
 import navitron_crons.cli_core as cli_core
 
@@ -19,7 +28,8 @@ HERE = path.abspath(path.dirname(__file__))
 __app_version__ = _version.__version__
 __app_name__ = 'navitron_sde_universe'
 
-SDE_UNIVERSE_COLLECTION = 'sde_universe'
+SDE_UNIVERSE_COLLECTION = __app_name__
+DEFAULT_JOURNAL_PATH = path.join(tempfile.gettempdir(), 'navitron_sde_journal')
 
 class UniverseEndpoint(Enum):
     """enumerated types for system info"""
@@ -29,228 +39,203 @@ class UniverseEndpoint(Enum):
     stargates = 'stargates'
 
 
-def get_universe_systems_details(
-        config,
-        retry=1,
-        workers=20,
-        logger=cli_core.DEFAULT_LOGGER
+async def crawl_details(
+        fetcher,
+        id_source,
+        endpoint,
+        journal=None,
+        on_result=None
 ):
-    """fetch universe/systems/ information
+    """stream details for every id, skipping and checkpointing through a crawl journal
 
     Args:
-        config (:obj:`ProsperConfig`): config with [ENDPOINTS]
-        retry (int, optional): number of retries allowed
-        workers (int, optional): number of async workers allowed
-        logger (:obj:`loging.logger`, optional): logging handle
+        fetcher (:obj:`bulk_fetch.BulkFetcher`): fetcher for the endpoint
+        id_source (iterable): ids to fetch; may be an async iterable still being filled
+        endpoint (:obj:`UniverseEndpoint`): journal to read/write
+        journal (:obj:`crawl_journal.CrawlJournal`, optional): checkpoint journal
+        on_result (callable, optional): called with every document, journaled or fetched
 
     Returns:
-        :obj:`list`: details for all systems in /universe/systems endpoint
-
-    Raises:
-        :obj:`exceptions.FatalCLIExit`: message admins, unable to resolve required data
+        :obj:`bulk_fetch.BulkResults`: details for every id in id_source
 
     """
-    logger.info('--fetching system list from ESI')
-    try:
-        system_list, address = connections.get_esi_address(
-            config.get('ENDPOINTS', 'source'),
-            config.get('ENDPOINTS', 'systems'),
-        )
-    except Exception as err:
-        logger.error('Unable to fetch bulk system list from ESI', exc_info=True)
-        raise exceptions.FatalCLIExit(repr(err))
-    logger.debug(len(system_list))
-
-    logger.info('--fetching system details from ESI')
-    try:
-        system_info = connections.fetch_bulk_data_async(
-            address,
-            system_list,
-            retry=retry,
-            workers=workers,
-            logger=logger
-        )
-    except Exception as err:
-        logger.error('Unable to fetch system details from ESI', exc_info=True)
-        raise exceptions.FatalCLIExit(repr(err))
-
-    return system_info
+    journaled = journal.load(endpoint.value) if journal else {}
+    results = bulk_fetch.BulkResults()
+
+    def keep(document):
+        results.append(document)
+        if on_result:
+            on_result(document)
+
+    async def missing_ids():
+        if hasattr(id_source, '__aiter__'):
+            async for id_val in id_source:
+                if id_val in journaled:
+                    keep(journaled[id_val])
+                else:
+                    yield id_val
+        else:
+            for id_val in id_source:
+                if id_val in journaled:
+                    keep(journaled[id_val])
+                else:
+                    yield id_val
+
+    async for id_val, data in fetcher.stream(missing_ids()):
+        if journal:
+            journal.record(endpoint.value, id_val, data)
+        keep(data)
+
+    results.failures = fetcher.failures
+    fetcher.logger.info(
+        '--%s: %d documents, %d failed', endpoint.value, len(results), len(results.failures)
+    )
+    return results
 
-def get_universe_constellations_details(
+async def crawl_universe(
         config,
-        retry=1,
+        endpoints=tuple(UniverseEndpoint),
+        retry=3,
         workers=20,
+        journal=None,
         logger=cli_core.DEFAULT_LOGGER
 ):
-    """fetch universe/constellations/ information
+    """fetch universe details as one concurrent dataflow
+
+    Notes:
+        systems, constellations and regions crawl side by side.  Stargate ids
+        are queued as each system document arrives, so the stargate crawl runs
+        alongside the systems crawl instead of after it.
 
     Args:
         config (:obj:`ProsperConfig`): config with [ENDPOINTS]
-        retry (int, optional): number of retries allowed
-        workers (int, optional): number of async workers allowed
+        endpoints (iterable, optional): :obj:`UniverseEndpoint` to crawl;
+            stargates imply systems
+        retry (int, optional): number of retries allowed per id
+        workers (int, optional): starting number of async workers per endpoint
+        journal (:obj:`crawl_journal.CrawlJournal`, optional): checkpoint journal
         logger (:obj:`loging.logger`, optional): logging handle
 
     Returns:
-        :obj:`list`: details for all constellations in /universe/constellations endpoint
+        :obj:`dict`: :obj:`UniverseEndpoint` -> :obj:`bulk_fetch.BulkResults`
 
     Raises:
         :obj:`exceptions.FatalCLIExit`: message admins, unable to resolve required data
 
     """
-    logger.info('--fetching constellation list from ESI')
-    try:
-        constellation_list, address = connections.get_esi_address(
-            config.get('ENDPOINTS', 'source'),
-            config.get('ENDPOINTS', 'constellations')
-        )
-    except Exception as err:
-        logger.error('Unable to fetch bulk constellations list from ESI', exc_info=True)
-        raise exceptions.FatalCLIExit(repr(err))
-    logger.debug(len(constellation_list))
-
-    logger.info('--fetching constellation details from ESI')
-    try:
-        constellation_info = connections.fetch_bulk_data_async(
-            address,
-            constellation_list,
+    endpoints = set(endpoints)
+    if UniverseEndpoint.stargates in endpoints:
+        endpoints.add(UniverseEndpoint.systems)
+    source = config.get('ENDPOINTS', 'source')
+
+    def build_fetcher(endpoint):
+        return connections.build_bulk_fetcher(
+            source + config.get('ENDPOINTS', endpoint.value),
             retry=retry,
-            workers=workers,
+            policy=concurrency.build_policy(workers, config=config),
+            config=config,
             logger=logger
         )
-    except Exception as err:
-        logger.error('Unable to fetch constellations details from ESI', exc_info=True)
-        raise exceptions.FatalCLIExit(repr(err))
-
-    return constellation_info
-
-def get_universe_regions_details(
-        config,
-        retry=1,
-        workers=20,
-        logger=cli_core.DEFAULT_LOGGER
-):
-    """fetch universe/constellations/ information
-
-    Args:
-        config (:obj:`ProsperConfig`): config with [ENDPOINTS]
-        retry (int, optional): number of retries allowed
-        workers (int, optional): number of async workers allowed
-        logger (:obj:`loging.logger`, optional): logging handle
-
-    Returns:
-        :obj:`list`: details for all regions in /universe/regions endpoint
-
-    Raises:
-        :obj:`exceptions.FatalCLIExit`: message admins, unable to resolve required data
-
-    """
-    logger.info('--fetching region data from ESI')
-    try:
-        region_list, address = connections.get_esi_address(
-            config.get('ENDPOINTS', 'source'),
-            config.get('ENDPOINTS', 'regions')
-        )
-    except Exception as err:
-        logger.error('Unable to fetch bulk regions list from ESI', exc_info=True)
-        raise exceptions.FatalCLIExit(repr(err))
-    logger.debug(len(region_list))
 
-    logger.info('--fetching region details from ESI')
+    listed = [endpoint for endpoint in UniverseEndpoint
+              if endpoint in endpoints and endpoint is not UniverseEndpoint.stargates]
+    logger.info('--fetching id lists from ESI: %s', [endpoint.value for endpoint in listed])
+    loop = asyncio.get_event_loop()
     try:
-        region_info = connections.fetch_bulk_data_async(
-            address,
-            region_list,
-            retry=retry,
-            workers=workers,
-            logger=logger
-        )
+        id_lists = await asyncio.gather(*[
+            loop.run_in_executor(None, functools.partial(
+                connections.get_esi,
+                source,
+                config.get('ENDPOINTS', endpoint.value),
+                config=config,
+                logger=logger
+            ))
+            for endpoint in listed
+        ])
     except Exception as err:
-        logger.error('Unable to fetch regions details from ESI', exc_info=True)
+        logger.error('Unable to fetch universe id lists from ESI', exc_info=True)
         raise exceptions.FatalCLIExit(repr(err))
 
-    return region_info
+    stargate_queue = asyncio.Queue()
+    queued_stargates = set()
 
+    def queue_stargates(system_info):
+        for stargate_id in system_info.get('stargates', []):
+            if stargate_id not in queued_stargates:
+                queued_stargates.add(stargate_id)
+                stargate_queue.put_nowait(stargate_id)
 
-def get_universe_stargates_details(
-        config,
-        stargate_list,
-        retry=1,
-        workers=20,
-        logger=cli_core.DEFAULT_LOGGER
-):
-    """find details on all stargates in systems list
-
-    Args:
-        config (:obj:`ProsperConfig`): config with [ENDPOINTS]
-        system_details_list (:obj:`list`): list of unique stargates
-        retry (int, optional): number of retries allowed
-        workers (int, optional): number of async workers allowed
-        logger (:obj:`loging.logger`, optional): logging handle
+    async def stargate_ids():
+        while True:
+            stargate_id = await stargate_queue.get()
+            if stargate_id is None:
+                return
+            yield stargate_id
 
-    Returns:
-        :obj:`list`: details for all stargates in /universe/stargates endpoint
-
-    Raises:
-        :obj:`exceptions.FatalCLIExit`: message admins, unable to resolve required data
+    async def crawl_systems(id_list):
+        try:
+            return await crawl_details(
+                build_fetcher(UniverseEndpoint.systems),
+                id_list,
+                UniverseEndpoint.systems,
+                journal=journal,
+                on_result=queue_stargates
+            )
+        finally:
+            stargate_queue.put_nowait(None)
+
+    jobs = {}
+    for endpoint, id_list in zip(listed, id_lists):
+        logger.debug('%s: %d ids', endpoint.value, len(id_list))
+        if endpoint is UniverseEndpoint.systems:
+            jobs[endpoint] = crawl_systems(id_list)
+        else:
+            jobs[endpoint] = crawl_details(
+                build_fetcher(endpoint),
+                id_list,
+                endpoint,
+                journal=journal
+            )
+    if UniverseEndpoint.stargates in endpoints:
+        jobs[UniverseEndpoint.stargates] = crawl_details(
+            build_fetcher(UniverseEndpoint.stargates),
+            stargate_ids(),
+            UniverseEndpoint.stargates,
+            journal=journal
+        )
 
-    """
-    base_url = '{base_url}{endpoint}'.format(
-        base_url=config.get('ENDPOINTS', 'source'),
-        endpoint=config.get('ENDPOINTS', 'stargates')
-    )
-    logger.info('--fetching stargate details from ESI')
     try:
-        stargate_info = connections.fetch_bulk_data_async(
-            base_url,
-            stargate_list,
-            retry=1,
-            workers=40,  # lots of stargates, more workers plz
-            logger=logger
-        )
+        results = await asyncio.gather(*jobs.values())
     except Exception as err:
-        logger.error('Unable to fetch stargate details from ESI', exc_info=True)
+        logger.error('Unable to fetch universe details from ESI', exc_info=True)
         raise exceptions.FatalCLIExit(repr(err))
 
-    return stargate_info
+    return dict(zip(jobs.keys(), results))
 
-def parse_stargates_from_systems(
-        system_details_list,
+def collect_failures(
+        *results,
         logger=cli_core.DEFAULT_LOGGER
 ):
-    """find all the stargate_id's and return a unique list
-
-    Notes:
-        Requires `stargates` keys in system_details list
+    """gather failure reports from bulk fetches
 
     Args:
-        system_details_list (:obj:`list`): system details from /universe/systems
+        *results (:obj:`bulk_fetch.BulkResults`): return values from crawl_details()
         logger (:obj:`logging.logger`, optional): logging handle
 
     Returns:
-        :obj:`list`: unique list of stargate_id's to fetch data for
+        :obj:`list`: :obj:`bulk_fetch.FetchFailure` for every id that was not fetched
 
     """
-    logger.info('--collecting stargate ids from system info')
-    stargates_full_list = []
-    skip_list = []
-    for system_info in cli.terminal.Progress(system_details_list):
-        if 'stargates' not in system_info:
-            skip_list.append({
-                'name': system_info['name'],
-                'system_id': system_info['system_id']
-            })
-            continue
-        stargates = system_info['stargates']
-        stargates_full_list.extend(stargates)
-
-    #if skip_list:
-    #    logger.warning('Systems found without stargates: %s', str(skip_list))
-
-    logger.info('--parsing down to unique list')
-    stargates_list = list(set(stargates_full_list))
-
-    logger.debug(len(stargates_list))
-    return stargates_list
+    failures = []
+    for result in results:
+        failures.extend(getattr(result, 'failures', []))
+
+    for failure in failures:
+        logger.warning(
+            '--failed after %d attempts: %s -- %s',
+            failure.attempts, failure.url, failure.error
+        )
+    return failures
 
 DROP_COLS = [
     'planets', 'stations', 'constellation_position', 'systems', 'constellations',
@@ -360,7 +345,11 @@ def join_stargate_details(
         reworked_stargate_info[stargate['system_id']].append(stargate['destination']['system_id'])
 
     logger.info('--casting stargate info into pandas')
-    stargate_df = pd.DataFrame(list(reworked_stargate_info.items()))
+    # the crawl finishes gates in any order: sort so row hashes are stable run to run
+    stargate_df = pd.DataFrame([
+        (system_id, sorted(destinations))
+        for system_id, destinations in reworked_stargate_info.items()
+    ])
     stargate_df.columns = ['system_id', 'stargates']
 
     logger.info('--merging stargates and map data')
@@ -372,6 +361,109 @@ def join_stargate_details(
 
     return map_df
 
+def update_sde_collection(
+        map_df,
+        collection_name,
+        conn,
+        index_key='system_id',
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """diff fresh SDE against mongo: upsert changed rows, delete vanished ones
+
+    Args:
+        map_df (:obj:`pandas.DataFrame`): fresh SDE, with provenance columns
+        collection_name (str): SDE collection
+        conn (:obj:`connections.MongoConnection`): database handle
+        index_key (str, optional): column identifying a row
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        (:obj:`list`, :obj:`list`): keys upserted, keys deleted
+
+    """
+    current_df = connections.read_collection(
+        collection_name,
+        conn,
+        projection={'_id': False},
+        logger=logger
+    )
+    changed_keys = cli_core.update_which_sde_data(current_df, map_df, index_key)
+    vanished_keys = cli_core.vanished_sde_keys(current_df, map_df, index_key)
+    logger.info(
+        '--SDE diff: %d changed/new, %d vanished, %d unchanged',
+        len(changed_keys),
+        len(vanished_keys),
+        len(map_df) - len(changed_keys)
+    )
+
+    if changed_keys:
+        connections.upsert_to_db(
+            map_df[map_df[index_key].isin(changed_keys)],
+            collection_name,
+            conn,
+            index_key,
+            logger=logger
+        )
+    if vanished_keys:
+        connections.clear_collection(
+            collection_name,
+            conn,
+            query={index_key: {'$in': vanished_keys}},
+            logger=logger
+        )
+
+    return changed_keys, vanished_keys
+
+def snapshot_graph(
+        map_df,
+        metadata_obj,
+        snapshot_path=universe_graph.DEFAULT_SNAPSHOT_PATH,
+        jobs=1,
+        debug=False,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """write the memory-mappable stargate graph for this SDE version
+
+    Notes:
+        The database is already updated: a failed snapshot is logged, not
+        raised, and consumers keep mapping the previous `CURRENT`.
+        The jump matrix is rebuilt only when the stargates changed, and
+        matrices no kept snapshot uses are pruned
+
+    Args:
+        map_df (:obj:`pandas.DataFrame`): complete SDE, one row per system
+        metadata_obj (:obj:`dict`): provenance for this run
+        snapshot_path (str, optional): snapshot directory
+        jobs (int, optional): worker processes for a jump matrix rebuild
+        debug (bool, optional): actually write the snapshot?  Debug runs must
+            not rotate the `CURRENT` that production consumers map
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        str: path to snapshot, or None on failure or in debug mode
+
+    """
+    if debug:
+        logger.warning('DEBUG MODE -- skipping graph snapshot')
+        return None
+
+    try:
+        graph = universe_graph.UniverseGraph.from_sde_frame(map_df, logger=logger)
+        graph.metadata = {
+            field: metadata_obj[field] for field in ('write_recipt', 'cron_datetime', 'version')
+            if field in metadata_obj
+        }
+        file_path = universe_graph.write_snapshot(graph, snapshot_path, logger=logger)
+    except Exception:
+        logger.error('Unable to write graph snapshot', exc_info=True)
+        return None
+
+    try:
+        jump_matrix.refresh_jump_matrix(snapshot_path, jobs=jobs, logger=logger)
+    except Exception:
+        logger.error('Unable to refresh jump matrix', exc_info=True)
+    return file_path
+
 class NavitronSDEUniverse(cli_core.NavitronApplication):
     """fetch and store traditional SDE data
 
@@ -383,7 +475,12 @@ class NavitronSDEUniverse(cli_core.NavitronApplication):
 
     force = cli.Flag(
         ['f', '--force'],
-        help='Force a fresh upload to mongodb: NOTE deletes existing version'
+        help='Force a fresh upload to mongodb: staged, then swapped in over existing version'
+    )
+
+    rollback = cli.Flag(
+        ['--rollback'],
+        help='Restore the SDE version replaced by the last `--force` run, then exit'
     )
 
     all_data = cli.Flag(
@@ -410,6 +507,11 @@ class NavitronSDEUniverse(cli_core.NavitronApplication):
         # TODO: requires `all` or `systems`
     )
 
+    resume = cli.Flag(
+        ['--resume'],
+        help='Resume a failed crawl: only fetch documents missing from the journal'
+    )
+
     def main(self):
         """application runtime"""
         self.load_logger(self.PROGNAME)
@@ -417,60 +519,72 @@ class NavitronSDEUniverse(cli_core.NavitronApplication):
             self.config,
             logger=self.logger  # note: order specific, logger may not be loaded yet
         )
+        indexes.ensure_indexes(
+            self.conn,
+            [self.PROGNAME, connections.PROVENANCE_COLLECTION],
+            debug=self.debug,
+            logger=self.logger
+        )
 
-        ## Fetch raw data from ESI ##
-        if self.all_data or self.systems or self.stargates:
-            self.logger.info('Fetching system information')
-            with Timer() as system_info_timer:
-                system_info = get_universe_systems_details(
-                    config=self.config,
-                    logger=self.logger
-                )
-                self.logger.info('TIMER: system_info_timer -- %s', system_info_timer)
-                self.logger.debug(system_info[0])
+        if self.rollback:
+            connections.rollback_collection(
+                SDE_UNIVERSE_COLLECTION,
+                self.conn,
+                logger=self.logger
+            )
+            self.logger.info('%s: Rolled back -- Have a nice day', self.PROGNAME)
+            return
 
+        journal = crawl_journal.CrawlJournal(
+            self.config.get_option('GENERAL', 'journal_path', args_default=DEFAULT_JOURNAL_PATH),
+            logger=self.logger
+        )
+        if not self.resume:
+            journal.clear()
 
+        ## Fetch raw data from ESI ##
+        endpoints = set()
+        if self.all_data or self.systems:
+            endpoints.add(UniverseEndpoint.systems)
         if self.all_data or self.stargates:
-            self.logger.info('Fetching stargate information')
-            with Timer() as parse_stargates_timer:
-                stargate_list = parse_stargates_from_systems(
-                    system_info,
-                    logger=self.logger
-                )
-                self.logger.info('TIMER: parse_stargates_timer -- %s', parse_stargates_timer)
-
-            with Timer() as stargate_info_timer:
-                stargate_info = get_universe_stargates_details(
-                    self.config,
-                    stargate_list,
-                    #workers=40,
-                    logger=self.logger
-                )
-                self.logger.info('TIMER: stargate_info_timer -- %s', stargate_info_timer)
-                self.logger.debug(stargate_info[0])
-
-
+            endpoints.add(UniverseEndpoint.stargates)
         if self.all_data or self.constellations:
-            self.logger.info('Fetching constellation information')
-            with Timer() as constellation_info_timer:
-                constellation_info = get_universe_constellations_details(
-                    config=self.config,
-                    logger=self.logger
-                )
-                self.logger.info('TIMER: constellation_info_timer -- %s', constellation_info_timer)
-                self.logger.debug(constellation_info[0])
-
-
+            endpoints.add(UniverseEndpoint.constellations)
         if self.all_data or self.regions:
-            self.logger.info('Fetching region information')
-            with Timer() as region_info_timer:
-                region_info = get_universe_regions_details(
-                    config=self.config,
-                    logger=self.logger
-                )
-                self.logger.info('TIMER: region_info_timer -- %s', region_info_timer)
-                self.logger.debug(region_info[0])
-
+            endpoints.add(UniverseEndpoint.regions)
+
+        self.logger.info('Fetching universe information: %s', [e.value for e in endpoints])
+        with Timer() as universe_timer:
+            universe = bulk_fetch.run_sync(crawl_universe(
+                self.config,
+                endpoints,
+                journal=journal,
+                logger=self.logger
+            ))
+            self.logger.info('TIMER: universe_timer -- %s', universe_timer)
+
+        system_info = universe.get(UniverseEndpoint.systems, [])
+        stargate_info = universe.get(UniverseEndpoint.stargates, [])
+        constellation_info = universe.get(UniverseEndpoint.constellations, [])
+        region_info = universe.get(UniverseEndpoint.regions, [])
+
+        failures = collect_failures(
+            system_info,
+            stargate_info,
+            constellation_info,
+            region_info,
+            logger=self.logger
+        )
+        if failures:
+            self.logger.error(
+                '%s: %d ESI documents could not be fetched, not writing a partial SDE',
+                self.PROGNAME,
+                len(failures)
+            )
+            journal.close()
+            raise exceptions.FatalCLIExit(
+                '{} ids failed -- rerun with `--resume` to fetch only those'.format(len(failures))
+            )
 
         ## Process data into Mongo-ready shape ##
         self.logger.info('Combining data in Pandas')
@@ -501,30 +615,6 @@ class NavitronSDEUniverse(cli_core.NavitronApplication):
 
 
         ## Send data into MongoDB ##
-        if not self.force:
-            self.logger.warning('NOT IMPLEMENTED -- SDE UPDATE ONLY')
-            self.logger.info('Setting `--force`')
-            self.force = True
-
-        if self.force:
-            self.logger.warning('CLEARING EXISTING DATA')
-            for seconds in cli.terminal.Progress(range(1,10)):
-                time.sleep(1)
-            try:
-                connections.clear_collection(
-                    SDE_UNIVERSE_COLLECTION,
-                    self.conn,
-                    debug=self.debug,
-                    logger=self.logger
-                )
-            except Exception:
-                self.logger.error(
-                    '%s: Unable to clear SDE data from existing MongoDB',
-                    self.PROGNAME,
-                    exc_info=True
-                )
-                raise
-
         metadata_obj = cli_core.generate_metadata(
             self.PROGNAME,
             self.VERSION
@@ -534,13 +624,28 @@ class NavitronSDEUniverse(cli_core.NavitronApplication):
 
         self.logger.info('Pushing data to database')
         try:
-            connections.dump_to_db(
-                map_df,
-                self.PROGNAME,
-                self.conn,
-                debug=self.debug,
-                logger=self.logger
-            )
+            if self.force or self.debug:
+                connections.stage_collection(
+                    map_df,
+                    SDE_UNIVERSE_COLLECTION,
+                    self.conn,
+                    index_key='system_id',
+                    debug=self.debug,
+                    logger=self.logger
+                )
+                connections.swap_collection(
+                    SDE_UNIVERSE_COLLECTION,
+                    self.conn,
+                    debug=self.debug,
+                    logger=self.logger
+                )
+            else:
+                update_sde_collection(
+                    map_df,
+                    SDE_UNIVERSE_COLLECTION,
+                    self.conn,
+                    logger=self.logger
+                )
             connections.write_provenance(
                 metadata_obj,
                 self.conn,
@@ -555,6 +660,20 @@ class NavitronSDEUniverse(cli_core.NavitronApplication):
             )
             raise
 
+        if 'stargates' in map_df.columns:
+            snapshot_graph(
+                map_df,
+                metadata_obj,
+                self.config.get_option(
+                    'GENERAL', 'graph_path',
+                    args_default=universe_graph.DEFAULT_SNAPSHOT_PATH
+                ),
+                jobs=os.cpu_count() or 1,
+                debug=self.debug,
+                logger=self.logger
+            )
+
+        journal.clear()
         self.logger.info('%s: Complete -- Have a nice day', self.PROGNAME)
 
 def run_main():
@@ -8,6 +8,7 @@ import retry
 
 import navitron_crons.exceptions as exceptions
 import navitron_crons.connections as connections
+import navitron_crons.indexes as indexes
 import navitron_crons._version as _version
 import navitron_crons.cli_core as cli_core
 
@@ -35,6 +36,7 @@ def get_server_status(
     raw_data = connections.get_esi(
         config.get('ENDPOINTS', 'source'),
         config.get('ENDPOINTS', 'server_status'),
+        config=config,
         logger=logger
     )
 
@@ -57,6 +59,12 @@ class NavitronServerStatus(cli_core.NavitronApplication):
             self.config,
             logger=self.logger  # note: order specific, logger may not be loaded yet
         )
+        indexes.ensure_indexes(
+            self.conn,
+            [self.PROGNAME, connections.PROVENANCE_COLLECTION],
+            debug=self.debug,
+            logger=self.logger
+        )
 
         self.logger.info('HELLO WORLD')
 
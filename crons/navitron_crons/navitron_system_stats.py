@@ -8,6 +8,8 @@ import retry
 
 import navitron_crons.exceptions as exceptions
 import navitron_crons.connections as connections
+import navitron_crons.indexes as indexes
+import navitron_crons.stats_buckets as stats_buckets
 import navitron_crons._version as _version
 import navitron_crons.cli_core as cli_core
 
@@ -35,6 +37,7 @@ def get_system_jumps(
     raw_data = connections.get_esi(
         config.get('ENDPOINTS', 'source'),
         config.get('ENDPOINTS', 'system_jumps'),
+        config=config,
         logger=logger
     )
 
@@ -62,6 +65,7 @@ def get_system_kills(
     raw_data = connections.get_esi(
         config.get('ENDPOINTS', 'source'),
         config.get('ENDPOINTS', 'system_kills'),
+        config=config,
         logger=logger
     )
 
@@ -88,6 +92,24 @@ class NavitronSystemStats(cli_core.NavitronApplication):
             self.config,
             logger=self.logger  # note: order specific, logger may not be loaded yet
         )
+        layout = self.config.get_option('system_stats', 'layout', args_default='documents')
+        if layout not in stats_buckets.LAYOUTS:
+            raise exceptions.FatalCLIExit('unknown [system_stats] layout: {}'.format(layout))
+        collection_name = stats_buckets.LAYOUT_COLLECTIONS[layout]
+        if layout == 'timeseries' and not self.debug:
+            stats_buckets.ensure_timeseries_collection(
+                self.conn,
+                collection_name,
+                retention_days=self.config.get_option(
+                    'system_stats', 'retention_days', args_default=None),
+                logger=self.logger
+            )
+        indexes.ensure_indexes(
+            self.conn,
+            [collection_name, connections.PROVENANCE_COLLECTION],
+            debug=self.debug,
+            logger=self.logger
+        )
 
         self.logger.info('HELLO WORLD')
 
@@ -140,11 +162,18 @@ class NavitronSystemStats(cli_core.NavitronApplication):
         system_info_df['write_recipt'] = metadata_obj['write_recipt']
         self.logger.debug(system_info_df.head(5))
 
+        if layout == 'bucket':
+            system_info = [stats_buckets.to_bucket(system_info_df, metadata_obj)]
+        elif layout == 'timeseries':
+            system_info = stats_buckets.to_timeseries_records(system_info_df, metadata_obj)
+        else:
+            system_info = system_info_df
+
         self.logger.info('Pushing data to database')
         try:
             connections.dump_to_db(
-                system_info_df,
-                self.PROGNAME,
+                system_info,
+                collection_name,
                 self.conn,
                 debug=self.debug,
                 logger=self.logger
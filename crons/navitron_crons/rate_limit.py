@@ -0,0 +1,206 @@
+"""rate_limit.py: token-bucket rate limiting for ESI requests
+
+Buckets are safe to share between threads, coroutines and (with
+`FileTokenBucket`) every navitron_* process on the host
+
+"""
+from os import path
+import asyncio
+import os
+import struct
+import tempfile
+import threading
+import time
+import warnings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+import navitron_crons.cli_core as cli_core
+
+class TokenBucket(object):
+    """thread-safe token bucket
+
+    Notes:
+        `reserve()` claims a token immediately and reports how long the caller
+        must wait to use it.  Callers queue up in the order they reserved and
+        the lock is never held while sleeping.
+
+    Args:
+        rate (float): tokens refilled per second
+        capacity (float, optional): burst size, defaults to `rate`
+
+    """
+    def __init__(
+            self,
+            rate,
+            capacity=None
+    ):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+
+    def _spend(self, tokens, stamp, count):
+        """refill by elapsed time, then take `count` tokens
+
+        Args:
+            tokens (float): tokens available at `stamp`
+            stamp (float): `time.monotonic()` of last update
+            count (float): tokens to take
+
+        Returns:
+            float: tokens remaining (negative when in debt)
+            float: `time.monotonic()` of this update
+            float: seconds to wait before using the tokens
+
+        """
+        now = time.monotonic()
+        if stamp > now:  # state left over from before a reboot
+            tokens, stamp = self.capacity, now
+        tokens = min(self.capacity, tokens + (now - stamp) * self.rate)
+        tokens -= count
+        wait = max(0.0, -tokens / self.rate)
+        return tokens, now, wait
+
+    def reserve(self, count=1):
+        """claim tokens without blocking
+
+        Args:
+            count (float, optional): tokens to take
+
+        Returns:
+            float: seconds to wait before acting on the reservation
+
+        """
+        with self._lock:
+            self._tokens, self._stamp, wait = self._spend(self._tokens, self._stamp, count)
+        return wait
+
+    def acquire(self, count=1):
+        """block the calling thread until tokens are available
+
+        Args:
+            count (float, optional): tokens to take
+
+        Returns:
+            float: seconds spent waiting
+
+        """
+        wait = self.reserve(count)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, count=1):
+        """suspend the calling coroutine until tokens are available
+
+        Args:
+            count (float, optional): tokens to take
+
+        Returns:
+            float: seconds spent waiting
+
+        """
+        wait = self.reserve(count)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+_STATE = struct.Struct('<dd')
+class FileTokenBucket(TokenBucket):
+    """token bucket whose state lives in a lock-protected file
+
+    Notes:
+        Every process opening the same `bucket_path` draws from one bucket.
+        Relies on `fcntl.flock` and the host-wide `time.monotonic()` clock,
+        so sharing is per-host and POSIX only.
+
+    Args:
+        bucket_path (str): path to shared state file
+        rate (float): tokens refilled per second
+        capacity (float, optional): burst size, defaults to `rate`
+
+    """
+    def __init__(
+            self,
+            bucket_path,
+            rate,
+            capacity=None
+    ):
+        super().__init__(rate, capacity)
+        self.bucket_path = bucket_path
+        self._fd = os.open(bucket_path, os.O_RDWR | os.O_CREAT, 0o666)
+
+    def reserve(self, count=1):
+        """claim tokens from the shared bucket without blocking
+
+        Args:
+            count (float, optional): tokens to take
+
+        Returns:
+            float: seconds to wait before acting on the reservation
+
+        """
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                raw = os.pread(self._fd, _STATE.size, 0)
+                if len(raw) == _STATE.size:
+                    tokens, stamp = _STATE.unpack(raw)
+                else:
+                    tokens, stamp = self.capacity, time.monotonic()
+
+                tokens, stamp, wait = self._spend(tokens, stamp, count)
+                os.pwrite(self._fd, _STATE.pack(tokens, stamp), 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return wait
+
+    def close(self):
+        """release file handle"""
+        os.close(self._fd)
+
+DEFAULT_BUCKET_PATH = path.join(tempfile.gettempdir(), 'navitron_esi.bucket')
+RATE_LIMITERS = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+def get_rate_limiter(config=None):
+    """process-wide ESI rate limiter, one per [ESI] rate settings
+
+    Notes:
+        Limiters are keyed by pid too: a forked child must not share the
+        parent's file handle, or their `flock` calls stop excluding each other
+
+    Args:
+        config (:obj:`p_config.ProsperConfig`, optional): config with [ESI] data
+
+    Returns:
+        :obj:`TokenBucket`: shared limiter
+
+    """
+    config = config or cli_core.CONFIG
+    rate = float(config.get_option('ESI', 'requests_per_second', args_default=140))
+    burst = float(config.get_option('ESI', 'burst', args_default=280))
+    bucket_path = config.get_option('ESI', 'rate_limit_path', args_default=DEFAULT_BUCKET_PATH)
+
+    key = (os.getpid(), rate, burst, bucket_path)
+    with _RATE_LIMITERS_LOCK:
+        if key not in RATE_LIMITERS:
+            if fcntl is None:  # pragma: no cover
+                warnings.warn(
+                    'No fcntl: ESI rate limit is not shared between processes', RuntimeWarning)
+                RATE_LIMITERS[key] = TokenBucket(rate, burst)
+            else:
+                RATE_LIMITERS[key] = FileTokenBucket(bucket_path, rate, burst)
+        return RATE_LIMITERS[key]
+
+def close_rate_limiters():
+    """release every shared limiter's file handle"""
+    with _RATE_LIMITERS_LOCK:
+        for limiter in RATE_LIMITERS.values():
+            if hasattr(limiter, 'close'):
+                limiter.close()
+        RATE_LIMITERS.clear()
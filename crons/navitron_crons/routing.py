@@ -0,0 +1,489 @@
+"""routing.py: danger-weighted shortest routes over the stargate graph
+
+Entering a system costs
+
+    jump + security * insecurity + danger * danger_score
+
+where `insecurity` maps `security_status` 1.0..-1.0 onto 0..1 and
+`danger_score` is recent ship + pod kills, log-scaled onto 0..1.  Costs sit
+on nodes, so every edge into a system costs the same and `jump > 0` keeps
+each hop at least `min_cost`.
+
+Searches are binary-heap (`heapq`) Dijkstra with an early exit at the
+destination; A* adds an admissible, consistent lower bound per node from a
+`heuristic(target, origin)` callable, e.g. `PositionHeuristic`.
+
+"""
+from array import array
+from collections import namedtuple
+from datetime import datetime, timedelta
+from heapq import heappop, heappush
+import math
+
+import numpy as np
+
+import navitron_crons.cli_core as cli_core
+import navitron_crons.history_loader as history_loader
+import navitron_crons.jump_matrix as jump_matrix
+import navitron_crons.landmarks as landmarks
+import navitron_crons.universe_graph as universe_graph
+
+DANGER_METRICS = ('ship_kills', 'pod_kills')
+
+class RouteWeights(namedtuple('RouteWeights', ['jump', 'security', 'danger'])):
+    """cost blend, see module notes
+
+    Attributes:
+        jump (float): cost per jump, must be > 0
+        security (float): cost of entering a -1.0 system over a 1.0 one
+        danger (float): cost of entering the most dangerous system
+
+    """
+    __slots__ = ()
+
+    def __new__(cls, jump=1.0, security=2.0, danger=4.0):
+        if jump <= 0 or security < 0 or danger < 0:
+            raise ValueError('weights must be jump > 0, others >= 0: {}'.format(
+                (jump, security, danger)))
+        return super().__new__(cls, float(jump), float(security), float(danger))
+
+    @classmethod
+    def from_config(cls, config):
+        """read `[routing]` weights
+
+        Args:
+            config (:obj:`prosper_config.ProsperConfig`): app config
+
+        Returns:
+            :obj:`RouteWeights`
+
+        """
+        return cls(
+            jump=float(config.get_option('routing', 'jump_weight', args_default=1.0)),
+            security=float(config.get_option('routing', 'security_weight', args_default=2.0)),
+            danger=float(config.get_option('routing', 'danger_weight', args_default=4.0)),
+        )
+
+Route = namedtuple('Route', ['system_ids', 'cost', 'jumps', 'expanded'])
+Route.__doc__ = """one origin -> destination answer
+
+Attributes:
+    system_ids (:obj:`list`): systems along the route, origin first
+    cost (float): weighted cost
+    jumps (int): stargate jumps
+    expanded (int): nodes settled by the search
+
+"""
+
+def insecurity(security_status):
+    """:obj:`numpy.ndarray`: `security_status` 1.0..-1.0 as 0..1"""
+    return (1.0 - np.clip(np.asarray(security_status, dtype=np.float64), -1.0, 1.0)) / 2.0
+
+def danger_from_history(
+        history,
+        system_ids,
+        metrics=DANGER_METRICS
+):
+    """log-scaled kill totals per system
+
+    Args:
+        history (:obj:`history_loader.SystemHistory`): stats window
+        system_ids (:obj:`numpy.ndarray`): sorted ids to score, e.g. `graph.system_ids`
+        metrics (:obj:`tuple`, optional): metrics to sum
+
+    Returns:
+        :obj:`numpy.ndarray`: float64 0..1 per system; 0 for systems without stats
+
+    """
+    kills = np.zeros(len(system_ids), dtype=np.float64)
+    if len(history.system_ids):
+        totals = sum(history.metrics[metric].sum(axis=1, dtype=np.int64) for metric in metrics)
+        rows = np.searchsorted(system_ids, history.system_ids)
+        found = rows < len(system_ids)
+        found[found] = system_ids[rows[found]] == history.system_ids[found]
+        kills[rows[found]] = totals[found]
+
+    danger = np.log1p(kills)
+    peak = danger.max() if len(danger) else 0.0
+    return danger / peak if peak > 0 else danger
+
+def load_danger(
+        conn,
+        graph,
+        hours=24,
+        layout='documents',
+        now=None,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """danger scores for `graph` from the last `hours` of system_stats
+
+    Args:
+        conn (:obj:`connections.MongoConnection`): database handle
+        graph (:obj:`universe_graph.UniverseGraph`): systems to score
+        hours (int, optional): history window
+        layout (str, optional): system_stats storage layout
+        now (:obj:`datetime.datetime`, optional): end of window, default utcnow
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        :obj:`numpy.ndarray`: float64 0..1 per node
+
+    """
+    end = now or datetime.utcnow()
+    history = history_loader.load_history(
+        conn,
+        start=end - timedelta(hours=hours),
+        end=end,
+        metrics=DANGER_METRICS,
+        system_ids=graph.system_ids,
+        layout=layout,
+        logger=logger
+    )
+    return danger_from_history(history, graph.system_ids)
+
+def as_bounds(values):
+    """pack per-node A* bounds for the search loop
+
+    Notes:
+        `array('d')` indexes nearly as fast as a list, but builds from NumPy
+        in a memcpy rather than boxing every value through `tolist()`
+
+    Args:
+        values (:obj:`numpy.ndarray`): lower bound per node
+
+    Returns:
+        :obj:`array.array`: float64 bounds
+
+    """
+    return array('d', np.asarray(values, dtype=np.float64).tobytes())
+
+class PositionHeuristic(object):
+    """jump lower bound from straight-line distance
+
+    Notes:
+        No stargate spans more than `reach`, so reaching a system `d` away
+        takes at least `ceil(d / reach)` jumps
+
+    Args:
+        graph (:obj:`universe_graph.UniverseGraph`): graph with x/y/z nodes
+        min_cost (float): cheapest system to enter
+
+    """
+    def __init__(self, graph, min_cost):
+        self.positions = graph.positions
+        self.min_cost = min_cost
+        sources = np.repeat(np.arange(len(graph)), graph.degree())
+        lengths = np.linalg.norm(self.positions[graph.indices] - self.positions[sources], axis=1)
+        self.reach = float(lengths.max()) if len(lengths) else 0.0
+
+    def __call__(self, target, origin=None):
+        """:obj:`array.array`: lower bound on the cost from each node to `target`"""
+        if not self.reach:
+            return as_bounds(np.zeros(len(self.positions)))
+        distance = np.linalg.norm(self.positions - self.positions[target], axis=1)
+        return as_bounds(np.ceil(distance / self.reach - 1e-9) * self.min_cost)
+
+class RouteEngine(object):
+    """answer route queries over one graph + weights + danger
+
+    Args:
+        graph (:obj:`universe_graph.UniverseGraph`): stargate graph
+        weights (:obj:`RouteWeights`, optional): cost blend
+        danger (:obj:`numpy.ndarray`, optional): 0..1 per node, see `load_danger()`
+
+    """
+    def __init__(
+            self,
+            graph,
+            weights=RouteWeights(),
+            danger=None
+    ):
+        self.graph = graph
+        self.weights = weights
+        self.danger = np.zeros(len(graph)) if danger is None else np.asarray(danger)
+        self._adjacency = [
+            graph.indices[start:end].tolist()
+            for start, end in zip(graph.indptr[:-1].tolist(), graph.indptr[1:].tolist())
+        ]
+        self.components = graph.components()
+        self._components = self.components.tolist()
+        self._unreached = array('d', [math.inf]) * len(graph)
+        self._orphans = array('l', [-1]) * len(graph)
+        self._reverse_adjacency = None
+        self.heuristic = None  # `heuristic(target, origin)` for `route()`, see `astar()`
+        self.jump_matrix = None
+        self.landmark_count = 0
+        self.landmarks = None
+        self._update_costs()
+
+    @classmethod
+    def from_snapshot(
+            cls,
+            snapshot_path=universe_graph.DEFAULT_SNAPSHOT_PATH,
+            weights=RouteWeights(),
+            danger=None
+    ):
+        """build over the current memory-mapped graph snapshot"""
+        return cls(universe_graph.load_snapshot(snapshot_path), weights, danger)
+
+    def _update_costs(self):
+        """recompute node costs; heuristics scale with `min_cost`"""
+        cost = np.full(len(self.graph), self.weights.jump)
+        if 'security_status' in self.graph.nodes:
+            cost += self.weights.security * insecurity(self.graph.nodes['security_status'])
+        cost += self.weights.danger * self.danger
+        self.node_cost = cost
+        self.min_cost = float(cost.min()) if len(cost) else self.weights.jump
+        self._cost = cost.tolist()
+        self._position_heuristic = None
+        if self.landmark_count:
+            self.landmarks = landmarks.LandmarkTables.build(self, self.landmark_count)
+        self._select_heuristic()
+
+    def _select_heuristic(self):
+        """use `_bounds` while any bound source is attached"""
+        if self.jump_matrix is not None or self.landmarks is not None:
+            self.heuristic = self._bounds
+        elif self.heuristic == self._bounds:
+            self.heuristic = None
+
+    def _bounds(self, target, origin=None):
+        """tightest of the jump-matrix and landmark bounds"""
+        bounds = []
+        if self.jump_matrix is not None:
+            bounds.append(self.jump_matrix.bounds(target, self.min_cost))
+        if self.landmarks is not None:
+            bounds.append(self.landmarks.bounds(target, origin, landmarks.ACTIVE_LANDMARKS))
+        return as_bounds(np.maximum.reduce(bounds))
+
+    def use_jump_matrix(self, matrix):
+        """route with A* on exact jump counts
+
+        Notes:
+            Jump counts do not depend on node costs, so landmark tables are kept
+
+        Args:
+            matrix (:obj:`jump_matrix.JumpMatrix`): matrix built for `self.graph`
+
+        """
+        self.jump_matrix = matrix
+        self._select_heuristic()
+
+    def use_landmarks(self, count=landmarks.DEFAULT_LANDMARKS):
+        """route with A* on landmark (ALT) bounds, rebuilt with every cost change
+
+        Args:
+            count (int, optional): landmarks to keep tables for; 0 to stop
+
+        """
+        self.landmark_count = count
+        self.landmarks = None
+        self._update_costs()
+
+    def costs_from(self, origin):
+        """weighted cost from node `origin` to every node
+
+        Returns:
+            :obj:`numpy.ndarray`: float64 per node, `inf` if unreachable
+
+        """
+        adjacency, cost = self._adjacency, self._cost
+        dist = self._unreached[:]
+        dist[origin] = 0.0
+        heap = [(0.0, origin)]
+        while heap:
+            base, node = heappop(heap)
+            if base > dist[node]:
+                continue
+            for neighbor in adjacency[node]:
+                candidate = base + cost[neighbor]
+                if candidate < dist[neighbor]:
+                    dist[neighbor] = candidate
+                    heappush(heap, (candidate, neighbor))
+        return np.frombuffer(dist, dtype=np.float64).copy()
+
+    def costs_to(self, target):
+        """weighted cost from every node to node `target`
+
+        Notes:
+            Walks stargates backwards: stepping back from `node` costs
+            `node`'s entry cost, whichever system the gate came from
+
+        Returns:
+            :obj:`numpy.ndarray`: float64 per node, `inf` if unreachable
+
+        """
+        if self._reverse_adjacency is None:
+            self._reverse_adjacency = [[] for _ in self._adjacency]
+            for node, neighbors in enumerate(self._adjacency):
+                for neighbor in neighbors:
+                    self._reverse_adjacency[neighbor].append(node)
+
+        adjacency, cost = self._reverse_adjacency, self._cost
+        dist = self._unreached[:]
+        dist[target] = 0.0
+        heap = [(0.0, target)]
+        while heap:
+            base, node = heappop(heap)
+            if base > dist[node]:
+                continue
+            candidate = base + cost[node]
+            for neighbor in adjacency[node]:
+                if candidate < dist[neighbor]:
+                    dist[neighbor] = candidate
+                    heappush(heap, (candidate, neighbor))
+        return np.frombuffer(dist, dtype=np.float64).copy()
+
+    def set_weights(self, weights):
+        """swap the cost blend"""
+        self.weights = weights
+        self._update_costs()
+
+    def set_danger(self, danger):
+        """swap per-system danger, e.g. after a new `navitron_system_stats` run"""
+        self.danger = np.asarray(danger)
+        self._update_costs()
+
+    def _search(self, origin, target, bound=None):
+        """heap search from node `origin` to node `target`
+
+        Notes:
+            Heap entries are `(key, cost, node)`; an entry whose cost is
+            above the node's best is stale and skipped, so no decrease-key
+
+        Args:
+            origin (int): node index
+            target (int): node index
+            bound (:obj:`array.array`, optional): A* lower bound per node
+
+        Returns:
+            (:obj:`list`, float, int): node path, cost, expanded; path is None if unreachable
+
+        """
+        if self._components[origin] != self._components[target]:
+            return None, math.inf, 0
+
+        adjacency, cost = self._adjacency, self._cost
+        dist = self._unreached[:]
+        parent = self._orphans[:]
+        dist[origin] = 0.0
+        heap = [(0.0, 0.0, origin)]
+        expanded = 0
+        while heap:
+            _, base, node = heappop(heap)
+            if node == target:
+                break
+            if base > dist[node]:
+                continue
+            expanded += 1
+            for neighbor in adjacency[node]:
+                candidate = base + cost[neighbor]
+                if candidate < dist[neighbor]:
+                    dist[neighbor] = candidate
+                    parent[neighbor] = node
+                    if bound is None:
+                        heappush(heap, (candidate, candidate, neighbor))
+                    else:
+                        heappush(heap, (candidate + bound[neighbor], candidate, neighbor))
+
+        path = [target]
+        while path[-1] != origin:
+            path.append(parent[path[-1]])
+        return path[::-1], dist[target], expanded
+
+    def _route(self, origin_id, destination_id, bound_factory):
+        origin, target = self.graph.index_of([origin_id, destination_id]).tolist()
+        path, cost, expanded = self._search(
+            origin,
+            target,
+            bound_factory(target, origin) if bound_factory else None
+        )
+        if path is None:
+            return None
+        return Route(self.graph.system_ids[path].tolist(), cost, len(path) - 1, expanded)
+
+    def dijkstra(self, origin_id, destination_id):
+        """cheapest route, plain Dijkstra
+
+        Args:
+            origin_id (int): EVE system id
+            destination_id (int): EVE system id
+
+        Returns:
+            :obj:`Route`: or None if no stargate route exists
+
+        Raises:
+            KeyError: unknown system id
+
+        """
+        return self._route(origin_id, destination_id, None)
+
+    def astar(self, origin_id, destination_id, heuristic=None):
+        """cheapest route, A*
+
+        Args:
+            origin_id (int): EVE system id
+            destination_id (int): EVE system id
+            heuristic (callable, optional): `heuristic(target, origin)` -> lower
+                bound per node, see `as_bounds()`; default `self.heuristic`, then `PositionHeuristic`
+
+        Returns:
+            :obj:`Route`: or None if no stargate route exists
+
+        Raises:
+            KeyError: unknown system id
+
+        """
+        heuristic = heuristic or self.heuristic
+        if heuristic is None:
+            if self._position_heuristic is None:
+                self._position_heuristic = PositionHeuristic(self.graph, self.min_cost)
+            heuristic = self._position_heuristic
+        return self._route(origin_id, destination_id, heuristic)
+
+    def route(self, origin_id, destination_id):
+        """cheapest route: A* over `self.heuristic` if set, otherwise Dijkstra
+
+        Notes:
+            straight-line bounds are weak in New Eden, where gates span
+            regions, and cost more to build per query than they save
+
+        """
+        if self.heuristic is None:
+            return self.dijkstra(origin_id, destination_id)
+        return self.astar(origin_id, destination_id)
+
+def engine_from_config(
+        config,
+        conn,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """route engine over the current graph snapshot and recent danger
+
+    Args:
+        config (:obj:`prosper_config.ProsperConfig`): app config
+        conn (:obj:`connections.MongoConnection`): database handle
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        :obj:`RouteEngine`
+
+    """
+    snapshot_path = config.get_option(
+        'GENERAL', 'graph_path', args_default=universe_graph.DEFAULT_SNAPSHOT_PATH)
+    graph = universe_graph.load_snapshot(snapshot_path)
+    danger = load_danger(
+        conn,
+        graph,
+        hours=int(config.get_option('routing', 'danger_hours', args_default=24)),
+        layout=config.get_option('system_stats', 'layout', args_default='documents'),
+        logger=logger
+    )
+    engine = RouteEngine(graph, RouteWeights.from_config(config), danger)
+    try:
+        engine.use_jump_matrix(jump_matrix.JumpMatrix.load(graph, snapshot_path))
+    except FileNotFoundError:
+        logger.warning('--no jump matrix for %s, using landmarks only', graph.metadata)
+    engine.use_landmarks(int(config.get_option(
+        'routing', 'landmarks', args_default=landmarks.DEFAULT_LANDMARKS)))
+    return engine
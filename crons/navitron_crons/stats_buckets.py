@@ -0,0 +1,210 @@
+"""stats_buckets.py: storage layouts for system_stats snapshots
+
+`documents` (default): one document per system per snapshot, as always.
+`bucket`: one document per snapshot, with parallel packed int32 arrays per
+    field; the snapshot's `cron_datetime`/`write_recipt` are stored once, not
+    per system.  BSON arrays spend a key string per element, so arrays are
+    stored as little-endian binary: 4 bytes per value.
+`timeseries`: one document per system in a native MongoDB (5.0+) time-series
+    collection, which buckets and compresses them server side.
+
+Readers return the same long frame for every layout.
+
+"""
+import numpy as np
+import pandas as pd
+import pymongo.errors
+
+import navitron_crons.cli_core as cli_core
+
+LAYOUTS = ('documents', 'bucket', 'timeseries')
+STATS_COLLECTION = 'navitron_system_stats'
+BUCKET_COLLECTION = 'navitron_system_stats_buckets'
+TIMESERIES_COLLECTION = 'navitron_system_stats_ts'
+LAYOUT_COLLECTIONS = {
+    'documents': STATS_COLLECTION,
+    'bucket': BUCKET_COLLECTION,
+    'timeseries': TIMESERIES_COLLECTION,
+}
+
+TIME_FIELD = 'snapshot_time'
+METRIC_FIELDS = ('ship_jumps', 'ship_kills', 'npc_kills', 'pod_kills')
+ARRAY_FIELDS = ('system_id',) + METRIC_FIELDS
+FRAME_COLUMNS = list(ARRAY_FIELDS) + ['cron_datetime', 'write_recipt']
+ARRAY_DTYPE = np.dtype('<i4')
+
+def snapshot_time(cron_datetime):
+    """:obj:`datetime.datetime`: BSON-friendly datetime for an ISO `cron_datetime`"""
+    return pd.Timestamp(cron_datetime).to_pydatetime()
+
+def to_bucket(
+        system_info_df,
+        metadata_obj
+):
+    """pack one snapshot into a single document of parallel int32 arrays
+
+    Args:
+        system_info_df (:obj:`pandas.DataFrame`): merged jumps/kills per system
+        metadata_obj (:obj:`dict`): provenance from `cli_core.generate_metadata()`
+
+    Returns:
+        :obj:`dict`: bucket document
+
+    """
+    snapshot_df = system_info_df.sort_values('system_id')
+    bucket = {
+        'cron_datetime': metadata_obj['cron_datetime'],
+        'write_recipt': metadata_obj['write_recipt'],
+        TIME_FIELD: snapshot_time(metadata_obj['cron_datetime']),
+        'system_count': len(snapshot_df),
+    }
+    for field in ARRAY_FIELDS:
+        bucket[field] = snapshot_df[field].fillna(0).to_numpy(dtype=ARRAY_DTYPE).tobytes()
+
+    return bucket
+
+def to_timeseries_records(
+        system_info_df,
+        metadata_obj
+):
+    """one measurement per system, with a BSON date for the time-series `timeField`
+
+    Args:
+        system_info_df (:obj:`pandas.DataFrame`): merged jumps/kills per system
+        metadata_obj (:obj:`dict`): provenance from `cli_core.generate_metadata()`
+
+    Returns:
+        :obj:`list`: documents
+
+    """
+    records_df = system_info_df[list(ARRAY_FIELDS)].fillna(0).astype('int64')
+    records_df[TIME_FIELD] = snapshot_time(metadata_obj['cron_datetime'])
+    records_df['cron_datetime'] = metadata_obj['cron_datetime']
+    records_df['write_recipt'] = metadata_obj['write_recipt']
+    return records_df.to_dict(orient='records')
+
+def ensure_timeseries_collection(
+        conn,
+        collection_name=TIMESERIES_COLLECTION,
+        retention_days=None,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """create the native time-series collection, if missing
+
+    Args:
+        conn (:obj:`connections.MongoConnection`): database handle
+        collection_name (str, optional): collection to create
+        retention_days (int, optional): expire measurements after this many days
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    """
+    options = {
+        'timeseries': {
+            'timeField': TIME_FIELD,
+            'metaField': 'system_id',
+            'granularity': 'hours',
+        }
+    }
+    if retention_days:
+        options['expireAfterSeconds'] = int(retention_days) * 86400
+
+    with conn as db_conn:
+        try:
+            db_conn.create_collection(collection_name, **options)
+            logger.info('--created time-series collection: %s', collection_name)
+        except pymongo.errors.CollectionInvalid:
+            pass
+
+def expand_buckets(buckets):
+    """unpack bucket documents back into one row per system per snapshot
+
+    Args:
+        buckets (iterable): bucket documents from `to_bucket()`
+
+    Returns:
+        :obj:`pandas.DataFrame`: same columns as the `documents` layout
+
+    """
+    buckets = list(buckets)
+    if not buckets:
+        return pd.DataFrame(columns=FRAME_COLUMNS)
+
+    counts = [bucket['system_count'] for bucket in buckets]
+    columns = {
+        field: np.concatenate([
+            np.frombuffer(bucket[field], dtype=ARRAY_DTYPE) for bucket in buckets
+        ]).astype(np.int64)
+        for field in ARRAY_FIELDS
+    }
+    for field in ('cron_datetime', 'write_recipt'):
+        columns[field] = np.repeat([bucket[field] for bucket in buckets], counts)
+
+    return pd.DataFrame(columns, columns=FRAME_COLUMNS)
+
+def time_query(
+        field,
+        start=None,
+        end=None
+):
+    """build a `[start, end)` range filter
+
+    Args:
+        field (str): field to filter on
+        start (optional): inclusive lower bound
+        end (optional): exclusive upper bound
+
+    Returns:
+        :obj:`dict`: mongo query
+
+    """
+    bounds = {}
+    if start is not None:
+        bounds['$gte'] = start
+    if end is not None:
+        bounds['$lt'] = end
+    return {field: bounds} if bounds else {}
+
+def read_system_stats(
+        conn,
+        layout='documents',
+        start=None,
+        end=None,
+        batch_size=10000,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """load a range of snapshots as one row per system per snapshot
+
+    Args:
+        conn (:obj:`connections.MongoConnection`): database handle
+        layout (str, optional): storage layout, see `LAYOUTS`
+        start (:obj:`datetime.datetime`, optional): first snapshot to include
+        end (:obj:`datetime.datetime`, optional): stop before this snapshot
+        batch_size (int, optional): documents per cursor round trip
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        :obj:`pandas.DataFrame`: `FRAME_COLUMNS`
+
+    """
+    collection_name = LAYOUT_COLLECTIONS[layout]
+    projection = {field: True for field in FRAME_COLUMNS + ['system_count']}
+    projection['_id'] = False
+    if layout == 'timeseries':
+        query = time_query(TIME_FIELD, start, end)
+    else:
+        query = time_query(
+            'cron_datetime',
+            start.isoformat() if start is not None else None,
+            end.isoformat() if end is not None else None
+        )
+
+    logger.info('--reading %s snapshots from: %s', layout, collection_name)
+    with conn as db_conn:
+        cursor = db_conn[collection_name].find(query, projection).batch_size(batch_size)
+        if layout == 'bucket':
+            stats_df = expand_buckets(cursor)
+        else:
+            stats_df = pd.DataFrame(list(cursor), columns=FRAME_COLUMNS)
+
+    logger.info('--read rows: %d', len(stats_df))
+    return stats_df
@@ -0,0 +1,397 @@
+"""universe_graph.py: compact CSR stargate graph built from the SDE
+
+Systems are renumbered 0..N-1 in `system_id` order.  Row `i` of the graph
+lists the systems one jump from `i` in `indices[indptr[i]:indptr[i + 1]]`,
+so routing code walks contiguous int32 arrays instead of pandas objects.
+
+Snapshots:
+    `write_snapshot()` saves a graph as one binary file per SDE version,
+    named for its provenance `write_recipt`:
+
+        8 bytes    magic `NAVGRAPH`
+        uint32     format version
+        uint32     header length
+        header     utf-8 JSON: metadata + {array: {dtype, shape, offset}}
+        arrays     raw little-endian data, each 64-byte aligned
+
+    so any process can `np.memmap` the arrays straight out of the page
+    cache; `CURRENT` in the snapshot directory names the latest file.
+
+"""
+from itertools import chain
+from os import path
+import glob
+import hashlib
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+import navitron_crons.cli_core as cli_core
+import navitron_crons.connections as connections
+
+SDE_UNIVERSE_COLLECTION = 'navitron_sde_universe'  # navitron_sde_universe.SDE_UNIVERSE_COLLECTION
+INDEX_DTYPE = np.int32
+
+SNAPSHOT_MAGIC = b'NAVGRAPH'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_PREAMBLE = struct.Struct('<8sII')
+SNAPSHOT_ALIGN = 64
+SNAPSHOT_CURRENT = 'CURRENT'
+DEFAULT_SNAPSHOT_PATH = path.join(tempfile.gettempdir(), 'navitron_graph')
+
+NODE_FIELDS = {
+    'x': np.float64,
+    'y': np.float64,
+    'z': np.float64,
+    'security_status': np.float32,
+    'constellation_id': np.int32,
+    'region_id': np.int32,
+}
+
+class UniverseGraph(object):
+    """stargate adjacency in compressed sparse row form
+
+    Args:
+        system_ids (:obj:`numpy.ndarray`): sorted int32 ids; position is the node index
+        indptr (:obj:`numpy.ndarray`): int32 row offsets, length N + 1
+        indices (:obj:`numpy.ndarray`): int32 neighbor node indexes
+        nodes (:obj:`dict`, optional): field -> per-node array, see `NODE_FIELDS`
+        metadata (:obj:`dict`, optional): provenance of the SDE the graph came from
+
+    """
+    def __init__(
+            self,
+            system_ids,
+            indptr,
+            indices,
+            nodes=None,
+            metadata=None
+    ):
+        self.system_ids = system_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.nodes = nodes or {}
+        self.metadata = metadata or {}
+
+    def __len__(self):
+        return len(self.system_ids)
+
+    @property
+    def edge_count(self):
+        """int: directed stargate count"""
+        return len(self.indices)
+
+    @property
+    def positions(self):
+        """:obj:`numpy.ndarray`: [N, 3] x/y/z coordinates"""
+        return np.column_stack([self.nodes['x'], self.nodes['y'], self.nodes['z']])
+
+    def index_of(self, system_ids):
+        """map system ids onto node indexes
+
+        Args:
+            system_ids (int or array-like): EVE system ids
+
+        Returns:
+            int or :obj:`numpy.ndarray`: node indexes
+
+        Raises:
+            KeyError: id not in graph
+
+        """
+        ids = np.asarray(system_ids)
+        index = np.searchsorted(self.system_ids, ids)
+        clipped = np.minimum(index, len(self.system_ids) - 1)
+        if len(self.system_ids) == 0 or not np.all(self.system_ids[clipped] == ids):
+            raise KeyError('system_id not in graph: {}'.format(system_ids))
+        return int(index) if index.ndim == 0 else index.astype(INDEX_DTYPE)
+
+    def neighbors(self, node):
+        """:obj:`numpy.ndarray`: node indexes one jump from `node`"""
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def degree(self):
+        """:obj:`numpy.ndarray`: stargates per node"""
+        return np.diff(self.indptr)
+
+    def topology_hash(self):
+        """str: sha1 of the system ids and stargates, the only inputs to jump counts"""
+        digest = hashlib.sha1()
+        for array in (self.system_ids, self.indptr, self.indices):
+            digest.update(np.ascontiguousarray(array, dtype='<i4').tobytes())
+        return digest.hexdigest()
+
+    def components(self):
+        """label connected components, e.g. each wormhole system is its own
+
+        Returns:
+            :obj:`numpy.ndarray`: int32 component label per node
+
+        """
+        labels = np.full(len(self), -1, dtype=INDEX_DTYPE)
+        label = 0
+        for start in range(len(self)):
+            if labels[start] >= 0:
+                continue
+            labels[start] = label
+            frontier = np.array([start], dtype=INDEX_DTYPE)
+            while len(frontier):
+                reached = np.concatenate([self.neighbors(node) for node in frontier])
+                frontier = np.unique(reached[labels[reached] < 0])
+                labels[frontier] = label
+            label += 1
+        return labels
+
+    @classmethod
+    def from_sde_frame(
+            cls,
+            map_df,
+            logger=cli_core.DEFAULT_LOGGER
+    ):
+        """build from `navitron_sde_universe` output
+
+        Notes:
+            Gates to systems missing from `map_df` are dropped
+
+        Args:
+            map_df (:obj:`pandas.DataFrame`): one row per system, `stargates` as id lists
+            logger (:obj:`logging.logger`, optional): logging handle
+
+        Returns:
+            :obj:`UniverseGraph`
+
+        """
+        map_df = map_df.sort_values('system_id')
+        system_ids = map_df['system_id'].to_numpy(dtype=np.int64)
+        if len(np.unique(system_ids)) != len(system_ids):
+            raise ValueError('duplicate system_id in SDE frame')
+
+        gates = [
+            gate_list if isinstance(gate_list, (list, tuple, np.ndarray)) else ()
+            for gate_list in map_df['stargates']
+        ] if 'stargates' in map_df.columns else [()] * len(system_ids)
+        counts = np.fromiter((len(gate_list) for gate_list in gates), np.int64, len(gates))
+        targets = np.fromiter(chain.from_iterable(gates), np.int64, int(counts.sum()))
+        sources = np.repeat(np.arange(len(system_ids)), counts)
+
+        found = np.searchsorted(system_ids, targets)
+        valid = found < len(system_ids)
+        valid[valid] = system_ids[found[valid]] == targets[valid]
+        if not valid.all():
+            logger.warning('--dropping %d stargates to unknown systems', int((~valid).sum()))
+        sources, found = sources[valid], found[valid]
+
+        order = np.lexsort((found, sources))
+        sources, found = sources[order], found[order]
+        indptr = np.zeros(len(system_ids) + 1, dtype=INDEX_DTYPE)
+        np.cumsum(np.bincount(sources, minlength=len(system_ids)), out=indptr[1:])
+
+        nodes = {
+            field: map_df[field].to_numpy(dtype=dtype)
+            for field, dtype in NODE_FIELDS.items() if field in map_df.columns
+        }
+        logger.info('--built graph: %d systems, %d stargates', len(system_ids), len(found))
+        return cls(system_ids.astype(INDEX_DTYPE), indptr, found.astype(INDEX_DTYPE), nodes)
+
+    @classmethod
+    def from_mongo(
+            cls,
+            conn,
+            collection_name=SDE_UNIVERSE_COLLECTION,
+            logger=cli_core.DEFAULT_LOGGER
+    ):
+        """build from the SDE collection
+
+        Args:
+            conn (:obj:`connections.MongoConnection`): database handle
+            collection_name (str, optional): SDE collection
+            logger (:obj:`logging.logger`, optional): logging handle
+
+        Returns:
+            :obj:`UniverseGraph`
+
+        """
+        projection = {field: True for field in ['system_id', 'stargates'] + list(NODE_FIELDS)}
+        projection['_id'] = False
+        map_df = connections.read_collection(
+            collection_name,
+            conn,
+            projection=projection,
+            logger=logger
+        )
+        return cls.from_sde_frame(map_df, logger=logger)
+
+    def arrays(self):
+        """:obj:`dict`: every array in the graph, by snapshot name"""
+        arrays = {
+            'system_ids': self.system_ids,
+            'indptr': self.indptr,
+            'indices': self.indices,
+        }
+        arrays.update({'node.' + field: array for field, array in self.nodes.items()})
+        return arrays
+
+    def save(self, file_path):
+        """write a snapshot file, see module notes for layout
+
+        Args:
+            file_path (str): path to write; written to `.partial` and renamed
+
+        """
+        arrays = {
+            name: np.ascontiguousarray(array, dtype=np.dtype(array.dtype).newbyteorder('<'))
+            for name, array in self.arrays().items()
+        }
+        header = {'metadata': self.metadata, 'arrays': {}}
+        offset = 0
+        for name, array in arrays.items():
+            header['arrays'][name] = {
+                'dtype': array.dtype.str,
+                'shape': list(array.shape),
+                'offset': offset,
+            }
+            offset += -(-array.nbytes // SNAPSHOT_ALIGN) * SNAPSHOT_ALIGN
+
+        header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+        data_start = SNAPSHOT_PREAMBLE.size + len(header_bytes)
+        data_start = -(-data_start // SNAPSHOT_ALIGN) * SNAPSHOT_ALIGN
+
+        partial_path = file_path + '.partial'
+        with open(partial_path, 'wb') as snapshot_fh:
+            snapshot_fh.write(SNAPSHOT_PREAMBLE.pack(
+                SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header_bytes)))
+            snapshot_fh.write(header_bytes)
+            for name, array in arrays.items():
+                snapshot_fh.seek(data_start + header['arrays'][name]['offset'])
+                snapshot_fh.write(array.tobytes())
+            snapshot_fh.truncate(data_start + offset)
+        os.replace(partial_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        """memory-map a snapshot file
+
+        Notes:
+            arrays are read-only `np.memmap` views: processes loading the same
+            snapshot share one physical copy through the page cache
+
+        Args:
+            file_path (str): snapshot written by `save()`
+
+        Returns:
+            :obj:`UniverseGraph`
+
+        Raises:
+            ValueError: not a snapshot, or an unknown format version
+
+        """
+        with open(file_path, 'rb') as snapshot_fh:
+            preamble = snapshot_fh.read(SNAPSHOT_PREAMBLE.size)
+            if len(preamble) != SNAPSHOT_PREAMBLE.size:
+                raise ValueError('not a graph snapshot: {}'.format(file_path))
+            magic, version, header_length = SNAPSHOT_PREAMBLE.unpack(preamble)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError('not a v{} graph snapshot: {}'.format(SNAPSHOT_VERSION, file_path))
+            header = json.loads(snapshot_fh.read(header_length).decode('utf-8'))
+
+        data_start = SNAPSHOT_PREAMBLE.size + header_length
+        data_start = -(-data_start // SNAPSHOT_ALIGN) * SNAPSHOT_ALIGN
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            shape = tuple(spec['shape'])
+            if not np.prod(shape):
+                arrays[name] = np.zeros(shape, dtype=spec['dtype'])
+                continue
+            arrays[name] = np.memmap(
+                file_path,
+                dtype=spec['dtype'],
+                mode='r',
+                offset=data_start + spec['offset'],
+                shape=shape
+            )
+
+        nodes = {
+            name[len('node.'):]: array
+            for name, array in arrays.items() if name.startswith('node.')
+        }
+        return cls(
+            arrays['system_ids'],
+            arrays['indptr'],
+            arrays['indices'],
+            nodes,
+            header['metadata']
+        )
+
+def snapshot_name(write_recipt):
+    """str: snapshot file name for one SDE version"""
+    return 'universe_graph.{}.bin'.format(write_recipt)
+
+def write_snapshot(
+        graph,
+        snapshot_path=DEFAULT_SNAPSHOT_PATH,
+        keep=3,
+        logger=cli_core.DEFAULT_LOGGER
+):
+    """save a versioned snapshot and point `CURRENT` at it
+
+    Args:
+        graph (:obj:`UniverseGraph`): graph, with `write_recipt` in its metadata
+        snapshot_path (str, optional): snapshot directory
+        keep (int, optional): snapshots to keep, newest first
+        logger (:obj:`logging.logger`, optional): logging handle
+
+    Returns:
+        str: path to snapshot file
+
+    """
+    os.makedirs(snapshot_path, exist_ok=True)
+    file_name = snapshot_name(graph.metadata['write_recipt'])
+    file_path = path.join(snapshot_path, file_name)
+    graph.save(file_path)
+
+    current_path = path.join(snapshot_path, SNAPSHOT_CURRENT)
+    with open(current_path + '.partial', 'w') as current_fh:
+        current_fh.write(file_name)
+    os.replace(current_path + '.partial', current_path)
+    logger.info('--wrote graph snapshot: %s', file_path)
+
+    # older readers keep their mapping alive even after the file is unlinked
+    snapshots = sorted(
+        glob.glob(path.join(snapshot_path, snapshot_name('*'))),
+        key=path.getmtime,
+        reverse=True
+    )
+    for stale in snapshots[keep:]:
+        if path.basename(stale) != file_name:
+            logger.debug('--pruning graph snapshot: %s', stale)
+            os.remove(stale)
+
+    return file_path
+
+def load_snapshot(
+        snapshot_path=DEFAULT_SNAPSHOT_PATH,
+        write_recipt=None
+):
+    """memory-map the current (or a specific) snapshot
+
+    Args:
+        snapshot_path (str, optional): snapshot directory
+        write_recipt (str, optional): SDE version to load, default `CURRENT`
+
+    Returns:
+        :obj:`UniverseGraph`
+
+    Raises:
+        FileNotFoundError: no snapshot written yet
+
+    """
+    if write_recipt:
+        file_name = snapshot_name(write_recipt)
+    else:
+        with open(path.join(snapshot_path, SNAPSHOT_CURRENT), 'r') as current_fh:
+            file_name = current_fh.read().strip()
+
+    return UniverseGraph.load(path.join(snapshot_path, file_name))
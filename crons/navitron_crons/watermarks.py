@@ -0,0 +1,127 @@
+"""watermarks.py: persisted high-water marks for incremental database dumps
+
+Each collection remembers the largest `cron_datetime` (or `_id`) it has
+exported.  The next run only asks mongo for documents past that mark, so a
+nightly export costs O(new data) instead of O(history).
+
+"""
+from datetime import datetime, timedelta
+from os import path
+import json
+import os
+
+from bson import ObjectId
+
+WATERMARK_FIELDS = ('cron_datetime', '_id')
+
+def decode_mark(field, value):
+    """mongo-comparable watermark value"""
+    if field == '_id':
+        return ObjectId(value)
+    return value
+
+def build_query(
+        field,
+        since=None,
+        settle=timedelta(minutes=10),
+        now=None
+):
+    """documents strictly past `since`, and settled long enough to be complete
+
+    Notes:
+        A cron writes its snapshot over a few seconds; stopping `settle`
+        short of now keeps a half-written snapshot out of this run, so it is
+        not skipped by the next one
+
+    Args:
+        field (str): `cron_datetime` or `_id`
+        since (optional): exclusive lower bound, as stored in mongo
+        settle (:obj:`datetime.timedelta`, optional): ignore documents newer than this
+        now (:obj:`datetime.datetime`, optional): current utc time
+
+    Returns:
+        :obj:`dict`: mongo query
+
+    """
+    cutoff = (now or datetime.utcnow()) - settle
+    bounds = {}
+    if since is not None:
+        bounds['$gt'] = since
+    if field == '_id':
+        bounds['$lt'] = ObjectId.from_datetime(cutoff)
+    else:
+        bounds['$lt'] = cutoff.isoformat()
+    return {field: bounds}
+
+class WatermarkStore(object):
+    """json file of `{collection: {field, value, updated}}`
+
+    Args:
+        store_path (str): path to watermark file
+
+    """
+    def __init__(self, store_path):
+        self.store_path = store_path
+        self.marks = {}
+        if path.isfile(store_path):
+            with open(store_path, 'r') as store_fh:
+                self.marks = json.load(store_fh)
+
+    def get(self, collection, field):
+        """find the last exported value for a collection
+
+        Args:
+            collection (str): collection name
+            field (str): watermark field
+
+        Returns:
+            mongo-comparable value, or None if never exported on this field
+
+        """
+        mark = self.marks.get(collection)
+        if not mark or mark['field'] != field:
+            return None
+        return decode_mark(field, mark['value'])
+
+    def set(self, collection, field, value):
+        """record a new high-water mark and save the store
+
+        Args:
+            collection (str): collection name
+            field (str): watermark field
+            value: largest exported value
+
+        """
+        self.marks[collection] = {
+            'field': field,
+            'value': str(value),
+            'updated': datetime.utcnow().isoformat(),
+        }
+        self.save()
+
+    def save(self):
+        """write the store atomically"""
+        partial_path = self.store_path + '.partial'
+        with open(partial_path, 'w') as store_fh:
+            json.dump(self.marks, store_fh, indent=2, sort_keys=True)
+        os.replace(partial_path, self.store_path)
+
+class MarkTracker(object):
+    """pass rows through, remembering the largest `field` value seen
+
+    Args:
+        rows (iterable): mongo cursor
+        field (str): watermark field
+
+    """
+    def __init__(self, rows, field):
+        self.rows = rows
+        self.field = field
+        self.mark = None
+
+    def __iter__(self):
+        for row in self.rows:
+            value = row.get(self.field)
+            if value is not None and (self.mark is None or value > self.mark):
+                self.mark = value
+            yield row
@@ -96,16 +96,20 @@ setup(
             'navitron_sde_universe=navitron_crons.navitron_sde_universe:run_main',
             'navitron_server_status=navitron_crons.navitron_server_status:run_main',
             'navitron_dump_database=navitron_crons.navitron_dump_database:run_main',
+            'navitron_indexes=navitron_crons.navitron_indexes:run_main',
+            'navitron_jump_matrix=navitron_crons.navitron_jump_matrix:run_main',
         ]
     },
     install_requires=[
         'prospercommon',
         'plumbum~=1.6.3',
         'requests>=2.18.4,<3',
-        'requests-futures~=0.9.7',
+        'aiohttp>=3.3.2',
         'esipy~=0.1.8',
-        'pandas~=0.20.3',
-        'pymongo~=3.5.1',
+        'pandas>=1.0',
+        'numpy>=1.17',
+        'pyarrow',
+        'pymongo>=3.7,<5',
         'contexttimer~=0.3.3',
         'retry~=0.9.2'
 
@@ -121,6 +125,15 @@ setup(
             'sphinx',
             'sphinxcontrib-napoleon',
         ],
+        'http2':[
+            'httpx[http2]',
+        ],
+        'fastjson':[
+            'orjson',
+        ],
+        'export':[
+            'zstandard',
+        ],
         'datasci':[
             'plotnine',
             'ipykernel',
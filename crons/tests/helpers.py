@@ -2,11 +2,17 @@
 from os import path, makedirs
 import shutil
 import json
+import http.server
+import threading
+
+import pandas as pd
 
 import prosper.common.prosper_logging as p_logging
 import prosper.common.prosper_config as p_config
 
 import navitron_crons.cli_core as app_config
+import navitron_crons.navitron_sde_universe as navitron_sde_universe
+import navitron_crons.universe_graph as universe_graph
 
 HERE = path.abspath(path.dirname(__file__))
 ROOT = path.abspath(path.join(path.dirname(HERE), 'navitron_crons'))
@@ -83,3 +89,265 @@ def load_samples(
         data = json.load(json_fh)
 
     return data
+
+def build_sample_graph():
+    """stargate graph over the sample SDE"""
+    map_df = navitron_sde_universe.join_map_details(
+        load_samples('universe_systems_detail.json'),
+        load_samples('universe_constellations_detail.json'),
+        load_samples('universe_regions_detail.json'),
+    )
+    map_df = navitron_sde_universe.reshape_system_location(map_df)
+    map_df = navitron_sde_universe.join_stargate_details(
+        map_df,
+        load_samples('universe_stargates_detail.json')
+    )
+    return universe_graph.UniverseGraph.from_sde_frame(map_df, logger=LOGGER)
+
+def build_stats_snapshot(cron_datetime, offset=0):
+    """fake merged jumps/kills frame + metadata for one cron run"""
+    system_info_df = pd.DataFrame({
+        'system_id': [30000142, 30000144, 30000140],
+        'ship_jumps': [100 + offset, 50, 5],
+        'ship_kills': [3, 0, 1],
+        'npc_kills': [0, 12, 40],
+        'pod_kills': [1, 0, 0],
+    })
+    metadata_obj = app_config.generate_metadata('test', '0.0.0')
+    metadata_obj['cron_datetime'] = cron_datetime
+    return system_info_df, metadata_obj
+
+class MockESIHandler(http.server.BaseHTTPRequestHandler):
+    """serves `{"id": <last path chunk>}` for any GET"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """echo the requested id back as JSON"""
+        self.server.request_log.append(self.path)
+        self.server.client_ports.add(self.client_address[1])
+        id_val = self.path.rstrip('/').split('/')[-1]
+        body = json.dumps({'id': int(id_val)}).encode('utf-8')
+
+        etag = self.server.etag
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'max-age={}'.format(self.server.max_age))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """keep test output quiet"""
+        pass
+
+class MockESIServer(object):
+    """local threaded http server for exercising request helpers offline
+
+    Args:
+        handler (:obj:`http.server.BaseHTTPRequestHandler`, optional): request handler
+        etag (str, optional): serve this ETag and honor `If-None-Match`
+        max_age (int, optional): `Cache-Control: max-age` sent with `etag`
+
+    """
+    def __init__(self, handler=MockESIHandler, etag=None, max_age=0):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.request_log = []
+        self.server.client_ports = set()
+        self.server.etag = etag
+        self.server.max_age = max_age
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        """str: address of running server"""
+        return 'http://127.0.0.1:{}/'.format(self.server.server_port)
+
+    @property
+    def request_log(self):
+        """:obj:`list`: paths requested so far"""
+        return self.server.request_log
+
+    @property
+    def client_ports(self):
+        """:obj:`set`: client source ports seen, one per connection"""
+        return self.server.client_ports
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+class FakeCursor(list):
+    """stand-in for `pymongo.cursor.Cursor`"""
+    def batch_size(self, size):
+        return self
+
+    def sort(self, key, direction=1):
+        return FakeCursor(sorted(self, key=lambda doc: doc[key], reverse=direction < 0))
+
+    def limit(self, count):
+        return FakeCursor(self[:count])
+
+class FakeCollection(object):
+    """in-memory stand-in for the slice of `pymongo.collection.Collection` the crons use"""
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.documents = []
+        self.indexes = {}
+
+    def _matches(self, document, query):
+        for key, value in (query or {}).items():
+            if key == '$and':
+                if not all(self._matches(document, clause) for clause in value):
+                    return False
+            elif isinstance(value, dict) and '$in' in value:
+                if document.get(key) not in value['$in']:
+                    return False
+            elif isinstance(value, dict):
+                field = document.get(key)
+                checks = {
+                    '$gt': lambda bound: field > bound,
+                    '$gte': lambda bound: field >= bound,
+                    '$lt': lambda bound: field < bound,
+                }
+                if field is None or not all(
+                        checks[op](bound) for op, bound in value.items()
+                ):
+                    return False
+            elif document.get(key) != value:
+                return False
+        return True
+
+    def insert_one(self, record):
+        self.documents.append(dict(record))
+        return type('InsertOneResult', (), {'inserted_id': len(self.documents) - 1})
+
+    def insert_many(self, records, ordered=True):
+        for field, unique in self.indexes.items():
+            seen = {doc.get(field) for doc in self.documents}
+            if unique and any(record.get(field) in seen for record in records):
+                raise ValueError('duplicate key: {}'.format(field))
+        self.documents.extend(dict(record) for record in records)
+        return type('InsertManyResult', (), {'inserted_ids': list(range(len(records)))})
+
+    def bulk_write(self, requests, ordered=True):
+        """`ReplaceOne(upsert=True)` only"""
+        upserted = modified = 0
+        for request in requests:
+            query, replacement = request._filter, request._doc
+            matches = [doc for doc in self.documents if self._matches(doc, query)]
+            if matches:
+                matches[0].clear()
+                matches[0].update(replacement)
+                modified += 1
+            else:
+                self.documents.append(dict(replacement))
+                upserted += 1
+        return type('BulkWriteResult', (), {
+            'upserted_count': upserted,
+            'modified_count': modified,
+        })
+
+    def find(self, query=None, projection=None, batch_size=None):
+        projection = projection or {}
+        keep = {key for key, val in projection.items() if val}
+        drop = {key for key, val in projection.items() if not val}
+        return FakeCursor(
+            {
+                key: val for key, val in doc.items()
+                if key not in drop and (not keep or key in keep)
+            }
+            for doc in self.documents if self._matches(doc, query)
+        )
+
+    def distinct(self, field, query=None):
+        return list({doc[field] for doc in self.find(query) if field in doc})
+
+    def count_documents(self, query):
+        return len(self.find(query))
+
+    def delete_many(self, query):
+        before = len(self.documents)
+        self.documents = [doc for doc in self.documents if not self._matches(doc, query)]
+        return type('DeleteResult', (), {'deleted_count': before - len(self.documents)})
+
+    def create_index(self, keys, unique=False, **kwargs):
+        field = keys if isinstance(keys, str) else keys[0][0]
+        values = [doc.get(field) for doc in self.documents]
+        if unique and len(values) != len(set(values)):
+            raise ValueError('duplicate key: {}'.format(field))
+        self.indexes[field] = unique
+        return '{}_1'.format(field)
+
+    def create_indexes(self, models):
+        names = []
+        for model in models:
+            spec = model.document
+            self.indexes[spec['name']] = spec.get('unique', False)
+            names.append(spec['name'])
+        return names
+
+    def aggregate(self, pipeline):
+        if '$indexStats' in pipeline[0]:
+            return iter([
+                {'name': name, 'accesses': {'ops': 0, 'since': None}}
+                for name in self.indexes
+            ])
+        if '$collStats' in pipeline[0]:
+            return iter([{'storageStats': {
+                'indexSizes': {name: 4096 for name in self.indexes}
+            }}])
+        out = pipeline[-1].get('$out')
+        if out:
+            target = self.database[out]
+            target.documents = [dict(doc) for doc in self.documents]
+        return iter([])
+
+    def rename(self, new_name, dropTarget=False):
+        if new_name in self.database.collections and not dropTarget:
+            raise ValueError('target exists: {}'.format(new_name))
+        self.database.collections.pop(self.name)
+        self.name = new_name
+        self.database.collections[new_name] = self
+
+class FakeDatabase(object):
+    """in-memory stand-in for `pymongo.database.Database`"""
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self, name)
+        return self.collections[name]
+
+    def list_collection_names(self):
+        return [name for name, coll in self.collections.items() if coll.documents]
+
+    def drop_collection(self, name):
+        self.collections.pop(name, None)
+
+class FakeMongoConnection(object):
+    """stand-in for `connections.MongoConnection` backed by :obj:`FakeDatabase`"""
+    database = 'test'
+
+    def __init__(self):
+        self.db = FakeDatabase()
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, *args):
+        pass
@@ -0,0 +1,251 @@
+"""test_CLI_dump_database.py: tests expected behavior for database export"""
+from datetime import datetime, timedelta
+import os
+
+import pytest
+import pandas as pd
+from bson import ObjectId
+
+import navitron_crons.navitron_dump_database as navitron_dump_database
+
+import helpers
+
+def build_rows(count):
+    """fake system_stats documents, as a mongo cursor would return them"""
+    return [
+        {'_id': index, 'system_id': 30000000 + index, 'ship_jumps': index % 7,
+         'cron_datetime': '2018-01-01T00:00:00'}
+        for index in range(count)
+    ]
+
+def test_stream_to_csv(tmpdir):
+    """validate stream_to_csv() writes one continuous csv, without `_id`"""
+    rows = build_rows(2500)
+    outfile = str(tmpdir.join('stream.csv'))
+
+    written = navitron_dump_database.stream_to_csv(
+        iter(rows),
+        outfile,
+        batch_size=1000,
+        logger=helpers.LOGGER
+    )
+
+    assert written == 2500
+    assert os.listdir(str(tmpdir)) == ['stream.csv']
+
+    expected = pd.DataFrame(rows).drop(columns='_id').to_csv()
+    with open(outfile) as stream_fh:
+        assert stream_fh.read() == expected
+
+def test_stream_to_csv_schema_drift(tmpdir):
+    """validate later batches are fit to the first batch's header"""
+    rows = build_rows(4)
+    rows[1].pop('ship_jumps')
+    rows[3]['surprise'] = True
+    outfile = str(tmpdir.join('drift.csv'))
+
+    navitron_dump_database.stream_to_csv(
+        iter(rows),
+        outfile,
+        batch_size=2,
+        logger=helpers.LOGGER
+    )
+
+    data = pd.read_csv(outfile, index_col=0)
+    assert list(data.columns) == ['system_id', 'ship_jumps', 'cron_datetime']
+    assert list(data.index) == [0, 1, 2, 3]
+    assert data['ship_jumps'].isnull().tolist() == [False, True, False, False]
+
+def read_output(file_path, output_format):
+    """load any export format back into pandas"""
+    if output_format == 'parquet':
+        return pd.read_parquet(file_path)
+    if output_format == 'ndjson.zst':
+        return pd.read_json(file_path, lines=True, compression='zstd')
+    return pd.read_csv(file_path, index_col=0)
+
+@pytest.mark.parametrize('output_format', ['csv', 'csv.gz', 'csv.zst', 'ndjson.zst', 'parquet'])
+def test_stream_export_formats(tmpdir, output_format):
+    """validate every export format round-trips the rows"""
+    if output_format.endswith('.zst'):
+        pytest.importorskip('zstandard')
+    if output_format == 'parquet':
+        pytest.importorskip('pyarrow')
+    rows = build_rows(2500)
+    outfile = str(tmpdir.join('export.' + output_format))
+
+    written = navitron_dump_database.stream_export(
+        iter(rows),
+        outfile,
+        output_format=output_format,
+        batch_size=1000,
+        logger=helpers.LOGGER
+    )
+
+    assert written == 2500
+    assert os.listdir(str(tmpdir)) == ['export.' + output_format]
+    data = read_output(outfile, output_format)
+    assert len(data) == 2500
+    assert data['system_id'].tolist() == [row['system_id'] for row in rows]
+    assert '_id' not in data.columns
+
+def test_stream_export_parquet_dtypes(tmpdir):
+    """validate parquet output carries compact, nullable dtypes and one row group per batch"""
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    rows = build_rows(30)
+    rows[25].pop('ship_jumps')
+    outfile = str(tmpdir.join('export.parquet'))
+
+    navitron_dump_database.stream_export(
+        iter(rows),
+        outfile,
+        output_format='parquet',
+        batch_size=10,
+        logger=helpers.LOGGER
+    )
+
+    parquet_file = pyarrow_parquet.ParquetFile(outfile)
+    assert parquet_file.metadata.num_row_groups == 3
+    schema = parquet_file.schema_arrow
+    assert str(schema.field('system_id').type) == 'int32'
+    assert str(schema.field('cron_datetime').type).startswith('timestamp')
+    assert parquet_file.read().column('ship_jumps').null_count == 1
+
+def test_stream_export_parquet_schema_drift(tmpdir):
+    """validate later parquet batches are cast to the first batch's schema"""
+    pytest.importorskip('pyarrow')
+    rows = build_rows(6)
+    for row in rows[:2]:
+        row['server_version'] = None  # known column, all null in first batch
+        row['note'] = None  # unknown column, all null in first batch
+    rows[2]['note'] = 'busy'
+    rows[4]['note'] = 7
+    rows[4]['surprise'] = True
+    rows[5].pop('ship_jumps')
+    rows[5]['server_version'] = '1.0'
+    outfile = str(tmpdir.join('drift.parquet'))
+
+    written = navitron_dump_database.stream_export(
+        iter(rows),
+        outfile,
+        output_format='parquet',
+        batch_size=2,
+        logger=helpers.LOGGER
+    )
+
+    assert written == 6
+    data = pd.read_parquet(outfile)
+    assert list(data.columns) == [
+        'system_id', 'ship_jumps', 'cron_datetime', 'server_version', 'note'
+    ]
+    assert data['note'].tolist()[2] == 'busy'
+    assert data['note'].tolist()[4] == '7'
+    assert data['ship_jumps'].isnull().tolist() == [False] * 5 + [True]
+    assert data['server_version'].tolist()[-1] == '1.0'
+
+@pytest.mark.parametrize('output_format', ['csv', 'parquet'])
+def test_stream_export_partitioned(tmpdir, output_format):
+    """validate --partition-by-date writes one file per cron day"""
+    if output_format == 'parquet':
+        pytest.importorskip('pyarrow')
+    rows = build_rows(6)
+    for row in rows[3:]:
+        row['cron_datetime'] = '2018-01-02T00:00:00'
+    outdir = str(tmpdir.join('export'))
+
+    navitron_dump_database.stream_export(
+        iter(rows),
+        outdir,
+        output_format=output_format,
+        batch_size=4,
+        partition=True,
+        logger=helpers.LOGGER
+    )
+
+    assert sorted(os.listdir(outdir)) == ['cron_date=2018-01-01', 'cron_date=2018-01-02']
+    for day in ('2018-01-01', '2018-01-02'):
+        part = os.path.join(outdir, 'cron_date=' + day, 'part-0.' + output_format)
+        assert len(read_output(part, output_format)) == 3
+
+def fill_stats(collection):
+    """10 hourly snapshots of 3 systems"""
+    start = datetime(2018, 1, 1)
+    collection.insert_many([
+        {
+            '_id': ObjectId.from_datetime(start + timedelta(hours=hour, seconds=system)),
+            'system_id': system,
+            'cron_datetime': (start + timedelta(hours=hour)).isoformat(),
+        }
+        for hour in range(10) for system in range(3)
+    ])
+
+@pytest.mark.parametrize('field', ['cron_datetime', '_id'])
+def test_plan_ranges(field):
+    """validate plan_ranges() covers every document exactly once"""
+    conn = helpers.FakeMongoConnection()
+    collection = conn.db['navitron_system_stats']
+    fill_stats(collection)
+    base_query = {'system_id': {'$lt': 2}}
+
+    ranges = navitron_dump_database.plan_ranges(collection, field, 4, base_query)
+
+    assert len(ranges) == 4
+    seen = [doc['_id'] for query in ranges for doc in collection.find(query)]
+    assert len(seen) == len(set(seen)) == 20
+    if field == 'cron_datetime':
+        # whole snapshots per range
+        sizes = [len(collection.find(query)) for query in ranges]
+        assert all(size % 2 == 0 for size in sizes)
+
+    empty = conn.db['empty']
+    assert navitron_dump_database.plan_ranges(empty, field, 4, base_query) == [base_query]
+
+@pytest.mark.parametrize('partition', [False, True])
+def test_parallel_export(tmpdir, monkeypatch, partition):
+    """validate parallel_export() writes one part per range and merges the watermark"""
+    conn = helpers.FakeMongoConnection()
+    collection = conn.db['navitron_system_stats']
+    fill_stats(collection)
+
+    class FakeClient:
+        def __init__(self, **kwargs):
+            pass
+
+        def __getitem__(self, database):
+            return conn.db
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(navitron_dump_database.pymongo, 'MongoClient', FakeClient)
+    outdir = str(tmpdir.join('export'))
+    ranges = navitron_dump_database.plan_ranges(collection, 'cron_datetime', 3)
+
+    rows, mark = navitron_dump_database.parallel_export(
+        {},
+        'test',
+        'navitron_system_stats',
+        ranges,
+        outdir,
+        projection={'_id': False},
+        partition=partition,
+        part_name='part-run',
+        jobs=3,
+        logger=helpers.LOGGER
+    )
+
+    assert rows == 30
+    assert mark == '2018-01-01T09:00:00'
+    if partition:
+        part_dir = os.path.join(outdir, 'cron_date=2018-01-01')
+        assert sorted(os.listdir(part_dir)) == \
+            ['part-run-00.csv', 'part-run-01.csv', 'part-run-02.csv']
+    else:
+        part_dir = outdir
+        assert sorted(os.listdir(part_dir)) == ['part-00.csv', 'part-01.csv', 'part-02.csv']
+    data = pd.concat(
+        pd.read_csv(os.path.join(part_dir, name), index_col=0)
+        for name in os.listdir(part_dir)
+    )
+    assert len(data) == 30
+    assert '_id' not in data.columns
@@ -10,6 +10,11 @@ import jsonschema
 import navitron_crons.exceptions as exceptions
 import navitron_crons._version as _version
 import navitron_crons.navitron_sde_universe as navitron_sde_universe
+import navitron_crons.crawl_journal as crawl_journal
+import navitron_crons.cli_core as cli_core
+import navitron_crons.connections as connections
+import navitron_crons.bulk_fetch as bulk_fetch
+import prosper.common.prosper_config as p_config
 
 import helpers
 
@@ -128,6 +133,20 @@ def test_join_stargate_details():
         pytest.xfail(
             'Unexpected values from reshape_system_location(): {}'.format(unique_values))
 
+def test_join_stargate_order():
+    """validate gate crawl order does not change row hashes"""
+    systems_df = pd.DataFrame(SAMPLE_SYSTEMS).drop(['stargates'], axis=1)
+    forward_df = navitron_sde_universe.join_stargate_details(systems_df, SAMPLE_STARGATES)
+    shuffled_df = navitron_sde_universe.join_stargate_details(
+        systems_df, list(reversed(SAMPLE_STARGATES)))
+
+    multi_gate = forward_df['stargates'].map(
+        lambda gates: isinstance(gates, list) and len(gates) > 1)
+    assert multi_gate.any()
+    assert cli_core.hash_sde_rows(forward_df, 'system_id') == \
+        cli_core.hash_sde_rows(shuffled_df, 'system_id')
+    assert cli_core.update_which_sde_data(shuffled_df, forward_df, 'system_id') == []
+
 def test_schema_check():
     """validate outgoing schema: end-to-end test for data pivots"""
     map_df = navitron_sde_universe.join_map_details(
@@ -168,3 +187,105 @@ class TestCLI:
             app_name=navitron_sde_universe.__app_name__,
             version=navitron_sde_universe.__app_version__
         )
+
+def test_crawl_details_resume():
+    """validate journaled ids are not refetched, and new ones are journaled"""
+    journal = crawl_journal.CrawlJournal(
+        path.join(helpers.DUMP_FOLDER, 'journal_resume'),
+        logger=helpers.LOGGER
+    )
+    for id_val in range(5):
+        journal.record('stargates', id_val, {'id': id_val})
+
+    with helpers.MockESIServer() as server:
+        fetcher = connections.build_bulk_fetcher(
+            server.base_url + 'universe/stargates/',
+            config=helpers.ROOT_CONFIG,
+            logger=helpers.LOGGER
+        )
+        data = bulk_fetch.run_sync(navitron_sde_universe.crawl_details(
+            fetcher,
+            list(range(10)),
+            navitron_sde_universe.UniverseEndpoint.stargates,
+            journal=journal
+        ))
+        assert len(server.request_log) == 5
+
+    journal.close()
+    assert sorted(row['id'] for row in data) == list(range(10))
+    assert sorted(journal.load('stargates').keys()) == list(range(10))
+
+class UniverseHandler(helpers.MockESIHandler):
+    """tiny 3-system universe: list endpoints return ids, detail endpoints documents"""
+    def do_GET(self):
+        self.server.request_log.append(self.path)
+        chunks = self.path.strip('/').split('/')
+        if chunks[-1].isdigit():
+            endpoint, id_val = chunks[-2], int(chunks[-1])
+            body = {
+                'systems': {'system_id': id_val, 'stargates': [id_val * 10, id_val * 10 + 1]},
+                'stargates': {'stargate_id': id_val, 'system_id': id_val // 10},
+                'constellations': {'constellation_id': id_val},
+                'regions': {'region_id': id_val},
+            }[endpoint]
+        else:
+            body = {'systems': [1, 2, 3], 'constellations': [7], 'regions': [9]}[chunks[-1]]
+
+        body = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def test_crawl_universe_pipeline():
+    """validate every endpoint is crawled and stargates are discovered from systems"""
+    with helpers.MockESIServer(handler=UniverseHandler) as server:
+        config_path = path.join(helpers.DUMP_FOLDER, 'universe_pipeline.cfg')
+        with open(config_path, 'w') as cfg_fh:
+            cfg_fh.write(
+                '[ENDPOINTS]\n'
+                '    source = {}\n'
+                '    systems = universe/systems/\n'
+                '    constellations = universe/constellations/\n'
+                '    regions = universe/regions/\n'
+                '    stargates = universe/stargates/\n'.format(server.base_url)
+            )
+        config = p_config.ProsperConfig(config_path)
+
+        universe = bulk_fetch.run_sync(navitron_sde_universe.crawl_universe(
+            config,
+            logger=helpers.LOGGER
+        ))
+
+    endpoints = navitron_sde_universe.UniverseEndpoint
+    assert sorted(row['system_id'] for row in universe[endpoints.systems]) == [1, 2, 3]
+    assert sorted(row['stargate_id'] for row in universe[endpoints.stargates]) == \
+        [10, 11, 20, 21, 30, 31]
+    assert len(universe[endpoints.constellations]) == 1
+    assert len(universe[endpoints.regions]) == 1
+    assert all(not result.failures for result in universe.values())
+
+def test_update_sde_collection():
+    """validate update_sde_collection() only touches changed/vanished systems"""
+    conn = helpers.FakeMongoConnection()
+    collection = conn.db[navitron_sde_universe.SDE_UNIVERSE_COLLECTION]
+    collection.insert_many([
+        {'system_id': 1, 'name': 'Jita', 'write_recipt': 'old'},
+        {'system_id': 2, 'name': 'Perimeter', 'write_recipt': 'old'},
+        {'system_id': 3, 'name': 'Gone', 'write_recipt': 'old'},
+    ])
+    map_df = pd.DataFrame({'system_id': [1, 2, 4], 'name': ['Jita', 'Renamed', 'New']})
+    map_df['write_recipt'] = 'new'
+
+    changed, vanished = navitron_sde_universe.update_sde_collection(
+        map_df,
+        navitron_sde_universe.SDE_UNIVERSE_COLLECTION,
+        conn,
+        logger=helpers.LOGGER
+    )
+
+    assert sorted(changed) == [2, 4]
+    assert vanished == [3]
+    assert {doc['system_id']: doc['write_recipt'] for doc in collection.documents} == \
+        {1: 'old', 2: 'new', 4: 'new'}
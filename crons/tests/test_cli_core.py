@@ -44,6 +44,47 @@ def test_generate_metadata():
         pytest.xfail(
             'Unexpected values from append_metadata(): {}'.format(unique_values))
 
+def test_update_which_sde_data():
+    """validate update_which_sde_data() diffs on content, not provenance"""
+    current_df = pd.DataFrame([
+        {'system_id': 1, 'name': 'Jita', 'security_status': 0.9, 'stargates': [2, 3],
+         'write_recipt': 'old', 'cron_datetime': '2017-01-01T00:00:00'},
+        {'system_id': 2, 'name': 'Perimeter', 'security_status': 0.9, 'stargates': [1],
+         'write_recipt': 'old', 'cron_datetime': '2017-01-01T00:00:00'},
+        {'system_id': 3, 'name': 'Niyabainen', 'security_status': 0.9, 'stargates': [1],
+         'write_recipt': 'old', 'cron_datetime': '2017-01-01T00:00:00'},
+        {'system_id': 4, 'name': 'Gone', 'security_status': -1.0, 'stargates': None,
+         'write_recipt': 'old', 'cron_datetime': '2017-01-01T00:00:00'},
+    ])
+    latest_df = pd.DataFrame([
+        {'system_id': 1, 'name': 'Jita', 'security_status': 0.9, 'stargates': [2, 3]},
+        {'system_id': 2, 'name': 'Perimeter', 'security_status': 0.9, 'stargates': [1, 5]},
+        {'system_id': 3, 'name': 'Niyabainen', 'security_status': 0.9, 'stargates': [1]},
+        {'system_id': 5, 'name': 'New', 'security_status': 0.5, 'stargates': [2]},
+    ])
+    latest_df['write_recipt'] = 'new'
+    latest_df['cron_datetime'] = '2018-01-01T00:00:00'
+
+    changed = cli_core.update_which_sde_data(current_df, latest_df, 'system_id')
+    assert sorted(changed) == [2, 5]
+    assert cli_core.vanished_sde_keys(current_df, latest_df, 'system_id') == [4]
+
+    # fresh collection: everything is new, nothing vanished
+    assert sorted(cli_core.update_which_sde_data(
+        pd.DataFrame(), latest_df, 'system_id'
+    )) == [1, 2, 3, 5]
+    assert cli_core.vanished_sde_keys(pd.DataFrame(), latest_df, 'system_id') == []
+
+def test_hash_sde_rows_nan():
+    """validate NaN (pandas) and None (mongo) hash the same"""
+    pandas_df = pd.DataFrame({'system_id': [1, 2], 'stargates': [[2], float('nan')]})
+    mongo_df = pd.DataFrame([
+        {'system_id': 1, 'stargates': [2]},
+        {'system_id': 2, 'stargates': None},
+    ])
+    assert cli_core.hash_sde_rows(pandas_df, 'system_id') == \
+        cli_core.hash_sde_rows(mongo_df, 'system_id')
+
 python = local['python']
 APP_PATH = path.join(helpers.ROOT, 'cli_core.py')
 CONFIG_PATH = path.join(helpers.ROOT, 'navitron_crons.cfg')
@@ -0,0 +1,69 @@
+"""test_concurrency.py: validate bulk-fetch concurrency policies"""
+import pytest
+
+import navitron_crons.concurrency as concurrency
+import navitron_crons.connections as connections
+
+import helpers
+
+HEALTHY = {concurrency.ERROR_LIMIT_REMAIN: '100', concurrency.ERROR_LIMIT_RESET: '30'}
+
+def test_aimd_additive_increase():
+    """validate healthy responses grow the limit ~1 per window"""
+    policy = concurrency.AIMDConcurrency(initial=10, maximum=100)
+    for _ in range(12):
+        policy.record(0.1, 200, HEALTHY)
+
+    assert policy.limit == 11
+    assert policy.pause_for() == 0
+
+def test_aimd_multiplicative_decrease():
+    """validate slow/5xx responses halve the limit once per window"""
+    policy = concurrency.AIMDConcurrency(initial=40, minimum=4)
+    policy.record(5.0, 200, HEALTHY)
+    assert policy.limit == 20
+
+    for _ in range(22):
+        policy.record(0.1, 200, HEALTHY)
+    assert policy.limit == 21
+
+    policy.record(0.1, 502, HEALTHY)
+    assert policy.limit == 10
+
+    policy.record(0.1, 502, HEALTHY)
+    assert policy.limit == 10  # still inside the same window
+
+def test_aimd_error_limit():
+    """validate exhausted ESI error budget pauses requests"""
+    policy = concurrency.AIMDConcurrency(initial=1, minimum=1)
+    policy.record(0.1, 420, {
+        concurrency.ERROR_LIMIT_REMAIN: '0',
+        concurrency.ERROR_LIMIT_RESET: '30'
+    })
+
+    assert policy.limit == 1
+    assert policy.pause_for() == pytest.approx(30, abs=1)
+
+def test_aimd_bad_headers():
+    """validate unparseable error-limit headers count as missing"""
+    policy = concurrency.AIMDConcurrency(initial=10, maximum=100)
+    for _ in range(12):
+        policy.record(0.1, 200, {concurrency.ERROR_LIMIT_REMAIN: 'n/a'})
+    assert policy.limit == 11
+
+    policy.record(0.1, 420, {concurrency.ERROR_LIMIT_RESET: ''})
+    assert policy.pause_for() == pytest.approx(60, abs=1)
+
+def test_fetch_bulk_data_async_aimd():
+    """validate bulk fetcher runs under an adaptive policy"""
+    policy = concurrency.AIMDConcurrency(initial=2, maximum=16)
+    with helpers.MockESIServer() as server:
+        data = connections.fetch_bulk_data_async(
+            server.base_url + 'universe/stargates/',
+            range(200),
+            policy=policy,
+            logger=helpers.LOGGER
+        )
+
+    assert len(data) == 200
+    assert policy.limit > 2
@@ -4,10 +4,14 @@ from os import path
 import pytest
 from plumbum import local
 import pandas as pd
+import prosper.common.prosper_config as p_config
 
 import navitron_crons.exceptions as exceptions
 import navitron_crons._version as _version
 import navitron_crons.connections as connections
+import navitron_crons.http_cache as http_cache
+import navitron_crons.indexes as indexes
+import navitron_crons.rate_limit as rate_limit
 
 import helpers
 
@@ -39,3 +43,261 @@ class TestMongoConnection:
             print('expected_data={}'.format(self.expected_data))
             print('recieved_data={}'.format(data))
             pytest.xfail('Database not initialized?')
+
+def test_fetch_bulk_data_async():
+    """validate fetch_bulk_data_async() happypath against a local server"""
+    id_list = list(range(1, 101))
+    with helpers.MockESIServer() as server:
+        data = connections.fetch_bulk_data_async(
+            server.base_url + 'universe/systems/',
+            id_list,
+            workers=8,
+            logger=helpers.LOGGER
+        )
+
+        assert len(server.request_log) == len(id_list)
+
+    assert sorted(row['id'] for row in data) == id_list
+
+def test_iter_bulk_data_async_generator():
+    """validate iter_bulk_data_async() consumes lazy id sources"""
+    with helpers.MockESIServer() as server:
+        results = dict(connections.iter_bulk_data_async(
+            server.base_url + 'universe/stargates/',
+            (id_val for id_val in range(50)),
+            workers=4,
+            logger=helpers.LOGGER
+        ))
+
+    assert set(results.keys()) == set(range(50))
+    assert all(results[key]['id'] == key for key in results)
+
+class FlakyESIHandler(helpers.MockESIHandler):
+    """502s the first request for every id, 404s id 404"""
+    seen = set()
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/404'):
+            self.server.request_log.append(self.path)
+            self.send_error(404)
+            return
+        if self.path not in self.seen:
+            self.seen.add(self.path)
+            self.server.request_log.append(self.path)
+            self.send_error(502)
+            return
+        super().do_GET()
+
+def test_fetch_bulk_data_async_retry():
+    """validate transient failures are requeued and bad ids are reported"""
+    with helpers.MockESIServer(handler=FlakyESIHandler) as server:
+        data = connections.fetch_bulk_data_async(
+            server.base_url + 'universe/stargates/',
+            list(range(20)) + [404],
+            workers=4,
+            retry=2,
+            logger=helpers.LOGGER
+        )
+
+    assert sorted(row['id'] for row in data) == list(range(20))
+    assert len(data.failures) == 1
+
+    failure = data.failures[0]
+    assert failure.id == 404
+    assert failure.status == 404
+    assert failure.attempts == 1
+
+def test_get_esi_address_keepalive():
+    """validate single-shot calls reuse one pooled connection"""
+    connections.close_session()
+    with helpers.MockESIServer() as server:
+        for special_id in range(1, 6):
+            data, address = connections.get_esi_address(
+                server.base_url,
+                'universe/systems/',
+                special_id=special_id,
+                logger=helpers.LOGGER
+            )
+            assert data == {'id': special_id}
+            assert address.endswith('/universe/systems/{}/'.format(special_id))
+
+        assert len(server.request_log) == 5
+        assert len(server.client_ports) == 1
+    connections.close_session()
+
+def test_build_bulk_fetcher_config(monkeypatch):
+    """validate fetchers are built from the app's config, not the packaged one"""
+    config_path = path.join(helpers.DUMP_FOLDER, 'bulk_fetcher.cfg')
+    with open(config_path, 'w') as cfg_fh:
+        cfg_fh.write(
+            '[ESI]\n'
+            '    read_timeout = 7\n'
+            '    requests_per_second = 3\n'
+            '    rate_limit_path = {}\n'
+            '[CACHE]\n'
+            '    enabled = False\n'.format(path.join(helpers.DUMP_FOLDER, 'bulk_fetcher.bucket'))
+        )
+    monkeypatch.setattr(http_cache, 'RESPONSE_CACHE', None)
+
+    fetcher = connections.build_bulk_fetcher(
+        'http://localhost/',
+        config=p_config.ProsperConfig(config_path),
+        logger=helpers.LOGGER
+    )
+
+    assert fetcher.timeout == 7.0
+    assert fetcher.rate_limiter.rate == 3.0
+    assert fetcher.cache is None
+
+def test_get_mongo_client_shared():
+    """validate clients are shared per address + pool settings, and closable"""
+    connections.close_mongo_clients()
+    address = 'mongodb://127.0.0.1:1/test'
+    client = connections.get_mongo_client(address, maxPoolSize=5, connect=False)
+
+    assert connections.get_mongo_client(address, maxPoolSize=5, connect=False) is client
+    assert connections.get_mongo_client(address, maxPoolSize=6, connect=False) is not client
+
+    connections.close_mongo_clients()
+    assert connections.MONGO_CLIENTS == {}
+    assert connections.get_mongo_client(address, maxPoolSize=5, connect=False) is not client
+    connections.close_mongo_clients()
+
+class RecordingConnection:
+    """stand-in for MongoConnection: records insert_many()/bulk_write() calls"""
+    database = 'test'
+
+    class Collection:
+        def __init__(self):
+            self.calls = []
+
+        def insert_many(self, records, ordered=True):
+            self.calls.append((len(records), ordered))
+            return type('InsertManyResult', (), {'inserted_ids': list(range(len(records)))})
+
+        def bulk_write(self, requests, ordered=True):
+            self.calls.append((len(requests), ordered))
+            return type('BulkWriteResult', (), {
+                'upserted_count': len(requests) - 1,
+                'modified_count': 1,
+            })
+
+    def __init__(self):
+        self.collection = self.Collection()
+
+    def __enter__(self):
+        return {'test_dummy': self.collection}
+
+    def __exit__(self, *args):
+        pass
+
+@pytest.mark.parametrize('writers', [1, 3])
+def test_dump_to_db_chunked(writers):
+    """validate dump_to_db() sends unordered chunks and counts acknowledgements"""
+    data_df = pd.DataFrame({'system_id': range(2500), 'ship_jumps': range(2500)})
+    conn = RecordingConnection()
+
+    inserted = connections.dump_to_db(
+        data_df,
+        'test_dummy',
+        conn,
+        chunk_size=1000,
+        writers=writers,
+        logger=helpers.LOGGER
+    )
+
+    assert inserted == 2500
+    assert sorted(conn.collection.calls) == [(500, False), (1000, False), (1000, False)]
+
+def test_upsert_to_db():
+    """validate upsert_to_db() replaces by key in unordered chunks"""
+    data_df = pd.DataFrame({'system_id': range(1500), 'name': 'test'})
+    conn = RecordingConnection()
+
+    written = connections.upsert_to_db(
+        data_df,
+        'test_dummy',
+        conn,
+        'system_id',
+        chunk_size=1000,
+        logger=helpers.LOGGER
+    )
+
+    assert written == 1500
+    assert conn.collection.calls == [(1000, False), (500, False)]
+
+def test_write_provenance():
+    """validate write_provenance() uses the pymongo 4 single-insert API"""
+    conn = helpers.FakeMongoConnection()
+    assert not hasattr(conn.db[connections.PROVENANCE_COLLECTION], 'insert')
+
+    connections.write_provenance(
+        {'write_recipt': 'abc123', 'source': 'test'},
+        conn,
+        logger=helpers.LOGGER
+    )
+    assert conn.db[connections.PROVENANCE_COLLECTION].documents == [
+        {'write_recipt': 'abc123', 'source': 'test'}
+    ]
+
+    with pytest.warns(RuntimeWarning):
+        connections.write_provenance({'write_recipt': 'def456'}, conn, debug=True)
+    assert len(conn.db[connections.PROVENANCE_COLLECTION].documents) == 1
+
+def test_stage_and_swap_collection():
+    """validate stage_collection()/swap_collection() replace live data in one step"""
+    conn = helpers.FakeMongoConnection()
+    conn.db['test_dummy'].insert_many([{'system_id': 1, 'name': 'old'}])
+
+    staging_name = connections.stage_collection(
+        pd.DataFrame({'system_id': [1, 2], 'name': 'new'}),
+        'test_dummy',
+        conn,
+        index_key='system_id',
+        logger=helpers.LOGGER
+    )
+    assert staging_name == 'test_dummy' + connections.STAGING_SUFFIX
+    assert len(conn.db['test_dummy'].documents) == 1  # live untouched until swap
+
+    connections.swap_collection('test_dummy', conn, logger=helpers.LOGGER)
+    assert staging_name not in conn.db.list_collection_names()
+    assert [doc['name'] for doc in conn.db['test_dummy'].documents] == ['new', 'new']
+    assert conn.db['test_dummy'].indexes == {'system_id': True}
+
+    previous = conn.db['test_dummy' + connections.PREVIOUS_SUFFIX].documents
+    assert previous == [{'system_id': 1, 'name': 'old'}]
+
+    connections.rollback_collection('test_dummy', conn, logger=helpers.LOGGER)
+    assert conn.db['test_dummy'].documents == [{'system_id': 1, 'name': 'old'}]
+    with pytest.raises(exceptions.NoPreviousCollection):
+        connections.rollback_collection('test_dummy', conn, logger=helpers.LOGGER)
+
+def test_rollback_collection_indexes():
+    """validate registered indexes survive a swap followed by a rollback"""
+    collection_name = 'navitron_sde_universe'
+    conn = helpers.FakeMongoConnection()
+    conn.db[collection_name].insert_many([{'system_id': 1, 'name': 'old'}])
+    indexes.ensure_indexes(conn, [collection_name], logger=helpers.LOGGER)
+    expected = dict(conn.db[collection_name].indexes)
+
+    connections.stage_collection(
+        pd.DataFrame({'system_id': [1, 2], 'name': 'new'}),
+        collection_name,
+        conn,
+        logger=helpers.LOGGER
+    )
+    connections.swap_collection(collection_name, conn, logger=helpers.LOGGER)
+    assert not conn.db[collection_name + connections.PREVIOUS_SUFFIX].indexes
+
+    connections.rollback_collection(collection_name, conn, logger=helpers.LOGGER)
+    assert conn.db[collection_name].documents == [{'system_id': 1, 'name': 'old'}]
+    assert conn.db[collection_name].indexes == expected
+
+def test_swap_collection_nothing_staged():
+    """validate swap_collection() refuses to swap in a missing staging collection"""
+    conn = helpers.FakeMongoConnection()
+    conn.db['test_dummy'].insert_many([{'system_id': 1}])
+
+    with pytest.raises(exceptions.StagingValidationFailed):
+        connections.swap_collection('test_dummy', conn, logger=helpers.LOGGER)
+    assert conn.db['test_dummy'].documents == [{'system_id': 1}]
@@ -0,0 +1,32 @@
+"""test_crawl_journal.py: validate crawl checkpoint journal"""
+from os import path
+
+import navitron_crons.crawl_journal as crawl_journal
+
+import helpers
+
+def test_journal_roundtrip():
+    """validate record/load/clear, and torn lines are skipped"""
+    journal = crawl_journal.CrawlJournal(
+        path.join(helpers.DUMP_FOLDER, 'journal_roundtrip'),
+        logger=helpers.LOGGER
+    )
+    journal.record('systems', 30000001, {'system_id': 30000001})
+    journal.record('systems', 30000002, {'system_id': 30000002})
+    journal.close()
+
+    with open(path.join(journal.journal_path, 'systems.ndjson'), 'a') as journal_fh:
+        journal_fh.write('[30000003, {"system_id"')  # crash mid-write
+
+    documents = journal.load('systems')
+    assert sorted(documents.keys()) == [30000001, 30000002]
+    assert documents[30000002] == {'system_id': 30000002}
+
+    bystander = path.join(journal.journal_path, 'operator_notes.txt')
+    with open(bystander, 'w') as notes_fh:
+        notes_fh.write('not part of the journal')
+
+    journal.clear()
+    assert journal.load('systems') == {}
+    assert not path.isfile(path.join(journal.journal_path, 'systems.ndjson'))
+    assert path.isfile(bystander)
@@ -0,0 +1,63 @@
+"""test_history_loader.py: validate dense system_stats history loading"""
+from datetime import datetime
+
+import pytest
+import numpy as np
+
+import navitron_crons.history_loader as history_loader
+import navitron_crons.stats_buckets as stats_buckets
+
+import helpers
+
+def fill_collection(conn, layout, hours=3):
+    """write `hours` snapshots in the given layout; system 30000140 skips hour 1"""
+    collection = conn.db[stats_buckets.LAYOUT_COLLECTIONS[layout]]
+    for hour in range(hours):
+        df, meta = helpers.build_stats_snapshot('2018-01-01T0{}:00:00'.format(hour), offset=hour)
+        if hour == 1:
+            df = df[df['system_id'] != 30000140]
+        if layout == 'bucket':
+            collection.insert_many([stats_buckets.to_bucket(df, meta)])
+        else:
+            collection.insert_many(df.assign(
+                cron_datetime=meta['cron_datetime'],
+                write_recipt=meta['write_recipt']
+            ).to_dict(orient='records'))
+
+@pytest.mark.parametrize('layout', ['documents', 'bucket'])
+def test_load_history(layout):
+    """validate load_history() builds [system, snapshot] arrays per metric"""
+    conn = helpers.FakeMongoConnection()
+    fill_collection(conn, layout)
+
+    history = history_loader.load_history(conn, layout=layout, logger=helpers.LOGGER)
+
+    assert history.system_ids.tolist() == [30000140, 30000142, 30000144]
+    assert history.snapshots.dtype == np.dtype('datetime64[s]')
+    assert len(history.snapshots) == 3
+    jumps = history.metrics['ship_jumps']
+    assert jumps.shape == (3, 3)
+    assert jumps.dtype == history_loader.METRIC_DTYPE
+    assert jumps[1].tolist() == [100, 101, 102]     # 30000142 grows by offset
+    assert jumps[0].tolist() == [5, 0, 5]           # 30000140 missing at hour 1
+    assert history.to_frame('npc_kills').loc[30000144].tolist() == [12, 12, 12]
+
+@pytest.mark.parametrize('layout', ['documents', 'bucket'])
+def test_load_history_filters(layout):
+    """validate date range and system_ids restrict the arrays"""
+    conn = helpers.FakeMongoConnection()
+    fill_collection(conn, layout)
+
+    history = history_loader.load_history(
+        conn,
+        start=datetime(2018, 1, 1, 1),
+        metrics=['pod_kills'],
+        system_ids=[30000142, 30009999],
+        layout=layout,
+        logger=helpers.LOGGER
+    )
+
+    assert list(history.metrics) == ['pod_kills']
+    assert history.system_ids.tolist() == [30000142, 30009999]
+    assert history.metrics['pod_kills'].tolist() == [[1, 1], [0, 0]]
+    assert str(history.snapshots[0]) == '2018-01-01T01:00:00'
@@ -0,0 +1,79 @@
+"""test_http_cache.py: validate conditional-request response cache"""
+from os import path
+import time
+
+import pytest
+
+import navitron_crons.bulk_fetch as bulk_fetch
+import navitron_crons.http_cache as http_cache
+
+import helpers
+
+def build_cache(name, max_bytes=1024 * 1024):
+    """fresh cache file in the dump folder"""
+    return http_cache.ResponseCache(
+        path.join(helpers.DUMP_FOLDER, name + '.sqlite'),
+        max_bytes=max_bytes
+    )
+
+def test_parse_expires():
+    """validate max-age beats Expires, and no-cache means stale"""
+    now = time.time()
+    assert http_cache.parse_expires(
+        {'Cache-Control': 'public, max-age=300', 'Expires': 'Thu, 01 Jan 1970 00:00:00 GMT'},
+        now=now
+    ) == now + 300
+    assert http_cache.parse_expires({'Expires': 'Thu, 01 Jan 1970 00:05:00 GMT'}) == 300
+    assert http_cache.parse_expires({'Cache-Control': 'no-cache, max-age=300'}) == 0
+    assert http_cache.parse_expires({}) == 0
+
+def test_response_cache_roundtrip():
+    """validate store/lookup/refresh"""
+    cache = build_cache('roundtrip')
+    cache.store('http://esi/a', {'ETag': '"abc"'}, b'{"a": 1}')
+    cache.store('http://esi/b', {}, b'{"b": 1}')  # nothing to revalidate with
+
+    entry = cache.lookup('http://esi/a')
+    assert entry.body == b'{"a": 1}'
+    assert not entry.fresh
+    assert entry.conditional_headers() == {'If-None-Match': '"abc"'}
+    assert cache.lookup('http://esi/b') is None
+
+    cache.refresh('http://esi/a', {'Cache-Control': 'max-age=60'})
+    assert cache.lookup('http://esi/a').fresh
+    cache.close()
+
+def test_response_cache_lru_eviction():
+    """validate least-recently-used entries go first"""
+    cache = build_cache('lru', max_bytes=250)
+    for key in 'abc':
+        cache.store(key, {'ETag': key}, b'x' * 100)
+        time.sleep(0.01)
+        cache.lookup('a')  # keep `a` hot
+
+    assert cache.lookup('a') is not None
+    assert cache.lookup('b') is None
+    assert cache.lookup('c') is not None
+    cache.close()
+
+def test_bulk_fetch_revalidates():
+    """validate stale entries revalidate with 304 and fresh ones skip the network"""
+    cache = build_cache('bulk')
+    with helpers.MockESIServer(etag='"v1"') as server:
+        fetcher = bulk_fetch.BulkFetcher(
+            server.base_url + 'universe/stargates/',
+            workers=4,
+            cache=cache,
+            logger=helpers.LOGGER
+        )
+        first = dict(fetcher.iter_results(range(10)))
+        second = dict(fetcher.iter_results(range(10)))
+        assert first == second
+        assert len(server.request_log) == 20  # max-age=0: every hit revalidated
+
+        server.server.max_age = 300
+        cache.refresh(fetcher.build_url(0), {'Cache-Control': 'max-age=300'})
+        third = dict(fetcher.iter_results([0]))
+        assert third == {0: {'id': 0}}
+        assert len(server.request_log) == 20
+    cache.close()
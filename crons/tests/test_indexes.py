@@ -0,0 +1,68 @@
+"""test_indexes.py: validate declarative index registry"""
+import pytest
+
+import navitron_crons.exceptions as exceptions
+import navitron_crons.indexes as indexes
+
+import helpers
+
+def test_index_registry():
+    """validate every registered spec builds a named IndexModel"""
+    for collection_name, specs in indexes.INDEX_REGISTRY.items():
+        names = [spec.name for spec in specs]
+        assert len(names) == len(set(names)), collection_name
+        for spec in specs:
+            model = spec.to_model()
+            assert model.document['name'] == spec.name
+
+def test_ensure_indexes():
+    """validate ensure_indexes() builds registered indexes per collection"""
+    conn = helpers.FakeMongoConnection()
+
+    ensured = indexes.ensure_indexes(
+        conn,
+        ['navitron_system_stats', 'not_registered'],
+        logger=helpers.LOGGER
+    )
+
+    assert ensured['navitron_system_stats'] == [
+        'cron_datetime_system_id', 'system_id_cron_datetime', 'write_recipt'
+    ]
+    assert ensured['not_registered'] == []
+    assert indexes.ensure_indexes(conn, debug=True, logger=helpers.LOGGER) == {}
+
+def test_ensure_indexes_not_fatal():
+    """validate ensure_indexes() logs, rather than raises, connection trouble"""
+    class BrokenConnection:
+        def __enter__(self):
+            raise exceptions.MissingMongoConnectionInfo
+
+        def __exit__(self, *args):
+            pass
+
+    assert indexes.ensure_indexes(
+        BrokenConnection(),
+        ['navitron_server_status'],
+        logger=helpers.LOGGER
+    ) == {}
+
+def test_index_usage():
+    """validate index_usage() flags unregistered and missing indexes"""
+    conn = helpers.FakeMongoConnection()
+    collection = conn.db['navitron_server_status']
+    collection.insert_many([{'cron_datetime': '2018-01-01T00:00:00'}])
+    collection.indexes['_id_'] = True
+    collection.indexes['cron_datetime'] = False
+
+    usage_df = indexes.index_usage(
+        conn,
+        ['navitron_server_status'],
+        logger=helpers.LOGGER
+    )
+
+    usage = {row.index: row for row in usage_df.itertuples()}
+    assert not usage['_id_'].registered
+    assert usage['cron_datetime'].registered
+    assert usage['cron_datetime'].size_bytes == 4096
+    assert usage['write_recipt'].registered
+    assert usage_df[usage_df['index'] == 'write_recipt']['ops'].isnull().all()
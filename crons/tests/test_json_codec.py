@@ -0,0 +1,47 @@
+"""test_json_codec.py: validate every installed JSON backend behaves the same"""
+from os import path
+
+import pytest
+import numpy as np
+
+import navitron_crons.json_codec as json_codec
+
+import helpers
+
+def installed_codecs():
+    """every backend importable here"""
+    codecs = []
+    for name in json_codec.PREFERENCE:
+        try:
+            codecs.append(json_codec.get_codec(name))
+        except ImportError:
+            pass
+    return codecs
+
+@pytest.mark.parametrize('codec', installed_codecs(), ids=lambda codec: codec.name)
+def test_codec_roundtrip(codec):
+    """validate bytes in, bytes out, and agreement with stdlib json"""
+    expected = helpers.load_samples('universe_systems_detail.json')
+    with open(path.join(helpers.HERE, 'samples', 'universe_systems_detail.json'), 'rb') as raw_fh:
+        raw = raw_fh.read()
+
+    data = codec.loads(raw)
+    assert data == expected
+
+    encoded = codec.dumps(data)
+    assert isinstance(encoded, bytes)
+    assert codec.loads(encoded) == expected
+
+    with pytest.raises(ValueError):
+        codec.loads(raw[:-10])
+
+@pytest.mark.parametrize('codec', installed_codecs(), ids=lambda codec: codec.name)
+def test_codec_pandas_values(codec):
+    """validate numpy scalars from `DataFrame.to_dict()` encode"""
+    assert codec.loads(codec.dumps({'system_id': np.int64(30000142)})) == \
+        {'system_id': 30000142}
+
+def test_get_codec_missing():
+    """validate unknown/missing backends raise"""
+    with pytest.raises(KeyError):
+        json_codec.get_codec('simplejson')
@@ -0,0 +1,144 @@
+"""test_jump_matrix.py: validate precomputed all-pairs jump counts"""
+from collections import deque
+from os import path
+import glob
+
+import pytest
+import numpy as np
+import pandas as pd
+
+import navitron_crons.jump_matrix as jump_matrix
+import navitron_crons.routing as routing
+import navitron_crons.universe_graph as universe_graph
+
+import helpers
+
+def build_chain(length, extra=None):
+    """`length` systems gated in a line, plus a gateless system"""
+    system_ids = list(range(30000001, 30000001 + length))
+    return universe_graph.UniverseGraph.from_sde_frame(pd.DataFrame({
+        'system_id': system_ids + [31000001],
+        'stargates': [
+            [gate for gate in (system_id - 1, system_id + 1) if gate in system_ids]
+            for system_id in system_ids
+        ] + [extra or []],
+    }), logger=helpers.LOGGER)
+
+def reference_bfs(graph, source):
+    """plain queue BFS"""
+    distance = [jump_matrix.UNREACHABLE] * len(graph)
+    distance[source] = 0
+    queue = deque([source])
+    while queue:
+        node = queue.popleft()
+        for neighbor in graph.neighbors(node).tolist():
+            if distance[neighbor] == jump_matrix.UNREACHABLE:
+                distance[neighbor] = distance[node] + 1
+                queue.append(neighbor)
+    return distance
+
+def test_bfs_block():
+    """validate packed BFS matches a plain BFS, across word boundaries"""
+    graph = helpers.build_sample_graph()
+
+    block = jump_matrix.bfs_block(graph, 0, len(graph))
+    assert block.dtype == np.uint8
+    assert block.shape == (len(graph), len(graph))
+    for source in range(len(graph)):
+        assert block[source].tolist() == reference_bfs(graph, source)
+
+    chain = build_chain(150)
+    block = jump_matrix.bfs_block(chain, 60, 140)
+    assert block[0, :150].tolist() == [abs(60 - node) for node in range(150)]
+    assert block[79, 0] == 139
+    assert (block[:, 150] == jump_matrix.UNREACHABLE).all()
+
+def test_bfs_too_long():
+    """validate routes past the uint8 range are refused"""
+    with pytest.raises(ValueError):
+        jump_matrix.bfs_block(build_chain(300), 0, 1)
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_build_jump_matrix(tmpdir, jobs):
+    """validate the matrix is written beside the snapshot and memory-maps back"""
+    graph = helpers.build_sample_graph()
+    graph.metadata = {'write_recipt': 'abc123'}
+    universe_graph.write_snapshot(graph, str(tmpdir), logger=helpers.LOGGER)
+
+    matrix_file = jump_matrix.build_jump_matrix(
+        str(tmpdir), jobs=jobs, block_size=64, logger=helpers.LOGGER)
+    name = jump_matrix.matrix_name(graph.topology_hash())
+    assert matrix_file.endswith(name)
+    assert not tmpdir.join(name + '.partial.npy').check()
+
+    matrix = jump_matrix.JumpMatrix.load(universe_graph.load_snapshot(str(tmpdir)), str(tmpdir))
+    assert isinstance(matrix.matrix, np.memmap)
+    assert np.array_equal(matrix.matrix, jump_matrix.bfs_block(graph, 0, len(graph)))
+
+def test_refresh_jump_matrix(tmpdir):
+    """validate unchanged stargates keep their matrix and unused matrices are pruned"""
+    graph = helpers.build_sample_graph()
+    chain = build_chain(5)
+    for write_recipt, version in [('v1', chain), ('v2', graph), ('v3', graph)]:
+        version.metadata = {'write_recipt': write_recipt}
+        universe_graph.write_snapshot(version, str(tmpdir), keep=2, logger=helpers.LOGGER)
+        if write_recipt == 'v1':
+            jump_matrix.build_jump_matrix(str(tmpdir), logger=helpers.LOGGER)
+        if write_recipt == 'v2':
+            matrix_file = jump_matrix.refresh_jump_matrix(str(tmpdir), logger=helpers.LOGGER)
+            built = path.getmtime(matrix_file)
+
+    assert jump_matrix.refresh_jump_matrix(str(tmpdir), logger=helpers.LOGGER) == matrix_file
+    assert path.getmtime(matrix_file) == built  # v3 moved no stargates
+    assert sorted(path.basename(name) for name in glob.glob(
+        str(tmpdir.join(jump_matrix.matrix_name('*'))))) == [path.basename(matrix_file)]
+    assert jump_matrix.JumpMatrix.load(universe_graph.load_snapshot(str(tmpdir)), str(tmpdir))
+
+def test_jump_lookup():
+    """validate O(1) lookups and the A* bound"""
+    chain = build_chain(5)
+    matrix = jump_matrix.JumpMatrix(chain, jump_matrix.bfs_block(chain, 0, len(chain)))
+
+    assert matrix.symmetric
+    assert matrix.jumps(30000001, 30000005) == 4
+    assert matrix.jumps(30000005, 30000005) == 0
+    assert matrix.jumps(30000001, 31000001) is None
+    with pytest.raises(KeyError):
+        matrix.jumps(30000001, 39999999)
+    assert list(matrix.heuristic(1.5)(4)[:5]) == [6.0, 4.5, 3.0, 1.5, 0.0]
+
+    with pytest.raises(ValueError):
+        jump_matrix.JumpMatrix(chain, np.zeros((2, 2), dtype=np.uint8))
+
+def test_one_way_heuristic():
+    """validate one-way gates bound jumps *to* the target"""
+    chain = build_chain(3, extra=[30000001])
+    matrix = jump_matrix.JumpMatrix(chain, jump_matrix.bfs_block(chain, 0, len(chain)))
+
+    assert not matrix.symmetric
+    assert list(matrix.heuristic(1.0)(0)) == [0.0, 1.0, 2.0, 1.0]
+
+def test_route_with_jump_matrix():
+    """validate exact jump bounds keep A* optimal and cut expansions"""
+    graph = helpers.build_sample_graph()
+    matrix = jump_matrix.JumpMatrix(graph, jump_matrix.bfs_block(graph, 0, len(graph)))
+    rng = np.random.default_rng(0)
+    engine = routing.RouteEngine(graph, routing.RouteWeights(1.0, 0.0, 0.0))
+    engine.use_jump_matrix(matrix)
+
+    for origin, destination in rng.choice(graph.system_ids, size=(20, 2)).tolist():
+        expected = engine.dijkstra(origin, destination)
+        actual = engine.route(origin, destination)
+        if expected is None:
+            assert actual is None
+            continue
+        assert actual.cost == expected.cost == matrix.jumps(origin, destination)
+        assert actual.expanded <= max(actual.jumps, 1) * graph.degree().max()
+
+    engine.set_danger(rng.random(len(graph)))
+    assert engine.heuristic is not None
+    for origin, destination in rng.choice(graph.system_ids, size=(20, 2)).tolist():
+        expected = engine.dijkstra(origin, destination)
+        actual = engine.route(origin, destination)
+        if expected is not None:
+            assert actual.cost == pytest.approx(expected.cost)
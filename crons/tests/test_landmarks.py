@@ -0,0 +1,135 @@
+"""test_landmarks.py: validate ALT landmark bounds"""
+import pytest
+import numpy as np
+import pandas as pd
+
+import navitron_crons.jump_matrix as jump_matrix
+import navitron_crons.landmarks as landmarks
+import navitron_crons.routing as routing
+import navitron_crons.universe_graph as universe_graph
+
+import helpers
+
+def build_grid(side=12):
+    """`side` x `side` gated grid, a 3-system chain off to one side, 2 gateless systems"""
+    def system_id(row, col):
+        return 30000000 + row * side + col
+
+    systems = []
+    for row in range(side):
+        for col in range(side):
+            systems.append({'system_id': system_id(row, col), 'stargates': [
+                system_id(row + d_row, col + d_col)
+                for d_row, d_col in ((-1, 0), (1, 0), (0, -1), (0, 1))
+                if 0 <= row + d_row < side and 0 <= col + d_col < side
+            ]})
+    systems += [
+        {'system_id': 31000001, 'stargates': [31000002]},
+        {'system_id': 31000002, 'stargates': [31000001, 31000003]},
+        {'system_id': 31000003, 'stargates': [31000002]},
+        {'system_id': 32000001, 'stargates': []},
+        {'system_id': 32000002, 'stargates': []},
+    ]
+    return universe_graph.UniverseGraph.from_sde_frame(
+        pd.DataFrame(systems), logger=helpers.LOGGER)
+
+def build_engine(count=None):
+    """grid engine with random danger, optionally with landmarks"""
+    graph = build_grid()
+    rng = np.random.default_rng(0)
+    engine = routing.RouteEngine(
+        graph,
+        routing.RouteWeights(1.0, 0.0, 8.0),
+        danger=rng.random(len(graph)) ** 2
+    )
+    if count:
+        engine.use_landmarks(count)
+    return engine
+
+def test_allocate():
+    """validate landmarks split by component size, skipping gateless systems"""
+    components = np.array([0] * 90 + [1] * 8 + [2] * 2 + [3, 4])
+
+    assert landmarks.allocate(components, 20) == {0: 19, 1: 1}
+    assert landmarks.allocate(components, 2) == {0: 2}
+    assert landmarks.allocate(components, 0) == {}
+    assert landmarks.allocate(np.array([0, 1, 2]), 4) == {}
+
+def test_costs_to_from():
+    """validate reverse sweeps agree with forward sweeps"""
+    engine = build_engine()
+
+    costs_to = engine.costs_to(17)
+    for node in (0, 5, 17, 143):
+        assert costs_to[node] == pytest.approx(engine.costs_from(node)[17])
+    assert np.isinf(costs_to[len(engine.graph) - 1])
+
+def test_select_landmarks():
+    """validate landmarks cover gated components and spread out"""
+    engine = build_engine()
+
+    tables = landmarks.LandmarkTables.build(engine, 6, logger=helpers.LOGGER)
+
+    assert len(tables) == 6
+    assert tables.to_landmark.shape == tables.from_landmark.shape == (6, len(engine.graph))
+    assert len(set(tables.landmarks)) == 6
+    assert set(engine.components[tables.landmarks].tolist()) == {0}
+    for landmark, row in zip(tables.landmarks, tables.from_landmark):
+        assert np.allclose(row, engine.costs_from(landmark))
+
+    corners = set(engine.graph.index_of([30000000, 30000011, 30000132, 30000143]).tolist())
+    assert corners & set(tables.landmarks)
+
+def test_bounds_admissible():
+    """validate triangle-inequality bounds never exceed the true cost"""
+    engine = build_engine()
+    tables = landmarks.LandmarkTables.build(engine, 8, logger=helpers.LOGGER)
+
+    for target in (0, 40, 77, 143, 145):
+        truth = engine.costs_to(target)
+        reachable = np.isfinite(truth)
+        for origin in (None, 3):
+            bound = tables.bounds(target, origin, active=3)
+            assert bound[target] == 0.0
+            assert np.all(bound[reachable] <= truth[reachable] + 1e-9)
+        assert np.all(tables.bounds(target) >= 0.0)
+
+    gateless = tables.bounds(len(engine.graph) - 1)
+    assert np.isinf(gateless[:144]).all()  # grid systems cannot get there
+    assert gateless[144:].tolist() == [0.0] * 5  # no landmark sees these
+
+def test_route_with_landmarks():
+    """validate ALT A* stays optimal, expands fewer nodes, and tracks danger"""
+    engine = build_engine(count=8)
+    baseline = build_engine()
+    rng = np.random.default_rng(1)
+
+    alt_expanded = dijkstra_expanded = 0
+    for origin, destination in rng.choice(144, size=(30, 2)).tolist():
+        origin_id, destination_id = engine.graph.system_ids[[origin, destination]].tolist()
+        expected = baseline.dijkstra(origin_id, destination_id)
+        actual = engine.route(origin_id, destination_id)
+        assert actual.cost == pytest.approx(expected.cost)
+        alt_expanded += actual.expanded
+        dijkstra_expanded += expected.expanded
+    assert alt_expanded * 2 < dijkstra_expanded
+
+    tables = engine.landmarks
+    engine.set_danger(np.zeros(len(engine.graph)))
+    assert engine.landmarks is not tables
+    assert engine.route(30000000, 30000143).cost == 22.0
+
+    assert engine.route(31000001, 31000003).jumps == 2
+    assert engine.route(32000001, 30000000) is None
+
+    tables = engine.landmarks
+    engine.use_jump_matrix(jump_matrix.JumpMatrix(
+        engine.graph, jump_matrix.bfs_block(engine.graph, 0, len(engine.graph))))
+    assert engine.landmarks is tables  # jump counts do not touch the cost tables
+    assert engine.route(30000000, 30000143).cost == 22.0
+
+    engine.use_landmarks(0)
+    assert engine.landmarks is None
+    engine.use_jump_matrix(None)
+    assert engine.heuristic is None
+    assert engine.route(30000000, 30000143).cost == 22.0
@@ -0,0 +1,82 @@
+"""test_rate_limit.py: validate token-bucket behavior"""
+from os import path
+import threading
+import time
+
+import pytest
+import prosper.common.prosper_config as p_config
+
+import navitron_crons.rate_limit as rate_limit
+
+import helpers
+
+def test_token_bucket_burst():
+    """validate burst is free and the remainder is paced at `rate`"""
+    bucket = rate_limit.TokenBucket(100, capacity=10)
+
+    start = time.monotonic()
+    for _ in range(10):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+
+    for _ in range(20):
+        bucket.acquire()
+    assert time.monotonic() - start == pytest.approx(0.2, abs=0.1)
+
+def test_token_bucket_threads():
+    """validate threads share one bucket"""
+    bucket = rate_limit.TokenBucket(200, capacity=1)
+
+    def worker():
+        for _ in range(20):
+            bucket.acquire()
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.monotonic() - start == pytest.approx(80 / 200, abs=0.15)
+
+def test_file_token_bucket_shared():
+    """validate two handles on one file draw from the same bucket"""
+    bucket_path = path.join(helpers.DUMP_FOLDER, 'shared.bucket')
+    bucket_a = rate_limit.FileTokenBucket(bucket_path, 10, capacity=5)
+    bucket_b = rate_limit.FileTokenBucket(bucket_path, 10, capacity=5)
+
+    for _ in range(5):
+        assert bucket_a.reserve() == 0
+
+    assert bucket_b.reserve() == pytest.approx(0.1, abs=0.02)
+
+    bucket_a.close()
+    bucket_b.close()
+
+def write_esi_config(name, requests_per_second):
+    """config file with only [ESI] rate settings"""
+    config_path = path.join(helpers.DUMP_FOLDER, name + '.cfg')
+    with open(config_path, 'w') as cfg_fh:
+        cfg_fh.write(
+            '[ESI]\n'
+            '    requests_per_second = {}\n'
+            '    rate_limit_path = {}\n'.format(
+                requests_per_second, path.join(helpers.DUMP_FOLDER, name + '.bucket'))
+        )
+    return p_config.ProsperConfig(config_path)
+
+def test_get_rate_limiter_per_settings():
+    """validate limiters are shared per [ESI] settings, not first-config-wins"""
+    slow = write_esi_config('slow_limiter', 5)
+    fast = write_esi_config('fast_limiter', 50)
+
+    limiter = rate_limit.get_rate_limiter(slow)
+    assert rate_limit.get_rate_limiter(slow) is limiter
+    assert limiter.rate == 5.0
+    assert rate_limit.get_rate_limiter(fast).rate == 50.0
+
+    rate_limit.close_rate_limiters()
+    assert rate_limit.RATE_LIMITERS == {}
+    assert rate_limit.get_rate_limiter(slow) is not limiter
+    rate_limit.close_rate_limiters()
@@ -0,0 +1,140 @@
+"""test_routing.py: validate danger-weighted route search"""
+from datetime import datetime
+
+import pytest
+import numpy as np
+import pandas as pd
+
+import navitron_crons.history_loader as history_loader
+import navitron_crons.routing as routing
+import navitron_crons.universe_graph as universe_graph
+
+import helpers
+
+def build_graph():
+    """short route 1-2-4 through lowsec 2; long route 1-3-5-4 through highsec;
+    6 has no gates"""
+    return universe_graph.UniverseGraph.from_sde_frame(pd.DataFrame([
+        {'system_id': 30000001, 'stargates': [30000002, 30000003], 'security_status': 1.0},
+        {'system_id': 30000002, 'stargates': [30000001, 30000004], 'security_status': -0.5},
+        {'system_id': 30000003, 'stargates': [30000001, 30000005], 'security_status': 1.0},
+        {'system_id': 30000004, 'stargates': [30000002, 30000005], 'security_status': 1.0},
+        {'system_id': 30000005, 'stargates': [30000003, 30000004], 'security_status': 1.0},
+        {'system_id': 30000006, 'stargates': [], 'security_status': 1.0},
+    ]).assign(x=[0.0, 1.0, 1.0, 2.0, 2.0, 9.0], y=0.0, z=0.0), logger=helpers.LOGGER)
+
+def test_route_weights():
+    """validate weights are checked and read from config"""
+    assert routing.RouteWeights() == (1.0, 2.0, 4.0)
+    with pytest.raises(ValueError):
+        routing.RouteWeights(jump=0)
+    with pytest.raises(ValueError):
+        routing.RouteWeights(danger=-1)
+
+    weights = routing.RouteWeights.from_config(helpers.ROOT_CONFIG)
+    assert weights.jump == 1.0
+
+def test_jump_route():
+    """validate jump-only weights take the shortest route"""
+    engine = routing.RouteEngine(build_graph(), routing.RouteWeights(1.0, 0.0, 0.0))
+
+    route = engine.dijkstra(30000001, 30000004)
+    assert route.system_ids == [30000001, 30000002, 30000004]
+    assert route.jumps == 2
+    assert route.cost == 2.0
+    assert engine.astar(30000001, 30000004) == route._replace(expanded=engine.astar(
+        30000001, 30000004).expanded)
+
+    assert engine.route(30000003, 30000003) == routing.Route([30000003], 0.0, 0, 0)
+
+def test_security_route():
+    """validate security weight detours around lowsec"""
+    engine = routing.RouteEngine(build_graph())
+
+    route = engine.route(30000001, 30000004)
+    assert route.system_ids == [30000001, 30000003, 30000005, 30000004]
+    assert route.cost == 3.0
+
+    engine.set_weights(routing.RouteWeights(1.0, 0.5, 0.0))
+    assert engine.route(30000001, 30000004).jumps == 2
+
+def test_danger_route():
+    """validate danger pushes routes off the safe-looking path"""
+    engine = routing.RouteEngine(build_graph(), routing.RouteWeights(1.0, 0.0, 4.0))
+    assert engine.route(30000001, 30000004).jumps == 2
+
+    engine.set_danger([0.0, 1.0, 0.0, 0.0, 0.0, 0.0])
+    route = engine.astar(30000001, 30000004)
+    assert route.system_ids == [30000001, 30000003, 30000005, 30000004]
+    assert engine.node_cost.tolist() == [1.0, 5.0, 1.0, 1.0, 1.0, 1.0]
+
+def test_unroutable():
+    """validate gateless and unknown systems"""
+    engine = routing.RouteEngine(build_graph())
+
+    assert engine.dijkstra(30000001, 30000006) is None
+    assert engine.astar(30000006, 30000001) is None
+    with pytest.raises(KeyError):
+        engine.route(30000001, 39999999)
+
+def test_position_heuristic():
+    """validate straight-line bounds never exceed the true cost"""
+    graph = build_graph()
+    heuristic = routing.PositionHeuristic(graph, min_cost=1.0)
+
+    assert heuristic.reach == 1.0
+    assert list(heuristic(graph.index_of(30000004))) == [2.0, 1.0, 1.0, 0.0, 0.0, 7.0]
+
+def test_astar_matches_dijkstra():
+    """validate A* finds equal-cost routes on the sample SDE"""
+    graph = helpers.build_sample_graph()
+    rng = np.random.default_rng(0)
+    engine = routing.RouteEngine(graph, danger=rng.random(len(graph)))
+
+    for origin, destination in rng.choice(graph.system_ids, size=(20, 2)).tolist():
+        expected = engine.dijkstra(origin, destination)
+        actual = engine.astar(origin, destination)
+        if expected is None:
+            assert actual is None
+            continue
+        assert actual.cost == pytest.approx(expected.cost)
+        assert actual.expanded <= expected.expanded
+        assert engine.node_cost[graph.index_of(actual.system_ids[1:])].sum() == \
+            pytest.approx(actual.cost)
+
+def test_danger_from_history():
+    """validate kill totals are log-scaled onto graph systems"""
+    history = history_loader.SystemHistory(
+        np.array([30000002, 30000004, 30009999], dtype=np.int32),
+        np.array([], dtype='datetime64[s]'),
+        {
+            'ship_kills': np.array([[2, 1], [0, 0], [50, 50]], dtype=np.int32),
+            'pod_kills': np.array([[0, 0], [1, 0], [50, 50]], dtype=np.int32),
+        }
+    )
+
+    danger = routing.danger_from_history(history, build_graph().system_ids)
+
+    assert danger[1] == 1.0
+    assert danger[3] == pytest.approx(np.log1p(1) / np.log1p(3))
+    assert danger[[0, 2, 4, 5]].tolist() == [0.0] * 4
+
+def test_load_danger():
+    """validate danger is read from the recent system_stats window"""
+    conn = helpers.FakeMongoConnection()
+    for hour in range(2):
+        df, meta = helpers.build_stats_snapshot('2018-01-01T0{}:00:00'.format(hour))
+        conn.db['navitron_system_stats'].insert_many(df.assign(
+            cron_datetime=meta['cron_datetime'],
+            write_recipt=meta['write_recipt']
+        ).to_dict(orient='records'))
+    graph = universe_graph.UniverseGraph(
+        np.array([30000140, 30000142, 30000144], dtype=np.int32),
+        np.zeros(4, dtype=np.int32),
+        np.zeros(0, dtype=np.int32)
+    )
+
+    danger = routing.load_danger(
+        conn, graph, hours=1, now=datetime(2018, 1, 1, 1, 30), logger=helpers.LOGGER)
+
+    assert danger.tolist() == [np.log1p(1) / np.log1p(4), 1.0, 0.0]
@@ -0,0 +1,77 @@
+"""test_stats_buckets.py: validate bucketed system_stats layouts"""
+from datetime import datetime
+
+import pytest
+import numpy as np
+import pandas as pd
+
+import navitron_crons.stats_buckets as stats_buckets
+
+import helpers
+
+def test_bucket_roundtrip():
+    """validate to_bucket() -> expand_buckets() gives back the documents layout"""
+    snapshots = [
+        helpers.build_stats_snapshot('2018-01-01T00:00:00', offset=0),
+        helpers.build_stats_snapshot('2018-01-01T01:00:00', offset=1),
+    ]
+    buckets = [stats_buckets.to_bucket(df, meta) for df, meta in snapshots]
+
+    assert buckets[0]['system_count'] == 3
+    assert buckets[0]['system_id'] == np.array(
+        [30000140, 30000142, 30000144], dtype='<i4'
+    ).tobytes()
+    assert buckets[0][stats_buckets.TIME_FIELD] == datetime(2018, 1, 1, 0, 0)
+
+    stats_df = stats_buckets.expand_buckets(buckets)
+    assert list(stats_df.columns) == stats_buckets.FRAME_COLUMNS
+    assert len(stats_df) == 6
+
+    expected = pd.concat([
+        df.assign(cron_datetime=meta['cron_datetime'], write_recipt=meta['write_recipt'])
+        for df, meta in snapshots
+    ])[stats_buckets.FRAME_COLUMNS]
+    key = ['cron_datetime', 'system_id']
+    pd.testing.assert_frame_equal(
+        stats_df.sort_values(key).reset_index(drop=True),
+        expected.sort_values(key).reset_index(drop=True),
+        check_dtype=False
+    )
+
+    assert list(stats_buckets.expand_buckets([]).columns) == stats_buckets.FRAME_COLUMNS
+
+def test_to_timeseries_records():
+    """validate time-series measurements carry a real datetime"""
+    system_info_df, metadata_obj = helpers.build_stats_snapshot('2018-01-01T00:00:00')
+    records = stats_buckets.to_timeseries_records(system_info_df, metadata_obj)
+
+    assert len(records) == 3
+    assert records[0][stats_buckets.TIME_FIELD] == datetime(2018, 1, 1, 0, 0)
+    assert records[0]['write_recipt'] == metadata_obj['write_recipt']
+
+@pytest.mark.parametrize('layout', ['documents', 'bucket'])
+def test_read_system_stats(layout):
+    """validate read_system_stats() filters by date and returns the same frame per layout"""
+    conn = helpers.FakeMongoConnection()
+    collection = conn.db[stats_buckets.LAYOUT_COLLECTIONS[layout]]
+    for hour in range(3):
+        df, meta = helpers.build_stats_snapshot('2018-01-01T0{}:00:00'.format(hour))
+        if layout == 'bucket':
+            collection.insert_many([stats_buckets.to_bucket(df, meta)])
+        else:
+            collection.insert_many(df.assign(
+                cron_datetime=meta['cron_datetime'],
+                write_recipt=meta['write_recipt']
+            ).to_dict(orient='records'))
+
+    stats_df = stats_buckets.read_system_stats(
+        conn,
+        layout=layout,
+        start=datetime(2018, 1, 1, 1),
+        end=datetime(2018, 1, 1, 2),
+        logger=helpers.LOGGER
+    )
+
+    assert list(stats_df.columns) == stats_buckets.FRAME_COLUMNS
+    assert len(stats_df) == 3
+    assert set(stats_df['cron_datetime']) == {'2018-01-01T01:00:00'}
@@ -0,0 +1,146 @@
+"""test_universe_graph.py: validate CSR stargate graph"""
+from os import path
+
+import pytest
+import numpy as np
+import pandas as pd
+
+import navitron_crons.jump_matrix as jump_matrix
+import navitron_crons.navitron_sde_universe as navitron_sde_universe
+import navitron_crons.universe_graph as universe_graph
+
+import helpers
+
+def build_map_df():
+    """4-system chain 1-2-3-4 plus a gate out of the map, and a system with no gates"""
+    return pd.DataFrame([
+        {'system_id': 30000003, 'stargates': [30000002, 30000004], 'security_status': 0.5,
+         'x': 3.0, 'y': 0.0, 'z': 0.0, 'region_id': 1, 'constellation_id': 10},
+        {'system_id': 30000001, 'stargates': [30000002], 'security_status': 1.0,
+         'x': 1.0, 'y': 0.0, 'z': 0.0, 'region_id': 1, 'constellation_id': 10},
+        {'system_id': 30000002, 'stargates': [30000003, 30000001, 39999999],
+         'security_status': 0.9, 'x': 2.0, 'y': 0.0, 'z': 0.0, 'region_id': 1,
+         'constellation_id': 10},
+        {'system_id': 30000004, 'stargates': [30000003], 'security_status': -0.2,
+         'x': 4.0, 'y': 0.0, 'z': 0.0, 'region_id': 2, 'constellation_id': 20},
+        {'system_id': 31000005, 'stargates': float('nan'), 'security_status': -1.0,
+         'x': 5.0, 'y': 0.0, 'z': 0.0, 'region_id': 3, 'constellation_id': 30},
+    ])
+
+def test_from_sde_frame():
+    """validate CSR layout, id mapping and node attributes"""
+    graph = universe_graph.UniverseGraph.from_sde_frame(build_map_df(), logger=helpers.LOGGER)
+
+    assert len(graph) == 5
+    assert graph.system_ids.dtype == np.int32
+    assert graph.system_ids.tolist() == [30000001, 30000002, 30000003, 30000004, 31000005]
+    assert graph.indptr.dtype == graph.indices.dtype == np.int32
+    assert graph.indptr.tolist() == [0, 1, 3, 5, 6, 6]
+    assert graph.indices.tolist() == [1, 0, 2, 1, 3, 2]
+    assert graph.edge_count == 6
+    assert graph.neighbors(graph.index_of(30000002)).tolist() == [0, 2]
+    assert graph.degree().tolist() == [1, 2, 2, 1, 0]
+
+    assert graph.index_of(30000004) == 3
+    assert graph.index_of([31000005, 30000001]).tolist() == [4, 0]
+    with pytest.raises(KeyError):
+        graph.index_of(39999999)
+
+    assert graph.nodes['security_status'].dtype == np.float32
+    assert graph.nodes['region_id'].tolist() == [1, 1, 1, 2, 3]
+    assert graph.positions[:, 0].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+def test_from_sde_samples():
+    """validate the sample SDE builds a consistent graph"""
+    map_df = navitron_sde_universe.join_map_details(
+        helpers.load_samples('universe_systems_detail.json'),
+        helpers.load_samples('universe_constellations_detail.json'),
+        helpers.load_samples('universe_regions_detail.json'),
+    )
+    map_df = navitron_sde_universe.reshape_system_location(map_df)
+    map_df = navitron_sde_universe.join_stargate_details(
+        map_df,
+        helpers.load_samples('universe_stargates_detail.json')
+    )
+
+    graph = universe_graph.UniverseGraph.from_sde_frame(map_df, logger=helpers.LOGGER)
+
+    assert len(graph) == len(map_df)
+    assert graph.indptr[-1] == graph.edge_count
+    assert np.all(np.diff(graph.indptr) >= 0)
+    assert np.all((graph.indices >= 0) & (graph.indices < len(graph)))
+
+def test_from_mongo():
+    """validate from_mongo() reads the SDE collection"""
+    conn = helpers.FakeMongoConnection()
+    conn.db[universe_graph.SDE_UNIVERSE_COLLECTION].insert_many(
+        build_map_df().to_dict(orient='records')
+    )
+
+    graph = universe_graph.UniverseGraph.from_mongo(conn, logger=helpers.LOGGER)
+
+    assert graph.indices.tolist() == [1, 0, 2, 1, 3, 2]
+
+def test_duplicate_systems():
+    """validate duplicate rows are refused"""
+    map_df = build_map_df()
+    with pytest.raises(ValueError):
+        universe_graph.UniverseGraph.from_sde_frame(pd.concat([map_df, map_df.head(1)]))
+
+def test_snapshot_roundtrip(tmpdir):
+    """validate snapshots memory-map back to the same graph"""
+    graph = universe_graph.UniverseGraph.from_sde_frame(build_map_df(), logger=helpers.LOGGER)
+    graph.metadata = {'write_recipt': 'abc123', 'cron_datetime': '2018-01-01T00:00:00'}
+
+    file_path = universe_graph.write_snapshot(graph, str(tmpdir), logger=helpers.LOGGER)
+    assert file_path.endswith(universe_graph.snapshot_name('abc123'))
+    assert tmpdir.join(universe_graph.SNAPSHOT_CURRENT).read() == path.basename(file_path)
+
+    loaded = universe_graph.load_snapshot(str(tmpdir))
+    assert isinstance(loaded.indices, np.memmap)
+    assert not loaded.indices.flags.writeable
+    assert loaded.metadata == graph.metadata
+    assert loaded.system_ids.tolist() == graph.system_ids.tolist()
+    assert loaded.indptr.tolist() == graph.indptr.tolist()
+    assert loaded.indices.tolist() == graph.indices.tolist()
+    assert set(loaded.nodes) == set(graph.nodes)
+    for field, array in graph.nodes.items():
+        assert loaded.nodes[field].dtype == array.dtype
+        assert loaded.nodes[field].tolist() == array.tolist()
+    assert loaded.neighbors(loaded.index_of(30000002)).tolist() == [0, 2]
+
+def test_snapshot_versions(tmpdir):
+    """validate CURRENT tracks the newest snapshot and old ones are pruned"""
+    graph = universe_graph.UniverseGraph.from_sde_frame(build_map_df(), logger=helpers.LOGGER)
+    for write_recipt in ['v1', 'v2', 'v3']:
+        graph.metadata = {'write_recipt': write_recipt}
+        universe_graph.write_snapshot(graph, str(tmpdir), keep=2, logger=helpers.LOGGER)
+
+    assert universe_graph.load_snapshot(str(tmpdir)).metadata['write_recipt'] == 'v3'
+    assert universe_graph.load_snapshot(str(tmpdir), 'v2').metadata['write_recipt'] == 'v2'
+    assert not tmpdir.join(universe_graph.snapshot_name('v1')).check()
+
+    tmpdir.join('junk.bin').write('not a graph')
+    with pytest.raises(ValueError):
+        universe_graph.UniverseGraph.load(str(tmpdir.join('junk.bin')))
+
+def test_snapshot_graph(tmpdir):
+    """validate the SDE cron snapshots its map"""
+    metadata_obj = {'write_recipt': 'abc123', 'cron_datetime': '2018-01-01T00:00:00'}
+
+    file_path = navitron_sde_universe.snapshot_graph(
+        build_map_df(), metadata_obj, str(tmpdir), logger=helpers.LOGGER)
+
+    assert universe_graph.UniverseGraph.load(file_path).metadata == metadata_obj
+    assert navitron_sde_universe.snapshot_graph(
+        build_map_df().drop(columns='system_id'), metadata_obj, str(tmpdir),
+        logger=helpers.LOGGER) is None
+
+    assert tmpdir.join(jump_matrix.matrix_name(
+        universe_graph.UniverseGraph.load(file_path).topology_hash())).check()
+
+    debug_path = tmpdir.join('debug')
+    assert navitron_sde_universe.snapshot_graph(
+        build_map_df(), metadata_obj, str(debug_path), debug=True,
+        logger=helpers.LOGGER) is None
+    assert not debug_path.check()
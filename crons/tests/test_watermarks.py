@@ -0,0 +1,69 @@
+"""test_watermarks.py: validate incremental dump watermarks"""
+from datetime import datetime, timedelta
+import os
+
+import pytest
+from bson import ObjectId
+
+import navitron_crons.watermarks as watermarks
+import navitron_crons.navitron_dump_database as navitron_dump_database
+
+import helpers
+
+NOW = datetime(2018, 1, 2, 12, 0, 0)
+
+def test_build_query():
+    """validate watermark queries are exclusive and stop short of now"""
+    assert watermarks.build_query('cron_datetime', now=NOW) == \
+        {'cron_datetime': {'$lt': '2018-01-02T11:50:00'}}
+    assert watermarks.build_query(
+        'cron_datetime', '2018-01-01T00:00:00', settle=timedelta(0), now=NOW
+    ) == {'cron_datetime': {'$gt': '2018-01-01T00:00:00', '$lt': '2018-01-02T12:00:00'}}
+
+    since = ObjectId.from_datetime(datetime(2018, 1, 1))
+    query = watermarks.build_query('_id', since, now=NOW)
+    assert query['_id']['$gt'] == since
+    assert query['_id']['$lt'].generation_time.replace(tzinfo=None) == \
+        NOW - timedelta(minutes=10)
+
+@pytest.mark.parametrize('field,value', [
+    ('cron_datetime', '2018-01-01T00:00:00'),
+    ('_id', ObjectId.from_datetime(datetime(2018, 1, 1))),
+])
+def test_watermark_store(tmpdir, field, value):
+    """validate marks survive a reload, per field"""
+    store_path = str(tmpdir.join('marks.json'))
+    watermarks.WatermarkStore(store_path).set('navitron_system_stats', field, value)
+
+    store = watermarks.WatermarkStore(store_path)
+    assert store.get('navitron_system_stats', field) == value
+    assert store.get('navitron_server_status', field) is None
+    other = '_id' if field == 'cron_datetime' else 'cron_datetime'
+    assert store.get('navitron_system_stats', other) is None
+    assert os.listdir(str(tmpdir)) == ['marks.json']
+
+def test_incremental_export(tmpdir):
+    """validate two incremental runs append new rows as new part files"""
+    rows = [
+        {'system_id': index, 'cron_datetime': '2018-01-0{}T00:00:00'.format(1 + index // 3)}
+        for index in range(6)
+    ]
+    outdir = str(tmpdir.join('export'))
+
+    def run(batch, run_name):
+        tracker = watermarks.MarkTracker(iter(batch), 'cron_datetime')
+        navitron_dump_database.stream_export(
+            tracker,
+            outdir,
+            partition=True,
+            part_name=run_name,
+            logger=helpers.LOGGER
+        )
+        return tracker.mark
+
+    assert run(rows[:4], 'part-1') == '2018-01-02T00:00:00'
+    assert run(rows[4:], 'part-2') == '2018-01-02T00:00:00'
+
+    assert os.listdir(os.path.join(outdir, 'cron_date=2018-01-01')) == ['part-1.csv']
+    assert sorted(os.listdir(os.path.join(outdir, 'cron_date=2018-01-02'))) == \
+        ['part-1.csv', 'part-2.csv']